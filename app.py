@@ -1,416 +1,1039 @@
-from flask import Flask, render_template, jsonify, Response, request
-import threading
-from io import StringIO, BytesIO
-import csv
-import time
-import logging
-import os
-from pynput import keyboard
-import matplotlib.pyplot as plt
-
-# Import trackers and detectors.
-from mouse_tracker import MouseBehaviorTracker
-from window_tracker import WindowTracker
-from copy_tracker import CopyTracker
-from network_lockdown import NetworkLockdown
-from peripheral_detector import PeripheralDetector
-
-# Import the updated face_detector module.
-import face_detector
-
-# Import the voice_detector module.
-from voice_detector import VoiceDetector
-
-app = Flask(__name__)
-logging.basicConfig(level=logging.DEBUG)
-
-def mouse_event_callback(event):
-    logging.info("Mouse Event: " + str(event))
-
-def window_event_callback(event):
-    logging.info("Window Event: " + str(event))
-
-def copy_event_callback(event):
-    logging.info("Copy Event: " + str(event))
-
-def peripheral_event_callback(event):
-    logging.info("Peripheral Event: " + str(event))
-
-def voice_event_callback(event):
-    logging.info("Voice Event: " + str(event))
-
-# Initialize trackers.
-mouse_tracker = MouseBehaviorTracker(speed_threshold=1500, angle_threshold=90, callback=mouse_event_callback)
-window_tracker = WindowTracker(poll_interval=0.5, callback=window_event_callback)
-copy_tracker = CopyTracker(poll_interval=1.0, callback=copy_event_callback)
-network_lockdown = NetworkLockdown(allowed_exe="C:\\Path\\to\\exam_browser.exe")
-peripheral_detector = PeripheralDetector(callback=peripheral_event_callback)
-
-# Initialize and calibrate VoiceDetector.
-voice_detector = VoiceDetector(callback=voice_event_callback, threshold=0.0002)
-voice_detector.calibrate_threshold()
-
-def get_status(score):
-    # You may adjust these thresholds as needed.
-    if score >= 100:
-        return "Direct kick out"
-    elif score >= 80:
-        return "Warning-2"
-    elif score >= 70:
-        return "Warning-1"
-    else:
-        return "Safe"
-
-# Routes for pages.
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/risk')
-def risk_page():
-    return render_template('risk.html')
-
-@app.route('/copy_test')
-def copy_test():
-    return render_template('copy_test.html')
-
-@app.route('/face_detection')
-def face_detection():
-    return render_template('face_detection.html')
-
-@app.route('/video_feed')
-def video_feed():
-    # Uses the updated face_detector.gen_frames() which now supports frame sampling.
-    return Response(face_detector.gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
-
-# API endpoints for events.
-@app.route('/api/mouse_events')
-def api_mouse_events():
-    return jsonify(mouse_tracker.event_log)
-
-@app.route('/api/window_events')
-def api_window_events():
-    return jsonify(window_tracker.event_log)
-
-@app.route('/api/copy_events')
-def api_copy_events():
-    return jsonify(copy_tracker.event_log)
-
-@app.route('/api/peripheral_events')
-def api_peripheral_events():
-    return jsonify(peripheral_detector.event_log)
-
-@app.route('/api/face_risk')
-def api_face_risk():
-    # Accesses updated globals from face_detector.
-    return jsonify({
-        "face_risk": face_detector.eye_risk_score,
-        "face_events": face_detector.eye_risk_events,
-        "scoring_started": face_detector.scoring_started
-    })
-
-@app.route('/api/risk')
-def api_risk():
-    mouse_risk = 0
-    window_risk = window_tracker.risk_score if hasattr(window_tracker, 'risk_score') else 0
-    copy_risk = copy_tracker.risk_score if hasattr(copy_tracker, 'risk_score') else 0
-    peripheral_risk = peripheral_detector.risk_score if hasattr(peripheral_detector, 'risk_score') else 0
-    face_risk = face_detector.eye_risk_score
-    voice_risk = voice_detector.risk_score if hasattr(voice_detector, 'risk_score') else 0
-
-    aggregate = mouse_risk + window_risk + copy_risk + peripheral_risk + face_risk + voice_risk
-
-    # Set kickout flag if aggregate risk is 1000 or higher.
-    kickout_flag = True if aggregate >= 1000 else False
-
-    return jsonify({
-        "mouse_risk": mouse_risk,
-        "mouse_status": get_status(mouse_risk),
-        "window_risk": window_risk,
-        "window_status": get_status(window_risk),
-        "copy_risk": copy_risk,
-        "copy_status": get_status(copy_risk),
-        "peripheral_risk": peripheral_risk,
-        "peripheral_status": get_status(peripheral_risk),
-        "face_risk": face_risk,
-        "face_status": get_status(face_risk),
-        "voice_risk": voice_risk,
-        "voice_status": get_status(voice_risk),
-        "aggregate": aggregate,
-        "aggregate_status": get_status(aggregate),
-        "kickout": kickout_flag
-    })
-
-@app.route('/api/register_copy', methods=['POST'])
-def register_copy():
-    data = request.json
-    if data and 'content' in data:
-        content = data['content']
-        word_count = len(content.split())
-        event = {
-            "timestamp": time.time(),
-            "event": "Copy-Paste (Client)",
-            "content_preview": content[:50],
-            "word_count": word_count,
-            "full_content": content
-        }
-        copy_tracker.event_log.append(event)
-        logging.info("Registered copy event: " + str(event))
-        return jsonify({"status": "success"}), 200
-    return jsonify({"status": "error"}), 400
-
-@app.route('/api/network_lockdown', methods=['GET'])
-def api_network_lockdown():
-    state = request.args.get("state", "").lower()
-    if state == "on":
-        network_lockdown.activate()
-        return jsonify({"status": "lockdown activated"}), 200
-    elif state == "off":
-        network_lockdown.deactivate()
-        return jsonify({"status": "lockdown deactivated"}), 200
-    else:
-        return jsonify({"status": "invalid state"}), 400
-
-@app.route('/api/shortcuts', methods=['GET'])
-def api_shortcuts():
-    state = request.args.get("state", "").lower()
-    if state == "disable":
-        result = copy_tracker.disable_shortcuts()
-        if result:
-            return jsonify({"status": "shortcuts disabled"}), 200
-        else:
-            return jsonify({"status": "shortcuts already disabled"}), 200
-    elif state == "enable":
-        result = copy_tracker.enable_shortcuts()
-        if result:
-            return jsonify({"status": "shortcuts enabled"}), 200
-        else:
-            return jsonify({"status": "shortcuts already enabled"}), 200
-    else:
-        return jsonify({"status": "invalid state, use 'disable' or 'enable'"}), 400
-
-@app.route('/api/stop_video', methods=['GET'])
-def stop_video_endpoint():
-    face_detector.stop_video()
-    return jsonify({"status": "video stream stopped"}), 200
-
-@app.route('/api/test_voice_detection', methods=['POST'])
-def test_voice_detection():
-    try:
-        has_voice, recording_file = voice_detector.detect_voice()
-        return jsonify({
-            "voice_detected": has_voice,
-            "recording_path": recording_file if has_voice else None
-        })
-    except Exception as e:
-        logging.error(f"Error in voice detection API: {str(e)}")
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/voice_events')
-def voice_events():
-    logging.info("Voice event log: " + str(voice_detector.event_log))
-    return jsonify(voice_detector.event_log)
-
-# CSV Export Endpoints.
-@app.route('/download/mouse_csv')
-def download_mouse_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'speed', 'angle_diff', 'position'])
-    for event in mouse_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('speed', ''),
-            event.get('angle_diff', ''),
-            event.get('position', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=mouse_events.csv"})
-
-@app.route('/download/window_csv')
-def download_window_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'window', 'duration'])
-    for event in window_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('window', ''),
-            event.get('duration', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=window_events.csv"})
-
-@app.route('/download/copy_csv')
-def download_copy_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'content_preview', 'word_count', 'full_content'])
-    for event in copy_tracker.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('content_preview', ''),
-            event.get('word_count', ''),
-            event.get('full_content', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=copy_events.csv"})
-
-@app.route('/download/peripheral_csv')
-def download_peripheral_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'device'])
-    for event in peripheral_detector.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('device', event.get('Caption', 'Unknown'))
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=peripheral_events.csv"})
-
-@app.route('/download/face_csv')
-def download_face_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'risk', 'details'])
-    for event in face_detector.eye_risk_events:
-        details = ""
-        if "faces_detected" in event:
-            details = f"Faces: {event['faces_detected']}"
-        elif "duration" in event:
-            details = f"Duration: {event['duration']:.2f} s, intervals: {event.get('intervals', '')}"
-        elif "vertical_diff" in event:
-            details = f"Vertical diff: {event['vertical_diff']:.2f}"
-        elif "left_eye_x" in event and "right_eye_x" in event:
-            details = f"Horizontal alignment: left_eye_x={event['left_eye_x']}, right_eye_x={event['right_eye_x']}"
-        cw.writerow([event.get('timestamp', ''), event.get('event', ''), event.get('risk', ''), details])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=face_events.csv"})
-
-@app.route('/download/voice_csv')
-def download_voice_csv():
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['timestamp', 'event', 'duration', 'risk_score', 'recording_file'])
-    for event in voice_detector.event_log:
-        cw.writerow([
-            event.get('timestamp', ''),
-            event.get('event', ''),
-            event.get('duration', ''),
-            event.get('risk_score', ''),
-            event.get('recording_file', '')
-        ])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=voice_events.csv"})
-
-@app.route('/download/graph_csv')
-def download_graph_csv():
-    data = []
-    for event in face_detector.eye_risk_events:
-        data.append({
-            "timestamp": event.get("timestamp", ""),
-            "risk": event.get("risk", ""),
-            "source": "face"
-        })
-    for event in voice_detector.event_log:
-        data.append({
-            "timestamp": event.get("timestamp", ""),
-            "risk": event.get("risk_score", ""),
-            "source": "voice"
-        })
-    data.sort(key=lambda x: x["timestamp"])
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["timestamp", "risk", "source"])
-    for item in data:
-        cw.writerow([item["timestamp"], item["risk"], item["source"]])
-    output = si.getvalue()
-    return Response(output, mimetype="text/csv",
-                    headers={"Content-Disposition": "attachment;filename=graph_data.csv"})
-
-# Graph endpoints using Matplotlib.
-@app.route('/graph/<event_type>')
-def graph_event(event_type):
-    if event_type == 'mouse':
-        events = mouse_tracker.event_log
-    elif event_type == 'window':
-        events = window_tracker.event_log
-    elif event_type == 'copy':
-        events = copy_tracker.event_log
-    elif event_type == 'peripheral':
-        events = peripheral_detector.event_log
-    elif event_type == 'face':
-        events = face_detector.eye_risk_events
-    elif event_type == 'voice':
-        events = voice_detector.event_log
-    else:
-        return "Invalid event type", 400
-
-    times = []
-    values = []
-    for event in events:
-        t = event.get('timestamp')
-        if t is not None:
-            times.append(t)
-            # For face events, use 'risk'; otherwise, default to 1.
-            val = event.get('risk', 1)
-            values.append(val)
-    if not times:
-        return "No data available", 404
-
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.plot(times, values, marker='o', linestyle='-', color='cyan')
-    ax.set_xlabel('Timestamp')
-    ax.set_ylabel('Risk Value' if any('risk' in e for e in events) else 'Event Count')
-    ax.set_title(f'{event_type.capitalize()} Events Graph')
-    ax.grid(True)
-    fig.tight_layout()
-
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    plt.close(fig)
-    return Response(buf.getvalue(), mimetype='image/png')
-
-# Kickout route.
-@app.route('/kickout')
-def kickout():
-    return """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-      <meta charset="UTF-8">
-      <title>Kicked Out</title>
-      <style>
-        body { background-color: #1a1a1a; color: #fff; text-align: center; padding-top: 50px; }
-        h1 { font-size: 3em; }
-      </style>
-    </head>
-    <body>
-      <h1>You have been kicked out.</h1>
-      <p>Your overall risk score exceeded the allowed threshold.</p>
-    </body>
-    </html>
-    """
-
-if __name__ == '__main__':
-    import webbrowser
-    url = "http://127.0.0.1:5000/"
-    threading.Thread(target=lambda: webbrowser.open(url), daemon=True).start()
-
-    # Start the trackers in separate threads.
-    threading.Thread(target=mouse_tracker.start, daemon=True).start()
-    threading.Thread(target=window_tracker.start, daemon=True).start()
-    threading.Thread(target=copy_tracker.start, daemon=True).start()
-    threading.Thread(target=peripheral_detector.start, daemon=True).start()
-
-    app.run(debug=True)
+from flask import Flask, render_template, jsonify, Response, request, g
+import threading
+import json
+import time
+import logging
+import os
+import sys
+import zlib
+import atexit
+from itertools import islice
+from pynput import keyboard
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Import trackers and detectors.
+from mouse_tracker import MouseBehaviorTracker
+from window_tracker import WindowTracker
+from window_rules import WindowRules
+from copy_tracker import CopyTracker
+from shortcut_policy import ShortcutPolicy, PolicyFile
+from content_store import ContentStore, match_fields
+from network_lockdown import NetworkLockdown
+from peripheral_detector import PeripheralDetector
+from event_store import EventStore, EventLog, json_default
+from risk_engine import RiskEngine
+from exporters import in_time_range, stream_csv, columnar_export, CSV_CHUNK_ROWS
+from graph_renderer import GraphRenderer
+from timeline import timeline, page
+from timeseries import DOWNSAMPLERS, event_arrays, time_bounds, risk_series, rate_series
+from event_journal import EventJournal, new_session_id, prune_sessions
+from sessions import SessionRegistry, IngestError
+from frame_broadcast import FrameBroadcaster
+from trajectory import Trajectory, replay
+from session_recorder import SessionRecorder
+import metrics
+from profiler import PROFILER
+
+# Import the updated face_detector module.
+import face_detector
+
+# Import the voice_detector module.
+from voice_detector import VoiceDetector
+
+app = Flask(__name__)
+logging.basicConfig(level=logging.DEBUG)
+
+def mouse_event_callback(event):
+    logging.info("Mouse Event: " + str(event))
+
+def window_event_callback(event):
+    logging.info("Window Event: " + str(event))
+
+def copy_event_callback(event):
+    logging.info("Copy Event: " + str(event))
+
+def peripheral_event_callback(event):
+    logging.info("Peripheral Event: " + str(event))
+
+def voice_event_callback(event):
+    logging.info("Voice Event: " + str(event))
+
+EVENT_SOURCES = ("mouse", "window", "copy", "peripheral", "face", "voice")
+
+# Shared bounded event store; each source keeps at most DRAGON_EVENT_CAPACITY events in memory
+# and, when DRAGON_SPILL_DIR is set, appends evicted events to <source>.ndjson there.
+event_store = EventStore(capacity=int(os.environ.get("DRAGON_EVENT_CAPACITY", 5000)),
+                         spill_dir=os.environ.get("DRAGON_SPILL_DIR"))
+
+# Risk engine fed by every event the store records. Besides the cumulative totals it keeps a
+# sliding window of DRAGON_RISK_WINDOW seconds and a score decayed with DRAGON_RISK_HALF_LIFE.
+risk_engine = RiskEngine(EVENT_SOURCES,
+                         window=float(os.environ.get("DRAGON_RISK_WINDOW", 300)),
+                         half_life=float(os.environ.get("DRAGON_RISK_HALF_LIFE", 120)))
+event_store.listeners.append(risk_engine.on_event)
+
+# Full pointer trajectory for audits, simplified to DRAGON_TRAJECTORY_TOLERANCE pixels (set it
+# empty to keep every sample).
+trajectory_tolerance = os.environ.get("DRAGON_TRAJECTORY_TOLERANCE", "1.0")
+mouse_trajectory = Trajectory(tolerance=float(trajectory_tolerance) if trajectory_tolerance else None)
+
+# Initialize trackers.
+mouse_tracker = MouseBehaviorTracker(speed_threshold=1500, angle_threshold=90, callback=mouse_event_callback,
+                                     event_log=event_store.source("mouse"), trajectory=mouse_trajectory)
+# Window categories and their risk weights come from the JSON file at DRAGON_WINDOW_RULES, if set.
+window_rules_path = os.environ.get("DRAGON_WINDOW_RULES")
+window_rules = WindowRules.from_file(window_rules_path) if window_rules_path else WindowRules()
+window_tracker = WindowTracker(poll_interval=0.5, callback=window_event_callback,
+                               event_log=event_store.source("window"), rules=window_rules)
+# Append-only journal under DRAGON_JOURNAL_DIR (set it empty to disable), one directory per exam
+# session. Each run starts a new session unless DRAGON_SESSION_ID names one to resume, e.g. after a
+# crash.
+journal_dir = os.environ.get("DRAGON_JOURNAL_DIR", "journal")
+session_id = os.environ.get("DRAGON_SESSION_ID") or new_session_id()
+session_dir = os.path.join(journal_dir, session_id) if journal_dir else None
+# Copied text is kept once per content hash, on disk in the session's journal directory when there
+# is one (so it is resumed and pruned with the session), and events reference it by hash.
+content_store = ContentStore(directory=os.path.join(session_dir, "content") if session_dir else None)
+# Shortcuts blocked while shortcuts are disabled come from the JSON file at DRAGON_SHORTCUT_POLICY,
+# if set; it is re-read whenever blocking is switched on, or through /api/shortcut_policy.
+shortcut_policy = PolicyFile(os.environ.get("DRAGON_SHORTCUT_POLICY"))
+copy_tracker = CopyTracker(poll_interval=1.0, callback=copy_event_callback,
+                           event_log=event_store.source("copy"), content_store=content_store,
+                           policy=shortcut_policy)
+# DRAGON_LOCKDOWN_ALLOW lists the addresses the exam may still reach during lockdown, and
+# DRAGON_LOCKDOWN_PORTS the TCP ports left open inbound (by default PORT, or 5000), both
+# comma-separated. The port the dashboard is served on is added when it starts, so a remote
+# proctor can still reach it, and turn the lockdown off.
+network_lockdown = NetworkLockdown(allowed_exe="C:\\Path\\to\\exam_browser.exe",
+                                   allowed_addresses=[address.strip() for address in
+                                                      os.environ.get("DRAGON_LOCKDOWN_ALLOW", "").split(",")
+                                                      if address.strip()],
+                                   allowed_inbound_ports=[int(port) for port in
+                                                          os.environ.get("DRAGON_LOCKDOWN_PORTS",
+                                                                         os.environ.get("PORT", "5000")).split(",")
+                                                          if port.strip()])
+peripheral_detector = PeripheralDetector(callback=peripheral_event_callback,
+                                         event_log=event_store.source("peripheral"))
+face_detector.eye_risk_events = event_store.source("face")
+
+# Initialize and calibrate VoiceDetector.
+voice_detector = VoiceDetector(callback=voice_event_callback, threshold=0.0002,
+                               event_log=event_store.source("voice"))
+voice_detector.calibrate_threshold()
+
+# Only the resumed session's events are replayed, which also rebuilds the risk engine and tracker
+# scores. The journals (and copied texts) of all but the DRAGON_JOURNAL_KEEP most recent sessions
+# are deleted.
+event_journal = None
+if journal_dir:
+    for removed in prune_sessions(journal_dir, int(os.environ.get("DRAGON_JOURNAL_KEEP", 20)), current=session_id):
+        logging.info("Deleted the journal of session %s", removed)
+    logging.info("Journaling exam session %s", session_id)
+    fsync_interval = os.environ.get("DRAGON_JOURNAL_FSYNC", "1.0")
+    event_journal = EventJournal(session_dir,
+                                 fsync_interval=float(fsync_interval) if fsync_interval else None)
+    if event_journal.replay_into(event_store):
+        mouse_tracker.risk_score = risk_engine.cumulative("mouse")
+        window_tracker.risk_score = risk_engine.cumulative("window")
+        copy_tracker.risk_score = risk_engine.cumulative("copy")
+        peripheral_detector.risk_score = risk_engine.cumulative("peripheral")
+        voice_detector.risk_score = risk_engine.cumulative("voice")
+        face_detector.eye_risk_score = risk_engine.cumulative("face")
+    event_store.listeners.append(event_journal.on_event)
+    event_journal.start()
+    atexit.register(event_journal.close)
+
+# DRAGON_RECORD names a file that receives every raw sensor input of this run, with the detector
+# settings, so the session can be replayed through the detectors later (see session_recorder.py).
+session_recorder = None
+record_path = os.environ.get("DRAGON_RECORD")
+if record_path:
+    session_recorder = SessionRecorder(record_path, meta={
+        "mouse": {"speed_threshold": mouse_tracker.speed_threshold, "angle_threshold": mouse_tracker.angle_threshold},
+        "window_rules": window_rules_path,
+        "shortcuts": shortcut_policy.current.to_list(),
+        "peripheral": {"debounce": peripheral_detector.inventory.debounce},
+        "voice": {"threshold": voice_detector.threshold, "chunk_size": voice_detector.chunk_size,
+                  "rate": voice_detector.rate},
+    }, sources={
+        "mouse": lambda: mouse_tracker.risk_score,
+        "window": lambda: window_tracker.risk_score,
+        "copy": lambda: copy_tracker.risk_score,
+        "peripheral": lambda: peripheral_detector.risk_score,
+        "voice": lambda: voice_detector.risk_score,
+        "face": lambda: face_detector.eye_risk_score,
+    })
+    for tracker in (mouse_tracker, window_tracker, copy_tracker, peripheral_detector, voice_detector):
+        tracker.recorder = session_recorder
+    face_detector.recorder = session_recorder
+    atexit.register(session_recorder.close)
+
+def get_status(score):
+    # You may adjust these thresholds as needed.
+    if score >= 100:
+        return "Direct kick out"
+    elif score >= 80:
+        return "Warning-2"
+    elif score >= 70:
+        return "Warning-1"
+    else:
+        return "Safe"
+
+def make_etag(tag, version):
+    # The query string is part of the tag because a delta's contents depend on its cursor.
+    return f"{tag}-{version}-{zlib.crc32(request.query_string):08x}"
+
+def not_modified(etag):
+    # Short-circuits before any serialization when the client already has this version.
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def event_delta(log, since, limit, until=None):
+    """Returns (events, cursor, more) for the events of a log newer than the `since` cursor."""
+    if until is None:
+        events = log.snapshot(since=since, limit=limit + 1 if limit else None)
+    else:
+        events = [e for e in log.snapshot(since=since) if e["seq"] <= until]
+    more = bool(limit) and len(events) > limit
+    if more:
+        events = events[:limit]
+    cursor = events[-1]["seq"] if events else since
+    return events, cursor, more
+
+def event_log_response(log):
+    # Without a cursor the full retained log is returned as before, so existing clients keep working.
+    etag = make_etag(log.name, log.last_seq)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    since = request.args.get("since", type=int)
+    limit = request.args.get("limit", type=int)
+    if since is None and limit is None:
+        response = jsonify(log.snapshot())
+    else:
+        events, cursor, more = event_delta(log, since or 0, limit)
+        response = jsonify({"events": events, "cursor": cursor, "more": more})
+    response.set_etag(etag)
+    return response
+
+# Routes for pages.
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/risk')
+def risk_page():
+    return render_template('risk.html')
+
+@app.route('/copy_test')
+def copy_test():
+    return render_template('copy_test.html')
+
+@app.route('/face_detection')
+def face_detection():
+    return render_template('face_detection.html')
+
+# All viewers share one capture and detection pipeline (face_detector.gen_frames, which samples frames).
+frame_broadcaster = FrameBroadcaster(face_detector.gen_frames, on_stop=face_detector.stop_video)
+
+@app.route('/video_feed')
+def video_feed():
+    return Response(frame_broadcaster.stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# API endpoints for events.
+@app.route('/api/mouse_events')
+def api_mouse_events():
+    return event_log_response(mouse_tracker.event_log)
+
+@app.route('/api/window_events')
+def api_window_events():
+    return event_log_response(window_tracker.event_log)
+
+@app.route('/api/copy_events')
+def api_copy_events():
+    return event_log_response(copy_tracker.event_log)
+
+@app.route('/api/peripheral_events')
+def api_peripheral_events():
+    return event_log_response(peripheral_detector.event_log)
+
+@app.route('/api/face_risk')
+def api_face_risk():
+    # Accesses updated globals from face_detector.
+    log = face_detector.eye_risk_events
+    etag = make_etag("face", f"{log.last_seq}-{face_detector.eye_risk_score}-{int(face_detector.scoring_started)}")
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    since = request.args.get("since", type=int)
+    limit = request.args.get("limit", type=int)
+    payload = {
+        "face_risk": face_detector.eye_risk_score,
+        "scoring_started": face_detector.scoring_started
+    }
+    if since is None and limit is None:
+        payload["face_events"] = log.snapshot()
+    else:
+        payload["face_events"], payload["cursor"], payload["more"] = event_delta(log, since or 0, limit)
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/events')
+def api_events():
+    """Combined delta of several sources: ?since=<cursor>&limit=<per source>&sources=mouse,face"""
+    # Everything up to `high` is committed, so the cursor can safely jump to it.
+    high = event_store.last_seq
+    etag = make_etag("events", high)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    since = request.args.get("since", default=0, type=int)
+    limit = request.args.get("limit", type=int)
+    deltas, cursor, more = combined_delta(requested_sources(), since, limit, high)
+    response = jsonify({"events": deltas, "cursor": cursor, "more": more})
+    response.set_etag(etag)
+    return response
+
+def requested_sources():
+    requested = request.args.get("sources")
+    if requested is None:
+        return EVENT_SOURCES
+    return [s for s in requested.split(",") if s in EVENT_SOURCES]
+
+def combined_delta(sources, since, limit, high, store=None):
+    """Returns (deltas, cursor, more) over several sources of a store for events in (since, high]."""
+    if store is None:
+        store = event_store
+    deltas = {}
+    truncated = []
+    for name in sources:
+        events, cursor, more = event_delta(store.source(name), since, limit, until=high)
+        deltas[name] = events
+        if more:
+            truncated.append(cursor)
+
+    # Sequence IDs are global, so a single cursor works for all sources. When a source was cut
+    # short by the limit, the cursor stops there and newer events of other sources are held back.
+    if truncated:
+        cursor = min(truncated)
+        deltas = {name: [e for e in events if e["seq"] <= cursor] for name, events in deltas.items()}
+    else:
+        cursor = max(since, high)
+    return deltas, cursor, bool(truncated)
+
+# Push channel settings: at most one message per STREAM_MIN_INTERVAL seconds per client, a comment
+# line every STREAM_KEEPALIVE seconds of silence, and at most STREAM_BATCH events per source per message.
+STREAM_MIN_INTERVAL = float(os.environ.get("DRAGON_STREAM_MIN_INTERVAL", 0.5))
+STREAM_KEEPALIVE = 15
+STREAM_BATCH = 500
+
+def sse_message(event, data, event_id=None):
+    message = f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n" + message
+    return message
+
+def stream_updates(cursor, sources, last_risk):
+    """
+    One push step, shared with the asynchronous server in asgi.py. Returns (messages, cursor,
+    last_risk, more); `more` means a delta was cut at STREAM_BATCH and the next step should run
+    without waiting.
+    """
+    messages = []
+    high = event_store.last_seq
+    if high > cursor and sources:
+        deltas, cursor, more = combined_delta(sources, cursor, STREAM_BATCH, high)
+        messages.append(sse_message("events", {"events": deltas, "cursor": cursor, "more": more}, cursor))
+        if more:
+            return messages, cursor, last_risk, True
+    cursor = max(cursor, high)
+    risk = risk_payload()
+    if risk != last_risk:
+        messages.append(sse_message("risk", risk))
+        last_risk = risk
+    return messages, cursor, last_risk, False
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    Server-Sent Events channel pushing event deltas ("events") and risk scores ("risk").
+    Resumes from the Last-Event-ID header on reconnect, otherwise from ?since=<cursor>.
+    """
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", default=0, type=int)
+    sources = requested_sources()
+
+    def generate():
+        cursor = since
+        last_risk = None
+        yield "retry: 2000\n\n"
+        while True:
+            messages, cursor, last_risk, more = stream_updates(cursor, sources, last_risk)
+            yield from messages
+            if more:
+                continue
+            # Coalesce bursts: events arriving during the minimum interval go out in one message.
+            last_push = time.monotonic()
+            if not event_store.wait_for(cursor, timeout=STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+            delay = last_push + STREAM_MIN_INTERVAL - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def risk_view(snapshot, key, digits=None):
+    # One flat {<source>_risk, <source>_status, aggregate, aggregate_status} view of the engine state.
+    view = {}
+    aggregate = 0
+    for name in EVENT_SOURCES:
+        value = snapshot[name][key]
+        if digits is not None:
+            value = round(value, digits)
+        view[f"{name}_risk"] = value
+        view[f"{name}_status"] = get_status(value)
+        aggregate += value
+    if digits is not None:
+        aggregate = round(aggregate, digits)
+    view["aggregate"] = aggregate
+    view["aggregate_status"] = get_status(aggregate)
+    return view
+
+def risk_payload():
+    """
+    Reads the risk engine in constant time. The top-level fields are the cumulative session
+    totals; "windowed" covers the last DRAGON_RISK_WINDOW seconds and "decayed" weights recent
+    events more heavily, so their statuses stay meaningful in long sessions.
+    """
+    snapshot = risk_engine.snapshot()
+    payload = risk_view(snapshot, "cumulative")
+
+    # Set kickout flag if aggregate risk is 1000 or higher.
+    payload["kickout"] = True if payload["aggregate"] >= 1000 else False
+    payload["windowed"] = risk_view(snapshot, "windowed")
+    payload["windowed"]["window_seconds"] = risk_engine.window
+    payload["decayed"] = risk_view(snapshot, "decayed", digits=2)
+    payload["decayed"]["half_life_seconds"] = risk_engine.half_life
+    return payload
+
+@app.route('/api/risk')
+def api_risk():
+    return jsonify(risk_payload())
+
+TIMESERIES_MAX_POINTS = 2000
+
+@app.route('/api/timeseries')
+def api_timeseries():
+    """
+    Downsampled per-source series for charting:
+    ?start=&end=(epoch seconds)&points=<per series>&method=lttb|minmax&sources=mouse,face
+
+    Every source gets its cumulative risk over time and its event rate (events per second) in
+    `points` buckets, so the response size is bounded by `points` whatever the session length.
+    """
+    method = request.args.get("method", "lttb")
+    if method not in DOWNSAMPLERS:
+        return jsonify({"status": "invalid method, use 'lttb' or 'minmax'"}), 400
+    etag = make_etag("timeseries", event_store.last_seq)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    points = min(max(request.args.get("points", default=500, type=int), 10), TIMESERIES_MAX_POINTS)
+    sources = requested_sources()
+    arrays = {name: event_arrays(event_store.source(name)) for name in sources}
+    start, end = time_bounds(arrays.values(), request.args.get("start", type=float),
+                             request.args.get("end", type=float))
+
+    series = {}
+    for name, (times, risks) in arrays.items():
+        if start is None or end is None:
+            series[name] = {"risk": {"t": [], "v": []}, "rate": {"t": [], "v": []}}
+            continue
+        # Risk of events already evicted from the in-memory log is still in the engine's total.
+        offset = max(risk_engine.cumulative(name) - risks.sum(), 0.0)
+        risk_t, risk_v = risk_series(times, risks, start, end, points, method, offset)
+        rate_t, rate_v = rate_series(times, start, end, points)
+        series[name] = {
+            "risk": {"t": risk_t.tolist(), "v": risk_v.tolist()},
+            "rate": {"t": rate_t.tolist(), "v": rate_v.tolist()},
+        }
+    response = jsonify({"start": start, "end": end, "points": points, "method": method, "series": series})
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/register_copy', methods=['POST'])
+def register_copy():
+    data = request.json
+    if data and 'content' in data:
+        content = data['content']
+        word_count = len(content.split())
+        digest, matches = content_store.put(content)
+        event = {
+            "timestamp": time.time(),
+            "event": "Copy-Paste (Client)",
+            "content_preview": content[:50],
+            "content_hash": digest,
+            "length": len(content),
+            "word_count": word_count
+        }
+        event.update(match_fields(matches))
+        copy_tracker.event_log.append(event)
+        logging.info("Registered copy event: " + str(event))
+        return jsonify({"status": "success"}), 200
+    return jsonify({"status": "error"}), 400
+
+@app.route('/api/copy_reference', methods=['POST'])
+def copy_reference():
+    """Registers a reference text, e.g. an exam question: {"label": ..., "content": ...}. Copies
+    close to it are reported with its label."""
+    data = request.json
+    if not data or not data.get('content') or not data.get('label'):
+        return jsonify({"status": "error"}), 400
+    digest, _ = content_store.put(data['content'], label=data['label'])
+    return jsonify({"status": "success", "hash": digest}), 200
+
+@app.route('/api/copy_content/<digest>')
+def copy_content(digest):
+    """The copied text an event's content_hash refers to."""
+    text = content_store.get(digest)
+    if text is None:
+        return jsonify({"status": "unknown content hash"}), 404
+    return Response(text, mimetype="text/plain")
+
+def full_content(event):
+    # Events journaled before the content store carry their text inline.
+    if "content_hash" in event:
+        return content_store.get(event["content_hash"]) or ""
+    return event.get("full_content", "")
+
+# Central-server ingestion: candidate agents POST NDJSON batches (optionally gzip-compressed) of
+# {"session": id, "source": name, "event": {...}} records. Each session gets its own event store
+# and risk state, separate from this machine's trackers.
+session_registry = SessionRegistry(
+    EVENT_SOURCES,
+    capacity=int(os.environ.get("DRAGON_SESSION_CAPACITY", 5000)),
+    max_sessions=int(os.environ.get("DRAGON_MAX_SESSIONS", 1000)),
+    max_concurrent=int(os.environ.get("DRAGON_INGEST_CONCURRENCY", 8)),
+    rate=float(os.environ.get("DRAGON_INGEST_RATE", 2000)),
+    idle_timeout=float(os.environ.get("DRAGON_SESSION_IDLE", 3600)),
+    window=risk_engine.window,
+    half_life=risk_engine.half_life)
+
+@app.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    """Batch ingest; the X-Session-ID header sets the session of records that do not name one."""
+    try:
+        result = session_registry.ingest(request.get_data(cache=False), request.content_encoding,
+                                         request.headers.get("X-Session-ID"))
+    except IngestError as e:
+        response = jsonify({"status": str(e)})
+        response.status_code = e.status
+        if e.retry_after is not None:
+            response.headers["Retry-After"] = str(e.retry_after)
+        return response
+    return jsonify(result)
+
+@app.route('/api/sessions')
+def api_sessions():
+    summaries = session_registry.summaries()
+    return jsonify({"sessions": [{k: v for k, v in s.items() if k != "sources"} for s in summaries],
+                    "accepted": session_registry.accepted, "refused": session_registry.refused,
+                    "expired": session_registry.expired})
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def api_close_session(session_id):
+    summary = session_registry.close(session_id)
+    if summary is None:
+        return jsonify({"status": "unknown session"}), 404
+    return jsonify({"status": "session closed", "session": {k: v for k, v in summary.items() if k != "sources"}})
+
+@app.route('/api/sessions/<session_id>')
+def api_session(session_id):
+    session = session_registry.session(session_id, create=False)
+    if session is None:
+        return jsonify({"status": "unknown session"}), 404
+    payload = session.summary(time.time())
+    since = request.args.get("since", type=int)
+    if since is not None:
+        # Same cursor protocol as /api/events, over this session's own store.
+        limit = request.args.get("limit", type=int)
+        deltas, cursor, more = combined_delta(requested_sources(), since, limit, session.store.last_seq,
+                                              store=session.store)
+        payload["delta"] = {"events": deltas, "cursor": cursor, "more": more}
+    return jsonify(payload)
+
+@app.route('/api/network_lockdown', methods=['GET'])
+def api_network_lockdown():
+    state = request.args.get("state", "").lower()
+    if state == "on":
+        if network_lockdown.activate():
+            return jsonify({"status": "lockdown activated",
+                            "apply_ms": network_lockdown.backend.last_seconds * 1e3}), 200
+        return jsonify({"status": "lockdown failed, firewall unchanged"}), 500
+    elif state == "off":
+        if network_lockdown.deactivate():
+            return jsonify({"status": "lockdown deactivated",
+                            "apply_ms": network_lockdown.backend.last_seconds * 1e3}), 200
+        return jsonify({"status": "failed to deactivate lockdown"}), 500
+    else:
+        return jsonify({"status": "invalid state"}), 400
+
+@app.route('/api/shortcuts', methods=['GET'])
+def api_shortcuts():
+    state = request.args.get("state", "").lower()
+    if state == "disable":
+        result = copy_tracker.disable_shortcuts()
+        if result:
+            return jsonify({"status": "shortcuts disabled"}), 200
+        else:
+            return jsonify({"status": "shortcuts already disabled"}), 200
+    elif state == "enable":
+        result = copy_tracker.enable_shortcuts()
+        if result:
+            return jsonify({"status": "shortcuts enabled"}), 200
+        else:
+            return jsonify({"status": "shortcuts already enabled"}), 200
+    else:
+        return jsonify({"status": "invalid state, use 'disable' or 'enable'"}), 400
+
+@app.route('/api/shortcut_policy', methods=['GET', 'POST'])
+def api_shortcut_policy():
+    """GET returns the shortcut policy (?reload=1 re-reads its file first); POST replaces it with
+    a JSON list of {"keys": "ctrl+c", "action": "block" | "allow" | "log", "risk": 5}. The
+    keyboard hook uses the new policy from its next keypress."""
+    try:
+        if request.method == 'POST':
+            rules = request.json
+            if not isinstance(rules, list):
+                return jsonify({"status": "expected a list of rules"}), 400
+            shortcut_policy.set(ShortcutPolicy(rules))
+        elif request.args.get("reload"):
+            shortcut_policy.reload(force=True)
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+        return jsonify({"status": f"invalid shortcut policy: {exc}"}), 400
+    return jsonify({"path": shortcut_policy.path, "rules": shortcut_policy.current.to_list()}), 200
+
+@app.route('/api/stop_video', methods=['GET'])
+def stop_video_endpoint():
+    face_detector.stop_video()
+    return jsonify({"status": "video stream stopped"}), 200
+
+@app.route('/api/test_voice_detection', methods=['POST'])
+def test_voice_detection():
+    try:
+        has_voice, recording_file = voice_detector.detect_voice()
+        return jsonify({
+            "voice_detected": has_voice,
+            "recording_path": recording_file if has_voice else None
+        })
+    except Exception as e:
+        logging.error(f"Error in voice detection API: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/voice_events')
+def voice_events():
+    events = voice_detector.event_log.snapshot()
+    logging.info("Voice event log: " + str(events))
+    return jsonify(events)
+
+# CSV Export Endpoints.
+# Exports are streamed: rows are generated lazily from the event logs and written out in chunks,
+# so memory stays bounded however long the session is. All of them accept ?start=&end= (epoch
+# seconds) to export only part of the session.
+def export_range(events):
+    return in_time_range(events, request.args.get("start", type=float), request.args.get("end", type=float))
+
+def csv_response(filename, header, rows):
+    return Response(stream_csv(header, rows), mimetype="text/csv",
+                    headers={"Content-Disposition": f"attachment;filename={filename}"})
+
+@app.route('/download/mouse_csv')
+def download_mouse_csv():
+    # One row per episode (or click): start, end, flagged sample count, peaks and bounding box.
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('end', ''),
+        event.get('event', ''),
+        event.get('samples', ''),
+        event.get('peak_speed', ''),
+        event.get('max_angle', ''),
+        event.get('bbox', ''),
+        event.get('position', ''),
+        event.get('risk', '')
+    ] for event in export_range(mouse_tracker.event_log))
+    return csv_response("mouse_events.csv", ['timestamp', 'end', 'event', 'samples', 'peak_speed', 'max_angle',
+                                             'bbox', 'position', 'risk'], rows)
+
+@app.route('/download/window_csv')
+def download_window_csv():
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('window', ''),
+        event.get('process', ''),
+        event.get('category', ''),
+        event.get('rule', ''),
+        event.get('duration', ''),
+        event.get('risk', '')
+    ] for event in export_range(window_tracker.event_log))
+    return csv_response("window_events.csv", ['timestamp', 'window', 'process', 'category', 'rule', 'duration',
+                                              'risk'], rows)
+
+@app.route('/download/copy_csv')
+def download_copy_csv():
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('shortcut', ''),
+        event.get('content_preview', ''),
+        event.get('content_hash', ''),
+        event.get('length', ''),
+        event.get('word_count', ''),
+        event.get('near_duplicate', ''),
+        event.get('similarity', ''),
+        event.get('reference', ''),
+        full_content(event)
+    ] for event in export_range(copy_tracker.event_log))
+    return csv_response("copy_events.csv",
+                        ['timestamp', 'event', 'shortcut', 'content_preview', 'content_hash', 'length',
+                         'word_count', 'near_duplicate', 'similarity', 'reference', 'full_content'], rows)
+
+@app.route('/download/peripheral_csv')
+def download_peripheral_csv():
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('device', event.get('Caption', 'Unknown')),
+        event.get('kind', ''),
+        event.get('risk', '')
+    ] for event in export_range(peripheral_detector.event_log))
+    return csv_response("peripheral_events.csv", ['timestamp', 'event', 'device', 'kind', 'risk'], rows)
+
+def face_event_details(event):
+    details = ""
+    if "faces_detected" in event:
+        details = f"Faces: {event['faces_detected']}"
+    elif "duration" in event:
+        details = f"Duration: {event['duration']:.2f} s, intervals: {event.get('intervals', '')}"
+    elif "vertical_diff" in event:
+        details = f"Vertical diff: {event['vertical_diff']:.2f}"
+    elif "left_eye_x" in event and "right_eye_x" in event:
+        details = f"Horizontal alignment: left_eye_x={event['left_eye_x']}, right_eye_x={event['right_eye_x']}"
+    return details
+
+@app.route('/download/face_csv')
+def download_face_csv():
+    rows = ([event.get('timestamp', ''), event.get('event', ''), event.get('risk', ''), face_event_details(event)]
+            for event in export_range(face_detector.eye_risk_events))
+    return csv_response("face_events.csv", ['timestamp', 'event', 'risk', 'details'], rows)
+
+@app.route('/download/voice_csv')
+def download_voice_csv():
+    rows = ([
+        event.get('timestamp', ''),
+        event.get('event', ''),
+        event.get('duration', ''),
+        event.get('risk_score', ''),
+        event.get('recording_file', '')
+    ] for event in export_range(voice_detector.event_log))
+    return csv_response("voice_events.csv", ['timestamp', 'event', 'duration', 'risk_score', 'recording_file'], rows)
+
+@app.route('/download/columnar')
+def download_columnar():
+    """
+    Typed columnar export for offline analysis: ?format=arrow|npz&sources=mouse,face&start=&end=.
+    Clipboard payloads (full_content, read back from the content store) are left out unless
+    ?content=1 is given.
+    """
+    fmt = request.args.get("format", "npz")
+    if fmt not in ("arrow", "npz"):
+        return jsonify({"status": "invalid format, use 'arrow' or 'npz'"}), 400
+    with_content = request.args.get("content") == "1"
+    exclude = () if with_content else ("full_content",)
+    records = ((name, dict(event, full_content=full_content(event)) if with_content and name == "copy" else event)
+               for name in requested_sources() for event in export_range(event_store.source(name)))
+    payload, mimetype, extension = columnar_export(records, fmt, exclude=exclude)
+    return Response(payload, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment;filename=events.{extension}"})
+
+@app.route('/download/mouse_trajectory')
+def download_mouse_trajectory():
+    """The recorded pointer trajectory as delta-encoded chunks; read it back with trajectory.decode."""
+    return Response(mouse_trajectory.to_bytes(), mimetype="application/octet-stream",
+                    headers={"Content-Disposition": "attachment;filename=mouse_trajectory.trj"})
+
+# Replayed episodes are only returned, so they are not logged as live detections.
+logging.getLogger("MouseBehaviorTracker.replay").setLevel(logging.ERROR)
+
+@app.route('/api/mouse_replay')
+def api_mouse_replay():
+    """
+    Replays the recorded trajectory through the mouse detection logic:
+    ?start=&end=(epoch seconds)&speed_threshold=&angle_threshold=&episode_gap=
+    Defaults are the live tracker's settings, so thresholds can be tried out after the fact.
+    """
+    samples = mouse_trajectory.samples(request.args.get("start", type=float), request.args.get("end", type=float))
+    replayer = MouseBehaviorTracker(
+        speed_threshold=request.args.get("speed_threshold", default=mouse_tracker.speed_threshold, type=float),
+        angle_threshold=request.args.get("angle_threshold", default=mouse_tracker.angle_threshold, type=float),
+        episode_gap=request.args.get("episode_gap", default=mouse_tracker.episode_gap, type=float),
+        speed_window=mouse_tracker.speed_window,
+        event_log=EventLog("mouse-replay", capacity=event_store.capacity),
+        buffer_size=1)
+    replayer.logger = logging.getLogger("MouseBehaviorTracker.replay")
+    events = replay(samples, replayer)
+    return jsonify({
+        "samples": len(samples),
+        "recorded_samples": mouse_trajectory.samples_seen,
+        "trajectory_bytes": mouse_trajectory.nbytes,
+        "tolerance": mouse_trajectory.tolerance,
+        "risk": replayer.risk_score,
+        "events": events,
+    })
+
+@app.route('/download/graph_csv')
+def download_graph_csv():
+    # Face and voice events merged in timestamp order (see timeline.timeline).
+    logs = {"face": face_detector.eye_risk_events, "voice": voice_detector.event_log}
+    rows = ([event.get("timestamp", ""), event.get("risk", event.get("risk_score", "")), source]
+            for source, event in timeline(logs, request.args.get("start", type=float),
+                                          request.args.get("end", type=float)))
+    return csv_response("graph_data.csv", ["timestamp", "risk", "source"], rows)
+
+# Combined timeline of all sources, merged in timestamp order (?sources=&start=&end=).
+TIMELINE_PAGE_SIZE = 1000
+TIMELINE_FIELDS = ("timestamp", "seq", "event", "risk", "risk_score")
+
+def requested_timeline():
+    logs = {name: event_store.source(name) for name in requested_sources()}
+    return timeline(logs, request.args.get("start", type=float), request.args.get("end", type=float))
+
+@app.route('/api/timeline')
+def api_timeline():
+    """Merged events of several sources: ?start=&end=&sources=&offset=&limit=(default 1000)."""
+    etag = make_etag("timeline", event_store.last_seq)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    offset = max(request.args.get("offset", default=0, type=int), 0)
+    limit = min(max(request.args.get("limit", default=TIMELINE_PAGE_SIZE, type=int), 1), TIMELINE_PAGE_SIZE)
+    items, more = page(requested_timeline(), offset, limit)
+    events = [dict(event, source=source) for source, event in items]
+    response = jsonify({"events": events, "offset": offset, "more": more})
+    response.set_etag(etag)
+    return response
+
+@app.route('/download/timeline_csv')
+def download_timeline_csv():
+    # Common fields get their own columns; the rest of each event goes into a JSON "details" column.
+    def rows(merged):
+        for source, event in merged:
+            details = {k: v for k, v in event.items() if k not in TIMELINE_FIELDS}
+            yield ([event.get("timestamp", ""), source, event.get("seq", ""), event.get("event", ""),
+                    event.get("risk", event.get("risk_score", "")), json.dumps(details, default=json_default)])
+    return csv_response("timeline.csv", ["timestamp", "source", "seq", "event", "risk", "details"],
+                        rows(requested_timeline()))
+
+@app.route('/download/timeline_ndjson')
+def download_timeline_ndjson():
+    def generate(merged):
+        lines = []
+        for source, event in merged:
+            lines.append(json.dumps({"source": source, "event": event}, default=json_default))
+            if len(lines) >= CSV_CHUNK_ROWS:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+    return Response(generate(requested_timeline()), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": "attachment;filename=timeline.ndjson"})
+
+# Graph endpoints using Matplotlib (Agg canvas, cached per event-log version).
+graph_renderer = GraphRenderer()
+
+@app.route('/graph/<event_type>')
+def graph_event(event_type):
+    if event_type not in EVENT_SOURCES:
+        return "Invalid event type", 400
+    events = event_store.source(event_type)
+    # Optional ?w=&h= figure size in inches, clamped to keep renders cheap.
+    width = min(max(request.args.get("w", default=8.0, type=float), 2.0), 20.0)
+    height = min(max(request.args.get("h", default=4.0, type=float), 1.0), 12.0)
+
+    png = graph_renderer.render(event_type, events, events.last_seq, size=(width, height))
+    if png is None:
+        return "No data available", 404
+    return Response(png, mimetype='image/png')
+
+# Operational metrics in the Prometheus text format at /metrics. Hot paths only bump counters and
+# histograms; sizes and queue depths are read when /metrics is scraped.
+HTTP_SECONDS = metrics.histogram("dragon_http_request_seconds", "Flask handler latency until the response is returned.",
+                                 ("endpoint", "method"))
+HTTP_RESPONSES = metrics.counter("dragon_http_responses_total", "HTTP responses by endpoint and status.",
+                                 ("endpoint", "status"))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # The endpoint name, not the path, keeps label cardinality bounded.
+        endpoint = request.endpoint or "unmatched"
+        HTTP_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        HTTP_RESPONSES.labels(endpoint, response.status_code).inc()
+    return response
+
+def estimated_log_bytes(log, sample=32):
+    # Extrapolates from the first few retained events; exact sizing would walk every event.
+    events = list(islice(log, sample))
+    if not events:
+        return 0
+    size = 0
+    for event in events:
+        size += sys.getsizeof(event)
+        for key, value in event.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size * len(log) // len(events)
+
+metrics.counter("dragon_mouse_on_move_calls_total", "Pointer move callbacks handled.").set_function(
+    lambda: mouse_tracker.move_calls)
+metrics.counter("dragon_mouse_samples_dropped_total", "Pointer samples overwritten before the analysis worker read them.").set_function(
+    lambda: mouse_tracker.dropped)
+metrics.counter("dragon_window_rule_cache_total", "Window classifications by LRU cache outcome.",
+                ("result",)).set_function(
+    lambda: {("hit",): window_rules.cache_info().hits, ("miss",): window_rules.cache_info().misses})
+metrics.gauge("dragon_content_store_texts", "Distinct copied texts in the content store.").set_function(
+    lambda: len(content_store))
+metrics.gauge("dragon_content_store_resident_bytes", "Copied text held in memory by the content store.").set_function(
+    lambda: content_store.bytes_in_memory)
+metrics.counter("dragon_events_total", "Events recorded per source.", ("source",)).set_function(
+    lambda: {(name,): event_store.source(name).total for name in EVENT_SOURCES})
+metrics.gauge("dragon_event_log_events", "Events retained in memory per source.", ("source",)).set_function(
+    lambda: {(name,): len(event_store.source(name)) for name in EVENT_SOURCES})
+metrics.gauge("dragon_event_log_estimated_bytes", "Estimated memory held by each in-memory event log.",
+              ("source",)).set_function(
+    lambda: {(name,): estimated_log_bytes(event_store.source(name)) for name in EVENT_SOURCES})
+metrics.gauge("dragon_journal_pending_events", "Events queued for the journal writer.").set_function(
+    lambda: event_journal.pending() if event_journal is not None else 0)
+metrics.counter("dragon_journal_written_events_total", "Events written to the journal.").set_function(
+    lambda: event_journal.written if event_journal is not None else 0)
+metrics.gauge("dragon_ingest_sessions", "Remote sessions held by the ingest registry.").set_function(
+    lambda: len(session_registry.sessions))
+metrics.counter("dragon_ingest_refused_batches_total", "Ingest batches refused with 429/503.").set_function(
+    lambda: session_registry.refused)
+metrics.counter("dragon_ingest_expired_sessions_total", "Remote sessions dropped after going idle.").set_function(
+    lambda: session_registry.expired)
+metrics.gauge("dragon_video_viewers", "Connected /video_feed viewers.").set_function(
+    lambda: frame_broadcaster.viewers)
+metrics.gauge("dragon_graph_cache_entries", "PNGs held by the graph cache.").set_function(
+    lambda: graph_renderer.stats()["entries"])
+metrics.gauge("dragon_threads", "Live Python threads.").set_function(threading.active_count)
+if psutil is not None:
+    process = psutil.Process()
+    metrics.gauge("dragon_process_resident_bytes", "Resident memory of this process.").set_function(
+        lambda: process.memory_info().rss)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.REGISTRY.CONTENT_TYPE)
+
+# Sampling faster than 1 kHz mostly measures the sampler itself.
+PROFILE_MIN_INTERVAL = 0.001
+
+@app.route('/api/profile', methods=['GET'])
+def api_profile():
+    """
+    Runtime profiling of every tracker thread.
+    ?state=on[&interval=<seconds between samples>] | ?state=off switches the sampler on or off.
+    Otherwise returns the last ?seconds= (default 30) as a top-?n= table with per-thread CPU and
+    per-stage spans (format=top, the default) or as collapsed stacks for flamegraph.pl or
+    speedscope (format=collapsed); &thread=<name> narrows either to one thread.
+    """
+    state = request.args.get("state", "").lower()
+    if state == "on":
+        interval = request.args.get("interval", type=float)
+        if interval is not None:
+            interval = min(max(interval, PROFILE_MIN_INTERVAL), 1.0)
+        PROFILER.start(interval)
+        return jsonify(PROFILER.status()), 200
+    elif state == "off":
+        PROFILER.stop()
+        return jsonify(PROFILER.status()), 200
+    elif state:
+        return jsonify({"status": "invalid state, use 'on' or 'off'"}), 400
+
+    seconds = min(max(request.args.get("seconds", default=30, type=int), 1), PROFILER.window)
+    thread = request.args.get("thread")
+    fmt = request.args.get("format", "top")
+    if fmt == "collapsed":
+        return Response(PROFILER.collapsed(seconds, thread), mimetype='text/plain')
+    elif fmt == "top":
+        limit = min(max(request.args.get("n", default=20, type=int), 1), 500)
+        result = PROFILER.top(seconds, limit, thread)
+        result["profiler"] = PROFILER.status()
+        return jsonify(result)
+    else:
+        return jsonify({"status": "invalid format, use 'top' or 'collapsed'"}), 400
+
+# Kickout route.
+@app.route('/kickout')
+def kickout():
+    return """
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+      <meta charset="UTF-8">
+      <title>Kicked Out</title>
+      <style>
+        body { background-color: #1a1a1a; color: #fff; text-align: center; padding-top: 50px; }
+        h1 { font-size: 3em; }
+      </style>
+    </head>
+    <body>
+      <h1>You have been kicked out.</h1>
+      <p>Your overall risk score exceeded the allowed threshold.</p>
+    </body>
+    </html>
+    """
+
+if __name__ == '__main__':
+    import argparse
+    import webbrowser
+    parser = argparse.ArgumentParser(description="Dragon proctoring dashboard.")
+    parser.add_argument("--server", choices=("werkzeug", "asgi"), default="werkzeug",
+                        help="'asgi' serves streams from an event loop with uvicorn (see asgi.py).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+    args = parser.parse_args()
+    network_lockdown.allow_inbound(args.port)
+
+    url = f"http://{args.host}:{args.port}/"
+    threading.Thread(target=lambda: webbrowser.open(url), daemon=True).start()
+
+    # Start the trackers in separate threads.
+    threading.Thread(target=mouse_tracker.start, daemon=True).start()
+    threading.Thread(target=window_tracker.start, daemon=True).start()
+    threading.Thread(target=copy_tracker.start, daemon=True).start()
+    threading.Thread(target=peripheral_detector.start, daemon=True).start()
+
+    if args.server == "asgi":
+        import uvicorn
+        import asgi
+        # Open streams never finish on their own, so shutdown does not wait long for them.
+        uvicorn.run(asgi.create_app(sys.modules[__name__]), host=args.host, port=args.port, log_level="warning",
+                    timeout_graceful_shutdown=5)
+    else:
+        # The reloader would import the detectors and models a second time in a child process.
+        app.run(host=args.host, port=args.port, debug=True, use_reloader=False, threaded=True)
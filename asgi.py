@@ -0,0 +1,196 @@
+"""
+Asynchronous serving mode: `python app.py --server asgi`, or `uvicorn --factory asgi:create_app`.
+
+The long-lived streams, /api/stream and /video_feed, are served directly from the event loop, so
+an idle dashboard or video viewer costs a coroutine instead of a thread. Every other route goes to
+the unchanged Flask app on a bounded worker pool (a2wsgi), which is also where blocking work such
+as voice tests and exports runs. The detectors keep their own threads and reach the loop through
+AsyncSignal, so nothing on the loop ever blocks on them. Each stream's push step (delta snapshots,
+JSON encoding, the store lock) runs on a small pool of its own, DRAGON_STREAM_WORKERS threads.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+logger = logging.getLogger("ASGI")
+logger.setLevel(logging.DEBUG)
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+WSGI_WORKERS = int(os.environ.get("DRAGON_WSGI_WORKERS", 32))
+STREAM_WORKERS = int(os.environ.get("DRAGON_STREAM_WORKERS", 4))
+MJPEG_TYPE = b"multipart/x-mixed-replace; boundary=frame"
+
+
+class AsyncSignal:
+    """
+    Wakes coroutines waiting on the event loop from any thread.
+
+    `notify` can be called at tracker rates: a burst of calls schedules a single wakeup, and
+    nothing is scheduled before a loop is bound.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._event = None
+        self._scheduled = False
+
+    def bind(self, loop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self, *args):
+        if self._loop is None or self._scheduled:
+            return
+        self._scheduled = True
+        self._loop.call_soon_threadsafe(self._fire)
+
+    def _fire(self):
+        self._scheduled = False
+        # Waiters hold the old event; swapping in a fresh one re-arms the signal.
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout):
+        """Returns False if nothing was signalled within `timeout` seconds."""
+        if self._loop is None:
+            self.bind(asyncio.get_running_loop())  # The server did not run the lifespan startup.
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+async def until_disconnect(receive, streaming):
+    """Runs the `streaming` coroutine until it finishes or the client goes away."""
+    async def watch():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    tasks = {asyncio.ensure_future(watch()), asyncio.ensure_future(streaming)}
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        error = task.exception()
+        # Writing to a connection that just closed is an ordinary end of stream.
+        if error is not None and not isinstance(error, OSError):
+            raise error
+
+
+def create_app(dashboard=None):
+    """
+    Builds the ASGI application around the dashboard module.
+
+    Args:
+        dashboard (module, optional): The imported app.py module. When app.py runs as a script it
+            passes itself, so the trackers and models are not imported a second time. Defaults to
+            importing app.
+    """
+    if dashboard is None:
+        import app as dashboard
+
+    flask_app = WSGIMiddleware(dashboard.app, workers=WSGI_WORKERS)
+    stream_pool = ThreadPoolExecutor(STREAM_WORKERS, thread_name_prefix="stream")
+    store_signal = AsyncSignal()
+    frame_signal = AsyncSignal()
+    dashboard.event_store.listeners.append(store_signal.notify)
+    dashboard.frame_broadcaster.listeners.append(frame_signal.notify)
+
+    async def stream(scope, receive, send):
+        # Same protocol and coalescing as the Flask /api/stream route, built on stream_updates().
+        args = parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        headers = dict(scope["headers"])
+        try:
+            since = int(headers.get(b"last-event-id") or args.get("since", ["0"])[0])
+        except ValueError:
+            since = 0
+        sources = dashboard.EVENT_SOURCES
+        if "sources" in args:
+            sources = [s for s in args["sources"][0].split(",") if s in dashboard.EVENT_SOURCES]
+
+        async def push():
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            await send({"type": "http.response.body", "body": b"retry: 2000\n\n", "more_body": True})
+            loop = asyncio.get_running_loop()
+            cursor = since
+            last_risk = None
+            while True:
+                # Off the loop: with hundreds of streams, the snapshots and encoding would stall it.
+                messages, cursor, last_risk, more = await loop.run_in_executor(
+                    stream_pool, dashboard.stream_updates, cursor, sources, last_risk)
+                if messages:
+                    await send({"type": "http.response.body", "body": "".join(messages).encode("utf-8"),
+                                "more_body": True})
+                if more:
+                    continue
+                last_push = loop.time()
+                signalled = dashboard.event_store.last_seq > cursor or await store_signal.wait(
+                    dashboard.STREAM_KEEPALIVE)
+                if not signalled:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+                delay = last_push + dashboard.STREAM_MIN_INTERVAL - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+        await until_disconnect(receive, push())
+
+    async def video_feed(scope, receive, send):
+        broadcaster = dashboard.frame_broadcaster
+
+        async def push():
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", MJPEG_TYPE), (b"cache-control", b"no-cache")]})
+            index = 0
+            while True:
+                index, frame = broadcaster.latest(index)
+                if frame is not None:
+                    await send({"type": "http.response.body", "body": frame, "more_body": True})
+                    continue
+                if not broadcaster.running:
+                    break  # The camera stopped or could not be opened.
+                await frame_signal.wait(broadcaster.idle_timeout)
+            await send({"type": "http.response.body", "body": b""})
+
+        broadcaster.attach()
+        try:
+            await until_disconnect(receive, push())
+        finally:
+            broadcaster.detach()
+
+    routes = {"/api/stream": stream, "/video_feed": video_feed}
+
+    async def application(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    loop = asyncio.get_running_loop()
+                    store_signal.bind(loop)
+                    frame_signal.bind(loop)
+                    logger.info("Serving streams from the event loop, other routes on %d workers.", WSGI_WORKERS)
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    stream_pool.shutdown(wait=False)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        route = routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is not None and scope["method"] == "GET":
+            await route(scope, receive, send)
+        else:
+            await flask_app(scope, receive, send)
+
+    return application
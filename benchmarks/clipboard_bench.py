@@ -0,0 +1,146 @@
+"""
+Compares clipboard sources on copy-to-event latency, missed copies, subprocess spawns per minute
+and the memory CopyTracker keeps between copies.
+
+A driver copies scripted text for --seconds: single copies a few seconds apart, quick bursts of
+two copies --burst-gap seconds apart, and now and then a --large-kib paste. Each source feeds a
+real CopyTracker, whose callback timestamps every event.
+
+    python benchmarks/clipboard_bench.py --seconds 30
+
+Sources:
+  spawn   PollingClipboardSource every --interval seconds, reading through a `cat` subprocess as
+          pyperclip does through xclip/xsel on Linux (the previous CopyTracker behaviour)
+  poll    the same poller with an in-process read (pyperclip on Windows/macOS without PyObjC aside)
+  event   FakeClipboardSource: copies are delivered as change notifications, as XFixes does
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clipboard_sources import FakeClipboardSource, PollingClipboardSource  # noqa: E402
+from copy_tracker import CopyTracker  # noqa: E402
+from event_store import EventLog  # noqa: E402
+
+WORDS = "the integral of a function over an interval gives the signed area under its curve".split()
+
+
+def copy_script(seconds, burst_gap, large_kib, seed=9):
+    """(delay_seconds, text) steps."""
+    rng = random.Random(seed)
+    steps, elapsed, index = [], 0.0, 0
+    while elapsed < seconds:
+        delay = rng.uniform(1.5, 4.0)
+        roll = rng.random()
+        if roll < 0.1:
+            text = (" ".join(rng.choices(WORDS, k=12)) + "\n") * (large_kib * 1024 // 80)
+        else:
+            text = " ".join(rng.choices(WORDS, k=rng.randint(3, 60)))
+        index += 1
+        steps.append((delay, f"{index}: {text}"))
+        if 0.1 <= roll < 0.35:
+            index += 1
+            steps.append((burst_gap, f"{index}: " + " ".join(rng.choices(WORDS, k=20))))
+            elapsed += burst_gap
+        elapsed += delay
+    return steps
+
+
+class FileClipboard:
+    """Clipboard contents in a file, read in-process or through a subprocess."""
+
+    def __init__(self):
+        self.fd, self.path = tempfile.mkstemp(prefix="clipboard-bench-")
+
+    def set(self, text):
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as fh:
+            return fh.read()
+
+    def read_subprocess(self):
+        return subprocess.run(["cat", self.path], capture_output=True, check=True).stdout.decode("utf-8")
+
+    def remove(self):
+        os.close(self.fd)
+        os.unlink(self.path)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(name, source, apply, script, seconds):
+    tracker = CopyTracker(event_log=EventLog("copy", capacity=100000), source=source)
+    tracker.logger.setLevel(logging.WARNING)
+    copied = {}
+    latencies = []
+
+    def on_event(event):
+        key = event["content_preview"].split(":", 1)[0]
+        if key in copied:
+            latencies.append(time.time() - copied[key])
+
+    tracker.callback = on_event
+    tracker.start()
+    start = time.time()
+    count = 0
+    for delay, text in script:
+        time.sleep(delay)
+        if time.time() - start > seconds:
+            break
+        apply(text)
+        copied[text.split(":", 1)[0]] = time.time()
+        count += 1
+    time.sleep(1.2)
+    elapsed = time.time() - start
+    tracker.stop()
+    missed = count - len(latencies)
+    print(f"{name:6} {count:6d} {missed:7d} {percentile(latencies, 50) * 1e3:9.2f} "
+          f"{percentile(latencies, 99) * 1e3:9.2f} {source.reads / elapsed * 60:9.1f} "
+          f"{source.spawns / elapsed * 60:10.1f} {sys.getsizeof(tracker.last_hash):10d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--interval", type=float, default=1.0, help="Poll interval of the polling sources.")
+    parser.add_argument("--burst-gap", type=float, default=0.2, help="Seconds between the two copies of a burst.")
+    parser.add_argument("--large-kib", type=int, default=512, help="Size of the occasional large paste.")
+    parser.add_argument("--source", action="append", choices=["spawn", "poll", "event"],
+                        help="Sources to run; repeatable. Defaults to all.")
+    args = parser.parse_args()
+    script = copy_script(args.seconds, args.burst_gap, args.large_kib)
+    largest = max(len(text) for _, text in script)
+    print(f"largest copy {largest / 1024:.0f} KiB; the previous tracker kept the last copy as a str "
+          f"({sys.getsizeof('x' * largest) / 1024:.0f} KiB at worst)")
+    print(f"{'':6} {'copies':>6} {'missed':>7} {'p50 ms':>9} {'p99 ms':>9} {'reads/min':>9} "
+          f"{'spawns/min':>10} {'kept bytes':>10}")
+    for name in args.source or ["spawn", "poll", "event"]:
+        if name == "event":
+            source = FakeClipboardSource()
+            run(name, source, source.copy, script, args.seconds)
+            continue
+        clipboard = FileClipboard()
+        if name == "spawn":
+            source = PollingClipboardSource(clipboard.read_subprocess, interval=args.interval, spawns_per_read=1)
+        else:
+            source = PollingClipboardSource(clipboard.read, interval=args.interval)
+        run(name, source, clipboard.set, script, args.seconds)
+        clipboard.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Measures memory for repeated pastes, and near-duplicate lookup latency, of the content store.
+
+Memory: --pastes copies through /api/register_copy's path. Half are the same --passage-kib exam
+passage, a fifth are lightly edited copies of it, and the rest are distinct snippets. Memory is
+compared (with tracemalloc) between event dicts that carry `full_content`, as before, and events
+that reference a ContentStore by hash.
+
+Lookup: the store is filled with --stored distinct texts of about --words words, then it is
+queried with edited copies of some of them. The LSH lookup is timed against comparing the query's
+signature with every stored signature, and so is the whole query including the signature.
+
+    python benchmarks/content_store_bench.py --pastes 200 --passage-kib 200 --stored 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import ContentStore, match_fields, shingles  # noqa: E402
+
+VOCABULARY = [f"{stem}{suffix}" for stem in ("integr", "deriv", "limit", "seri", "vector", "matri", "proof",
+                                             "theor", "lemm", "funct", "contin", "bound", "converg", "sequen")
+              for suffix in ("al", "ate", "ative", "es", "ion", "ity", "ing", "ed", "s", "")] + \
+    "the a of to in is that for it with as on by this be are from an at which or".split()
+
+
+def text(rng, words):
+    return " ".join(rng.choices(VOCABULARY, k=words))
+
+
+def edit(rng, original, fraction=0.03):
+    words = original.split()
+    for index in rng.sample(range(len(words)), max(1, int(len(words) * fraction))):
+        words[index] = rng.choice(VOCABULARY)
+    return " ".join(words)
+
+
+def paste_stream(count, passage_kib, rng):
+    passage = text(rng, passage_kib * 1024 // 7)
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            yield passage
+        elif roll < 0.7:
+            yield edit(rng, passage)
+        else:
+            yield text(rng, rng.randint(5, 200))
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = build()
+    seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, current, seconds
+
+
+def memory(args):
+    pastes = list(paste_stream(args.pastes, args.passage_kib, random.Random(3)))
+
+    # Every request body arrives as a fresh string, so each paste is decoded anew, as Flask would.
+    def inline():
+        events = []
+        for body in pastes:
+            content = body.decode()
+            events.append({"timestamp": time.time(), "event": "Copy-Paste (Client)", "content_preview": content[:50],
+                           "word_count": len(content.split()), "full_content": content})
+        return events
+
+    def stored():
+        store = ContentStore()
+        events = []
+        for body in pastes:
+            content = body.decode()
+            digest, matches = store.put(content)
+            event = {"timestamp": time.time(), "event": "Copy-Paste (Client)", "content_preview": content[:50],
+                     "content_hash": digest, "length": len(content), "word_count": len(content.split())}
+            event.update(match_fields(matches))
+            events.append(event)
+        return store, events
+
+    pastes = [content.encode() for content in pastes]
+    _, inline_bytes, _ = measure(inline)
+    (store, events), stored_bytes, seconds = measure(stored)
+    flagged = sum(1 for event in events if "near_duplicate" in event)
+    print(f"{args.pastes} pastes, {sum(map(len, pastes)) / 2 ** 20:.1f} MiB pasted, {len(store)} distinct")
+    print(f"  full_content in events: {inline_bytes / 2 ** 20:8.2f} MiB")
+    print(f"  content store + events: {stored_bytes / 2 ** 20:8.2f} MiB  "
+          f"({seconds / args.pastes * 1e3:.2f} ms per paste, {flagged} flagged as near duplicates)")
+
+
+def lookup(args):
+    rng = random.Random(5)
+    texts = [text(rng, rng.randint(args.words // 2, args.words * 2)) for _ in range(args.stored)]
+    store = ContentStore()
+    start = time.perf_counter()
+    for item in texts:
+        store.put(item)
+    fill = time.perf_counter() - start
+    queries = [edit(rng, texts[rng.randrange(len(texts))], 0.05) for _ in range(args.queries)]
+    signatures = [store.hasher.signature(shingles(query, store.shingle_size)) for query in queries]
+    everything = np.array([entry.signature for entry in store._entries.values()])
+
+    start = time.perf_counter()
+    found = sum(1 for signature in signatures if store._matches("", signature))
+    lsh = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    for signature in signatures:
+        similarity = (everything == signature).mean(axis=1)
+        np.flatnonzero(similarity >= store.threshold)
+    brute = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    for query in queries:
+        store.query(query)
+    full = (time.perf_counter() - start) / len(queries)
+    print(f"{args.stored} stored texts of ~{args.words} words (filled in {fill:.1f} s), "
+          f"{args.queries} queries with 5% of words changed: {found} found")
+    print(f"  LSH lookup:           {lsh * 1e6:9.1f} us")
+    print(f"  compare with all:     {brute * 1e6:9.1f} us")
+    print(f"  signature + lookup:   {full * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pastes", type=int, default=200)
+    parser.add_argument("--passage-kib", type=int, default=200)
+    parser.add_argument("--stored", type=int, default=10000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    memory(args)
+    lookup(args)
+
+
+if __name__ == '__main__':
+    main()
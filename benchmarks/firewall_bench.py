@@ -0,0 +1,128 @@
+"""
+Measures lockdown apply latency and subprocesses per apply: the previous NetworkLockdown (four
+`shell=True` netsh commands in a row), and each firewall backend's batch, with and without a
+rollback.
+
+No firewall is touched: every command is replaced by `cat`, fed the batch the backend rendered
+(and, for iptables-save, a saved filter table of --rules rules), so the numbers cover process
+start-up, rendering and the rollback bookkeeping, not the firewall's own work. The same stand-in
+runs the previous commands through a shell, as `shell=True` did.
+
+    python benchmarks/firewall_bench.py --runs 50 --addresses 20
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firewall_backends import (DryRunBackend, FirewallError, IptablesBackend, NetshBackend,  # noqa: E402
+                               NftablesBackend, ruleset)
+
+PREVIOUS = [
+    "netsh advfirewall set allprofiles firewallpolicy blockinbound,blockoutbound",
+    'netsh advfirewall firewall delete rule name="BlockAllOutbound"',
+    'netsh advfirewall firewall add rule name="BlockAllOutbound" dir=out action=block',
+    'netsh advfirewall firewall add rule name="AllowExam" dir=out action=allow program="C:\\exam.exe"',
+]
+
+
+class StandIn:
+    """Runs `cat` for every command, echoing the batch (or a saved table for *-save commands)."""
+
+    def __init__(self, saved, fail_on=None):
+        self.saved = saved
+        self.fail_on = fail_on
+        self.spawns = 0
+
+    def __call__(self, args, input_text=None):
+        self.spawns += 1
+        command = " ".join(args[:2])
+        if args[0].endswith("-save"):
+            input_text = self.saved
+        elif command == "netsh -f":
+            # netsh answers "Ok." per command, and an error message for a failed one.
+            with open(args[2], encoding="utf-8") as fh:
+                replies = ["Ok." for _ in fh]
+            if self.fail_on == command:
+                replies[-1] = "The parameter is incorrect."
+            input_text = "\n".join(replies) + "\n"
+        output = subprocess.run(["cat"], input=input_text or "", capture_output=True, text=True).stdout
+        if command == "netsh advfirewall" and args[2] == "export":
+            open(args[3], "w").close()
+        if self.fail_on == args[0]:
+            raise FirewallError(f"{args[0]} rejected the batch")
+        return output
+
+
+def saved_table(rules):
+    lines = ["*filter", ":INPUT ACCEPT [0:0]", ":FORWARD ACCEPT [0:0]", ":OUTPUT ACCEPT [0:0]"]
+    lines += [f"-A INPUT -s 198.51.100.{index % 250}/32 -p tcp --dport {1024 + index} -j ACCEPT"
+              for index in range(rules)]
+    return "\n".join(lines + ["COMMIT"]) + "\n"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def report(name, timings, spawns, runs):
+    print(f"{name:26} {percentile(timings, 50) * 1e3:8.2f} {percentile(timings, 95) * 1e3:8.2f} {spawns / runs:7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--addresses", type=int, default=20, help="Allowed addresses in the rule set.")
+    parser.add_argument("--rules", type=int, default=200, help="Rules already in the saved iptables table.")
+    args = parser.parse_args()
+    logging.getLogger("FirewallBackends").setLevel(logging.ERROR)
+    rules = ruleset(["C:\\exam.exe"], [f"203.0.113.{index}" for index in range(args.addresses)], [5000])
+    saved = saved_table(args.rules)
+    state_dir = tempfile.mkdtemp(prefix="firewall-bench-")
+
+    print(f"{'':26} {'p50 ms':>8} {'p95 ms':>8} {'spawns':>7}")
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        for command in PREVIOUS:
+            subprocess.run(f"cat /dev/null # {command}", shell=True)
+        timings.append(time.perf_counter() - start)
+    report("previous (4 x shell=True)", timings, 4 * args.runs, args.runs)
+
+    cases = [
+        ("nftables", lambda run: NftablesBackend(run=run), None),
+        ("iptables-restore", lambda run: IptablesBackend(run=run), None),
+        ("iptables, v6 rejected", lambda run: IptablesBackend(run=run), "ip6tables-restore"),
+        ("netsh batch", lambda run: NetshBackend(run=run, state_dir=state_dir), None),
+        ("netsh, batch rejected", lambda run: NetshBackend(run=run, state_dir=state_dir), "netsh -f"),
+    ]
+    for name, make, fail_on in cases:
+        run = StandIn(saved, fail_on=fail_on)
+        backend = make(run)
+        timings = []
+        for _ in range(args.runs):
+            try:
+                backend.apply(rules)
+            except FirewallError:
+                pass
+            timings.append(backend.last_seconds)
+            if isinstance(backend, NetshBackend) and os.path.exists(backend.snapshot):
+                os.unlink(backend.snapshot)
+        report(name, timings, run.spawns, args.runs)
+
+    dry = DryRunBackend()
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        dry.apply(rules)
+    print(f"{'dry run (render only)':26} {(time.perf_counter() - start) / args.runs * 1e3:8.3f}")
+    os.rmdir(state_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark for /graph/<event_type> rendering: cold (new event-log version) and warm (cached)
+latency of GraphRenderer against the previous pyplot implementation, for growing sessions.
+
+    python benchmarks/graph_bench.py --sizes 100 1000 10000 100000
+"""
+import os
+import sys
+import time
+import argparse
+from io import BytesIO
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventLog  # noqa: E402
+from graph_renderer import GraphRenderer  # noqa: E402
+
+
+def pyplot_render(events):
+    # The route's original implementation, kept here as the baseline.
+    times = [e["timestamp"] for e in events]
+    values = [e.get("risk", 1) for e in events]
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.plot(times, values, marker='o', linestyle='-', color='cyan')
+    ax.set_xlabel('Timestamp')
+    ax.set_ylabel('Risk Value')
+    ax.set_title('Face Events Graph')
+    ax.grid(True)
+    fig.tight_layout()
+    buf = BytesIO()
+    plt.savefig(buf, format='png')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'events':>8} {'pyplot ms':>10} {'cold ms':>9} {'warm ms':>9}")
+    for size in args.sizes:
+        log = EventLog("face", capacity=size)
+        for i in range(size):
+            log.append({"timestamp": 1_700_000_000.0 + i, "event": "Benchmark", "risk": (i * 7) % 25})
+        renderer = GraphRenderer()
+        baseline = timed(lambda: pyplot_render(log), args.repeat)
+        # A new version per call forces a cache miss, as after every new event.
+        versions = iter(range(10 ** 9))
+        cold = timed(lambda: renderer.render("face", log, next(versions)), args.repeat)
+        renderer.render("face", log, "warm")
+        warm = timed(lambda: renderer.render("face", log, "warm"), args.repeat)
+        print(f"{size:>8} {baseline:>10.1f} {cold:>9.1f} {warm:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
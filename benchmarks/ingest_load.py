@@ -0,0 +1,120 @@
+"""
+Load generator for the /api/ingest batch endpoint.
+
+Simulates candidate agents that each own a few sessions and POST gzip-compressed NDJSON batches
+to a running app.py instance as fast as the server accepts them, honouring Retry-After on 429/503
+responses. Reports sustained accepted events/sec, batch latency percentiles and refusals.
+
+    python benchmarks/ingest_load.py --url http://127.0.0.1:5000 --agents 16 --sessions 200 --batch 500 --duration 20
+"""
+import argparse
+import gzip
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+SOURCES = ("mouse", "window", "copy", "peripheral", "face", "voice")
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_batch(sessions, size, rng):
+    now = time.time()
+    lines = []
+    for i in range(size):
+        source = rng.choice(SOURCES)
+        event = {"timestamp": now + i * 1e-4, "event": "Load test", "risk": rng.randint(0, 5)}
+        if source == "mouse":
+            event.update(speed=rng.uniform(0, 3000), angle_diff=rng.uniform(0, 180), position=[rng.randint(0, 1920), rng.randint(0, 1080)])
+        lines.append(json.dumps({"session": rng.choice(sessions), "source": source, "event": event}))
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+
+class Agent(threading.Thread):
+    def __init__(self, host, port, sessions, batch, deadline, seed):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.sessions = sessions
+        self.batch = batch
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.accepted = 0
+        self.latencies = []
+        self.refusals = {}
+        self.errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        # Batches are pre-built so the generator measures the server, not its own JSON encoding.
+        payloads = [make_batch(self.sessions, self.batch, self.rng) for _ in range(8)]
+        i = 0
+        while time.time() < self.deadline:
+            body = payloads[i % len(payloads)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/api/ingest", body=body,
+                             headers={"Content-Encoding": "gzip", "Content-Type": "application/x-ndjson"})
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            if response.status == 200:
+                self.accepted += json.loads(data)["accepted"]
+            else:
+                self.refusals[response.status] = self.refusals.get(response.status, 0) + 1
+                time.sleep(float(response.getheader("Retry-After", 1)))
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--agents", type=int, default=16, help="Concurrent agent connections.")
+    parser.add_argument("--sessions", type=int, default=200, help="Distinct candidate sessions.")
+    parser.add_argument("--batch", type=int, default=500, help="Events per batch.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run.")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    session_ids = [f"candidate-{i:04d}" for i in range(args.sessions)]
+    deadline = time.time() + args.duration
+    agents = [Agent(url.hostname, url.port or 80, session_ids[i::args.agents] or session_ids, args.batch,
+                    deadline, seed=i)
+              for i in range(args.agents)]
+    start = time.perf_counter()
+    for agent in agents:
+        agent.start()
+    for agent in agents:
+        agent.join()
+    elapsed = time.perf_counter() - start
+
+    accepted = sum(a.accepted for a in agents)
+    latencies = [lat for a in agents for lat in a.latencies]
+    refusals = {}
+    for agent in agents:
+        for status, count in agent.refusals.items():
+            refusals[status] = refusals.get(status, 0) + count
+    print(f"{args.agents} agents, {args.sessions} sessions, {args.batch} events/batch, {elapsed:.1f} s")
+    print(f"  sustained ingest: {accepted / elapsed:,.0f} events/s ({accepted} events in {len(latencies)} requests)")
+    print(f"  batch latency ms: p50 {percentile(latencies, 50) * 1e3:.1f}  p95 {percentile(latencies, 95) * 1e3:.1f}"
+          f"  p99 {percentile(latencies, 99) * 1e3:.1f}")
+    print(f"  refused: {refusals or 'none'}, connection errors: {sum(a.errors for a in agents)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark for the event journal: sustained ingest throughput through EventStore + EventJournal
+with several tracker-like writer threads, then crash-recovery (replay) time into a fresh store
+and risk engine.
+
+    python benchmarks/journal_bench.py --events 200000 --threads 6 --fsync 1.0
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_store import EventStore  # noqa: E402
+from event_journal import EventJournal  # noqa: E402
+from risk_engine import RiskEngine  # noqa: E402
+
+SOURCES = ("mouse", "window", "copy", "peripheral", "face", "voice")
+
+
+def writer(store, source, count, latencies):
+    log = store.source(source)
+    worst = 0.0
+    for i in range(count):
+        start = time.perf_counter()
+        log.append({"timestamp": time.time(), "event": "Benchmark", "risk": i % 7, "index": i})
+        worst = max(worst, time.perf_counter() - start)
+    latencies.append(worst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000, help="Total events to ingest.")
+    parser.add_argument("--threads", type=int, default=6)
+    parser.add_argument("--fsync", type=float, default=1.0, help="fsync interval in seconds (0 = every batch).")
+    parser.add_argument("--dir", default=None, help="Journal directory (default: a temporary one).")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="journal-bench-")
+    try:
+        store = EventStore(capacity=5000)
+        journal = EventJournal(directory, fsync_interval=args.fsync)
+        store.listeners.append(journal.on_event)
+        journal.start()
+
+        per_thread = args.events // args.threads
+        latencies = []
+        threads = [threading.Thread(target=writer, args=(store, SOURCES[i % len(SOURCES)], per_thread, latencies))
+                   for i in range(args.threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        produced = time.perf_counter() - start
+        journal.close()
+        durable = time.perf_counter() - start
+        total = per_thread * args.threads
+        size = sum(os.path.getsize(p) for p in journal.segments())
+
+        print(f"Ingested {total} events with {args.threads} threads")
+        print(f"  tracker-side append rate: {total / produced:,.0f} events/s "
+              f"(worst single append {max(latencies) * 1e3:.2f} ms)")
+        print(f"  durable write rate:       {total / durable:,.0f} events/s ({size / 1e6:.1f} MB on disk)")
+
+        recovered_store = EventStore(capacity=5000)
+        engine = RiskEngine(SOURCES)
+        recovered_store.listeners.append(engine.on_event)
+        start = time.perf_counter()
+        replayed = EventJournal(directory).replay_into(recovered_store)
+        elapsed = time.perf_counter() - start
+        print(f"Recovered {replayed} events in {elapsed:.2f} s ({replayed / elapsed:,.0f} events/s)")
+        print(f"  recovered cumulative risk: {sum(engine.cumulative(s) for s in SOURCES)}, "
+              f"last seq {recovered_store.last_seq} (original {store.last_seq})")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+"""
+Load test for one app.py instance: many dashboards, proctors and video viewers at once.
+
+Simulated clients make the same requests as the pages:
+
+  - dashboards (index.html): GET /, then hold /api/stream?since=0 and, every --graph-every
+    seconds, open an event graph (/graph/<source>), as the modal does;
+  - risk pages (risk.html): GET /risk, then hold /api/stream?sources=;
+  - video viewers (face_detection.html): GET /face_detection, hold /api/stream?sources= and
+    /video_feed;
+  - pollers: GET /api/risk every --poll-interval seconds, as a proctoring tool or script polling
+    the API would. Their latency is the headline figure.
+
+The pages no longer poll; their updates arrive over the held stream, so for them the report
+gives the delay from an event's timestamp to its arrival on each dashboard. That delay includes
+the stream's coalescing interval (DRAGON_STREAM_MIN_INTERVAL, 0.5 s by default).
+
+Without --url a local instance is started: app.py is imported with its trackers left stopped.
+A synthetic camera publishes --fps frames of --frame-kb KiB, and synthetic producers append
+--event-rate events per second to the event store, across all sources. Journaling is off unless
+DRAGON_JOURNAL_DIR is set. With --url an already running instance is tested. Give --pid to
+sample its CPU and RSS (psutil).
+
+    python benchmarks/load_test.py --dashboards 50 --risk-pages 10 --viewers 5 --duration 30
+    python benchmarks/load_test.py --server asgi --dashboards 300 --viewers 20
+
+The clients are threads of one Python process. Past a few hundred connections the generator
+itself can become the bottleneck, so compare runs of the same size.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from collections import defaultdict
+from urllib.parse import urlparse
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SOURCES = ("mouse", "window", "copy", "peripheral", "face", "voice")
+MARKER = "Load test"
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# --- Local instance with stubbed sensors (runs in the child process) ---
+
+def synthetic_camera(fps, frame_kb):
+    """Stands in for face_detector.gen_frames: multipart chunks of a fixed size at `fps`."""
+    def frames():
+        body = os.urandom(frame_kb * 1024)
+        interval = 1.0 / fps
+        next_frame = time.monotonic()
+        while True:
+            next_frame += interval
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + body + b'\r\n'
+    return frames
+
+
+def produce_events(event_store, rate, stop):
+    """Appends `rate` events a second, round-robin over the sources, as the trackers would."""
+    rng = random.Random(1)
+    logs = [event_store.source(name) for name in SOURCES]
+    interval = 1.0 / rate
+    next_event = time.monotonic()
+    count = 0
+    while not stop.is_set():
+        next_event += interval
+        delay = next_event - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        logs[count % len(logs)].append({"timestamp": time.time(), "event": MARKER, "risk": rng.choice((0, 0, 1))})
+        count += 1
+
+
+def serve(args):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault("DRAGON_JOURNAL_DIR", "")
+    import logging
+    import app  # noqa: E402
+    # The event callbacks log every event at INFO; at load-test rates that measures the console.
+    logging.disable(logging.INFO)
+    app.frame_broadcaster.frames = synthetic_camera(args.fps, args.frame_kb)
+    app.frame_broadcaster.on_stop = None
+    stop = threading.Event()
+    if args.event_rate > 0:
+        threading.Thread(target=produce_events, args=(app.event_store, args.event_rate, stop), daemon=True).start()
+    if args.server == "asgi":
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.create_app(app), host="127.0.0.1", port=args.port, log_level="warning",
+                    timeout_graceful_shutdown=1)
+    else:
+        app.app.run(host="127.0.0.1", port=args.port, debug=False, use_reloader=False, threaded=True)
+
+
+def start_instance(args):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port), "--server", args.server,
+               "--fps", str(args.fps), "--frame-kb", str(args.frame_kb), "--event-rate", str(args.event_rate)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                               stderr=None if args.verbose else subprocess.DEVNULL)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The instance exited with {process.returncode}; rerun with --verbose to see why.")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/api/risk")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"The instance did not answer within {args.startup_timeout:.0f} s.")
+
+
+# --- Clients ---
+
+class Results:
+    """Latencies and counts shared by every client thread; `recording` is off during the warm-up."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recording = False
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.deliveries = []
+        self.counts = defaultdict(int)
+
+    def request(self, name, seconds):
+        if self.recording:
+            with self.lock:
+                self.latencies[name].append(seconds)
+
+    def error(self, name):
+        if self.recording:
+            with self.lock:
+                self.errors[name] += 1
+
+    def add(self, name, count=1):
+        if self.recording:
+            with self.lock:
+                self.counts[name] += count
+
+    def delivered(self, delays):
+        if self.recording and delays:
+            with self.lock:
+                self.deliveries.extend(delays)
+
+
+def timed_get(host, port, path, results, name=None):
+    name = name or path
+    start = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+    except (OSError, http.client.HTTPException, RuntimeError):
+        results.error(name)
+        return False
+    results.request(name, time.perf_counter() - start)
+    return True
+
+
+class Client(threading.Thread):
+    """One page: loads it, then holds its streams until `stop` is set."""
+
+    def __init__(self, kind, host, port, results, stop, graph_every=0.0):
+        super().__init__(daemon=True)
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.results = results
+        self.stop = stop
+        self.graph_every = graph_every
+        self.connected = threading.Event()
+        self.failed = False
+        self.page_seconds = None
+        self._rng = random.Random()
+
+    def run(self):
+        page = {"dashboard": "/", "risk": "/risk", "viewer": "/face_detection"}[self.kind]
+        start = time.perf_counter()
+        if not timed_get(self.host, self.port, page, self.results):
+            self.failed = True
+            self.connected.set()
+            return
+        self.page_seconds = time.perf_counter() - start
+        stream = "/api/stream?since=0" if self.kind == "dashboard" else "/api/stream?sources="
+        threads = [threading.Thread(target=self._stream, args=(stream,), daemon=True)]
+        if self.kind == "viewer":
+            threads.append(threading.Thread(target=self._video, daemon=True))
+        for thread in threads:
+            thread.start()
+        if self.kind == "dashboard" and self.graph_every > 0:
+            # Spread the first clicks over the interval so the dashboards don't open graphs in step.
+            wait = self._rng.uniform(0, self.graph_every)
+            while not self.stop.wait(wait):
+                timed_get(self.host, self.port, f"/graph/{self._rng.choice(SOURCES)}", self.results, "/graph/<source>")
+                wait = self.graph_every
+        for thread in threads:
+            thread.join()
+
+    def _open(self, path):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        conn.request("GET", path)
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+        return conn, response
+
+    def _stream(self, path):
+        try:
+            conn, response = self._open(path)
+            self.connected.set()
+            event_type = None
+            while not self.stop.is_set():
+                line = response.readline()
+                if not line:
+                    break
+                if line.startswith(b"event:"):
+                    event_type = line[6:].strip().decode()
+                elif line.startswith(b"data:"):
+                    received = time.time()
+                    self.results.add(f"stream {event_type} messages")
+                    if event_type == "events":
+                        events = json.loads(line[5:])["events"]
+                        self.results.delivered([received - event["timestamp"] for batch in events.values()
+                                                for event in batch if event.get("event") == MARKER])
+            conn.close()
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError):
+            if not self.stop.is_set():
+                self.failed = True
+                self.results.error("/api/stream")
+            self.connected.set()
+
+    def _video(self):
+        try:
+            conn, response = self._open("/video_feed")
+            while not self.stop.is_set():
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                self.results.add("video bytes", len(chunk))
+                self.results.add("video frames", chunk.count(b"--frame\r\n"))
+            conn.close()
+        except (OSError, http.client.HTTPException, RuntimeError):
+            if not self.stop.is_set():
+                self.failed = True
+                self.results.error("/video_feed")
+
+
+def poller(host, port, interval, results, stop):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.request("GET", "/api/risk")
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            results.request("/api/risk", time.perf_counter() - start)
+        except (OSError, http.client.HTTPException, RuntimeError):
+            results.error("/api/risk")
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        stop.wait(interval)
+    conn.close()
+
+
+# --- Server resources ---
+
+class ResourceSampler(threading.Thread):
+    """Samples the server's CPU use, RSS and thread count once a second."""
+
+    def __init__(self, pid, stop):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.stop = stop
+        self.cpu = []
+        self.rss = []
+        self.threads = []
+
+    def run(self):
+        self.process.cpu_percent()
+        while not self.stop.wait(1.0):
+            try:
+                with self.process.oneshot():
+                    self.cpu.append(self.process.cpu_percent())
+                    self.rss.append(self.process.memory_info().rss)
+                    self.threads.append(self.process.num_threads())
+            except psutil.Error:
+                return
+
+
+def report(results, duration, sampler, events_expected):
+    print(f"{'request':24} {'count':>7} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in sorted(set(results.latencies) | set(results.errors)):
+        values = results.latencies.get(name, [])
+        print(f"{name:24} {len(values):7} {results.errors.get(name, 0):6} {len(values) / duration:8.1f} "
+              f"{percentile(values, 50) * 1e3:8.1f} {percentile(values, 95) * 1e3:8.1f} "
+              f"{percentile(values, 99) * 1e3:8.1f}")
+    delays = results.deliveries
+    line = (f"{'event push delay':24} {len(delays):7} {'':6} {len(delays) / duration:8.1f} "
+            f"{percentile(delays, 50) * 1e3:8.1f} {percentile(delays, 95) * 1e3:8.1f} {percentile(delays, 99) * 1e3:8.1f}")
+    print(line + (f"  ({len(delays) / events_expected:.0%} of expected deliveries)" if events_expected else ""))
+    for name in sorted(results.counts):
+        if name.startswith("stream"):
+            print(f"{name:24} {results.counts[name]:7}")
+    frames = results.counts.get("video frames", 0)
+    if frames:
+        print(f"{'video':24} {frames / duration:7.1f} frames/s  "
+              f"{results.counts['video bytes'] / duration / 2 ** 20:.1f} MiB/s")
+    if sampler is not None and sampler.cpu:
+        print(f"server CPU %             mean {sum(sampler.cpu) / len(sampler.cpu):6.1f}  max {max(sampler.cpu):6.1f}")
+        print(f"server RSS MiB           start {sampler.rss[0] / 2 ** 20:6.1f}  end {sampler.rss[-1] / 2 ** 20:6.1f}  "
+              f"max {max(sampler.rss) / 2 ** 20:6.1f}")
+        print(f"server threads           max {max(sampler.threads)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Test this running instance instead of starting one.")
+    parser.add_argument("--pid", type=int, help="Process ID of the --url instance, to sample its CPU and RSS.")
+    parser.add_argument("--server", choices=("werkzeug", "asgi"), default="werkzeug",
+                        help="How the local instance serves (see app.py --server).")
+    parser.add_argument("--dashboards", type=int, default=20, help="index.html tabs.")
+    parser.add_argument("--risk-pages", type=int, default=5, help="risk.html tabs.")
+    parser.add_argument("--viewers", type=int, default=2, help="face_detection.html tabs with the video feed.")
+    parser.add_argument("--pollers", type=int, default=4, help="Clients polling /api/risk.")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between each poller's requests.")
+    parser.add_argument("--graph-every", type=float, default=30.0,
+                        help="Seconds between graph opens per dashboard (0 for none).")
+    parser.add_argument("--event-rate", type=float, default=20.0, help="Synthetic events per second (local instance).")
+    parser.add_argument("--fps", type=float, default=15.0, help="Synthetic camera frames per second (local instance).")
+    parser.add_argument("--frame-kb", type=int, default=40, help="Synthetic frame size in KiB (local instance).")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds after connecting before measuring.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds measured.")
+    parser.add_argument("--startup-timeout", type=float, default=180.0,
+                        help="Seconds to wait for the local instance (it loads the face models).")
+    parser.add_argument("--verbose", action="store_true", help="Show the local instance's log.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    process = None
+    pid = args.pid
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        print("Starting a local instance with stubbed sensors...")
+        process, port = start_instance(args)
+        host, pid = "127.0.0.1", process.pid
+
+    results = Results()
+    stop = threading.Event()
+    try:
+        clients = ([Client("dashboard", host, port, results, stop, args.graph_every) for _ in range(args.dashboards)] +
+                   [Client("risk", host, port, results, stop) for _ in range(args.risk_pages)] +
+                   [Client("viewer", host, port, results, stop) for _ in range(args.viewers)])
+        start = time.time()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.connected.wait(timeout=60)
+        connected = sum(client.connected.is_set() and not client.failed for client in clients)
+        loads = [client.page_seconds for client in clients if client.page_seconds is not None]
+        print(f"{connected}/{len(clients)} pages connected in {time.time() - start:.1f} s "
+              f"({args.dashboards} dashboards, {args.risk_pages} risk pages, {args.viewers} viewers, "
+              f"{args.pollers} pollers); page load p50 {percentile(loads, 50) * 1e3:.1f} ms, "
+              f"p99 {percentile(loads, 99) * 1e3:.1f} ms")
+        pollers = [threading.Thread(target=poller, args=(host, port, args.poll_interval, results, stop), daemon=True)
+                   for _ in range(args.pollers)]
+        for thread in pollers:
+            thread.start()
+        time.sleep(args.warmup)
+
+        sampler = None
+        if psutil is not None and pid is not None:
+            sampler = ResourceSampler(pid, stop)
+            sampler.start()
+        elif pid is not None:
+            print("psutil is not installed; server CPU and RSS are not sampled.")
+        results.recording = True
+        time.sleep(args.duration)
+        results.recording = False
+        # Every dashboard receives every event; risk pages and viewers subscribe to none.
+        expected = args.event_rate * args.duration * args.dashboards if process is not None else None
+        still = sum(not client.failed for client in clients)
+        print(f"{still}/{len(clients)} pages still connected after {args.duration:.0f} s")
+        report(results, args.duration, sampler, expected)
+    finally:
+        stop.set()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Measures MouseBehaviorTracker.on_move latency under synthetic 1000 Hz pointer input.
+
+A feeder thread calls on_move at --rate Hz along a path with periodic fast flicks and reversals,
+so events do fire, while a worker thread analyzes the ring buffer every --batch-interval seconds
+as the tracker's own worker does. The same input is replayed through the previous inline
+implementation (analysis, event dicts and logging on the calling thread) for comparison.
+
+    python benchmarks/mouse_callback_bench.py --seconds 10 --rate 1000
+
+Reports p50/p99/max on_move latency for both, per-sample events against coalesced episodes,
+the worker's time per batch and how long after an episode's last sample it was recorded.
+"""
+import io
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mouse_tracker import MouseBehaviorTracker  # noqa: E402
+from event_store import EventLog  # noqa: E402
+
+
+class InlineTracker:
+    """The previous on_move: all analysis and logging on the input hook thread."""
+
+    def __init__(self, speed_threshold, angle_threshold, event_log, logger):
+        self.speed_threshold = speed_threshold
+        self.angle_threshold = angle_threshold
+        self.event_log = event_log
+        self.logger = logger
+        self.prev_time = None
+        self.prev_pos = None
+        self.prev_direction = None
+
+    def on_move(self, x, y):
+        current_time = time.time()
+        if self.prev_pos is not None:
+            dt = current_time - self.prev_time
+            dx = x - self.prev_pos[0]
+            dy = y - self.prev_pos[1]
+            distance = math.sqrt(dx ** 2 + dy ** 2)
+            if dt > 0:
+                speed = distance / dt
+                if speed > self.speed_threshold:
+                    self.event_log.append({"timestamp": current_time, "event": "High speed",
+                                           "speed": speed, "position": (x, y)})
+                    self.logger.warning("High speed detected: %.2f px/sec", speed)
+            current_direction = math.degrees(math.atan2(dy, dx)) if distance > 0 else None
+            if self.prev_direction is not None and current_direction is not None:
+                angle_diff = abs(current_direction - self.prev_direction)
+                if angle_diff > 180:
+                    angle_diff = 360 - angle_diff
+                if angle_diff > self.angle_threshold:
+                    self.event_log.append({"timestamp": current_time, "event": "Abrupt direction change",
+                                           "angle_diff": angle_diff, "position": (x, y)})
+                    self.logger.warning("Abrupt direction change: %.2f°", angle_diff)
+            if current_direction is not None:
+                self.prev_direction = current_direction
+        self.prev_time = current_time
+        self.prev_pos = (x, y)
+
+
+def synthetic_path(count):
+    """A slow circle with a fast flick out and back every 1000 samples."""
+    for i in range(count):
+        angle = i / 500.0
+        x = 800 + 300 * math.cos(angle)
+        y = 500 + 300 * math.sin(angle)
+        phase = i % 1000
+        if phase < 5:
+            x += phase * 60
+        elif phase < 10:
+            x += (10 - phase) * 60
+        yield int(x), int(y)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def feed(on_move, rate, seconds):
+    """Calls on_move at `rate` Hz on this thread; returns per-call latencies in seconds."""
+    count = int(rate * seconds)
+    period = 1.0 / rate
+    latencies = []
+    next_at = time.perf_counter()
+    for x, y in synthetic_path(count):
+        start = time.perf_counter()
+        on_move(x, y)
+        latencies.append(time.perf_counter() - start)
+        # A late wake-up delays the next sample rather than firing a catch-up burst, which would
+        # read as impossibly fast motion.
+        next_at = max(next_at + period, time.perf_counter())
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    return latencies
+
+
+def report(name, latencies):
+    print(f"{name:22} on_move us: p50 {percentile(latencies, 50) * 1e6:7.1f}  "
+          f"p99 {percentile(latencies, 99) * 1e6:7.1f}  max {max(latencies) * 1e6:8.1f}  ({len(latencies)} calls)")
+
+
+def quiet_logger(name):
+    # Logging still formats and writes each record, as it would to a console, but not to this terminal.
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [logging.StreamHandler(io.StringIO())]
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Pointer samples per second.")
+    parser.add_argument("--batch-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    inline_log = EventLog("mouse", capacity=100000)
+    inline = InlineTracker(1500, 90, inline_log, quiet_logger("InlineTracker"))
+    report("inline analysis", feed(inline.on_move, args.rate, args.seconds))
+
+    tracker = MouseBehaviorTracker(event_log=EventLog("mouse", capacity=100000),
+                                   batch_interval=args.batch_interval)
+    tracker.logger = quiet_logger("MouseBehaviorTracker.bench")
+    lags = []
+    tracker.callback = lambda event: lags.append(time.time() - event["end"])
+    batch_times = []
+    stop = threading.Event()
+
+    def worker():
+        while not stop.wait(args.batch_interval):
+            start = time.perf_counter()
+            if tracker.process_pending():
+                batch_times.append(time.perf_counter() - start)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    latencies = feed(tracker.on_move, args.rate, args.seconds)
+    stop.set()
+    thread.join()
+    tracker.process_pending()
+    tracker.flush()
+    report("ring buffer + worker", latencies)
+
+    print(f"events: inline {len(inline_log)} per sample, worker {len(tracker.event_log)} episodes "
+          f"({tracker.dropped} samples dropped)")
+    print(f"worker batch ms: p50 {percentile(batch_times, 50) * 1e3:.2f}  p99 {percentile(batch_times, 99) * 1e3:.2f}  "
+          f"({len(batch_times)} batches, {sum(batch_times) / args.seconds * 100:.2f}% of one CPU)")
+    print(f"episode recorded after its last sample, ms: p50 {percentile(lags, 50) * 1e3:.1f}  "
+          f"p99 {percentile(lags, 99) * 1e3:.1f}")
+
+
+if __name__ == '__main__':
+    main()
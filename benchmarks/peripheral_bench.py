@@ -0,0 +1,136 @@
+"""
+Measures the cost of a peripheral inventory scan, and what debouncing and re-plug handling do to
+the events and risk of a flapping session.
+
+Scan cost: a fake sysfs tree with --devices USB devices (each with an interface directory, as the
+kernel creates them) and --displays DRM connectors is scanned --scans times, reading every
+device's attributes each time and with the per-inode attribute cache. Scans per minute compare a
+5 s timer, as the WMI detector polled monitors, with scanning on kernel uevents for --changes
+device changes a minute plus the 60 s safety scan.
+
+Flapping: a scripted session plugs in a mouse and a USB stick, has the stick's cable drop out and
+back within a second a few times, unplugs and replugs it, and connects an external display that
+blinks off and on. Events and risk are compared with the previous flat +35 per addition, no
+debounce, and the inventory's debounce and re-plug rules.
+
+    python benchmarks/peripheral_bench.py --devices 40 --scans 2000
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peripheral_inventory import FakeSysfs, SysfsBackend  # noqa: E402
+from peripheral_detector import PeripheralDetector  # noqa: E402
+
+
+def build(root, devices, displays):
+    fs = FakeSysfs(root)
+    for bus in range(1, 3):
+        fs.plug_usb(f"usb{bus}", "1d6b", "0002", "xHCI Host Controller", device_class="09")
+    for index in range(devices):
+        fs.plug_usb(f"1-{index + 1}", f"{0x1000 + index:04x}", f"{index:04x}", f"Device {index}",
+                    serial=f"SN{index:06d}" if index % 2 else None, manufacturer="Vendor")
+    connectors = ["card0-eDP-1"] + [f"card0-HDMI-A-{index}" for index in range(1, displays)]
+    fs.connect_display(connectors[0], "Laptop Panel")
+    for connector in connectors[1:]:
+        fs.disconnect_display(connector)
+    return fs
+
+
+def scan_cost(args, root):
+    build(root, args.devices, args.displays)
+    results = {}
+    for name, cached in (("uncached", False), ("cached", True)):
+        backend = SysfsBackend(root, uevents=False)
+        backend.scan()
+        backend.files_read = 0
+        start = time.perf_counter()
+        for _ in range(args.scans):
+            if not cached:
+                backend._usb_cache = {}
+            devices = backend.scan()
+        results[name] = ((time.perf_counter() - start) / args.scans, backend.files_read / args.scans)
+        backend.release()
+    print(f"scan of {args.devices} USB devices and {args.displays} connectors ({len(devices)} found):")
+    for name, (seconds, files) in results.items():
+        print(f"  {name:9} {seconds * 1e6:9.1f} us  {files:6.1f} files read")
+    cached = results["cached"][0]
+    for label, per_minute in (("5 s timer", 12), ("uevents", args.changes + 1)):
+        print(f"  {label:10} {per_minute:4d} scans/min  {per_minute * cached * 1e3:7.3f} ms CPU/min")
+
+
+SESSION = [
+    # (seconds, action, args)
+    (0.0, "plug", ("1-5", "046d", "c077", "USB Optical Mouse", None)),
+    (5.0, "plug", ("1-6", "0781", "5581", "Ultra", "4C530001")),
+    (20.0, "unplug", ("1-6",)), (20.5, "plug", ("1-6", "0781", "5581", "Ultra", "4C530001")),
+    (40.0, "unplug", ("1-6",)), (40.3, "plug", ("1-6", "0781", "5581", "Ultra", "4C530001")),
+    (60.0, "unplug", ("1-6",)), (60.8, "plug", ("1-6", "0781", "5581", "Ultra", "4C530001")),
+    (90.0, "unplug", ("1-6",)), (120.0, "plug", ("1-7", "0781", "5581", "Ultra", "4C530001")),
+    (150.0, "display", ("card0-HDMI-A-1", True)), (155.0, "display", ("card0-HDMI-A-1", False)),
+    (155.6, "display", ("card0-HDMI-A-1", True)),
+]
+
+
+def flapping(args, root):
+    print("flapping session:")
+    for name, debounce in (("no debounce", 0.0), (f"debounce {args.debounce:g}s", args.debounce)):
+        shutil.rmtree(root)
+        fs = build(root, 4, 2)
+        now = [0.0]
+        events = []
+        detector = PeripheralDetector(callback=events.append, backend=SysfsBackend(root, uevents=False),
+                                      debounce=debounce, clock=lambda: now[0])
+        detector.logger.setLevel(logging.WARNING)
+        detector.scan()
+        # A scan follows every uevent burst, and another when a debounced change falls due.
+        times = sorted({at for at, _, _ in SESSION} | {at + debounce for at, _, _ in SESSION})
+        steps = iter(SESSION)
+        step = next(steps)
+        for at in times:
+            while step is not None and step[0] <= at:
+                _, action, params = step
+                if action == "plug":
+                    port, vendor, product, product_name, serial = params
+                    fs.plug_usb(port, vendor, product, product_name, serial=serial)
+                elif action == "unplug":
+                    fs.unplug_usb(params[0])
+                elif params[1]:
+                    fs.connect_display(params[0], "DELL U2720Q")
+                else:
+                    fs.disconnect_display(params[0])
+                step = next(steps, None)
+            now[0] = at
+            detector.scan()
+        detector.backend.release()
+        print(f"  {name:14} {len(events):3d} events  risk {detector.risk_score:4d}  "
+              f"flaps absorbed {detector.inventory.flaps}")
+        if not debounce:
+            additions = sum(1 for event in events if event["event"] in ("Device added", "Device re-plugged"))
+    print(f"  {'previous':14} {additions:3d} events  risk {35 * additions:4d}  (every addition, +35 each)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--displays", type=int, default=4)
+    parser.add_argument("--scans", type=int, default=2000)
+    parser.add_argument("--changes", type=int, default=2, help="Device changes per minute.")
+    parser.add_argument("--debounce", type=float, default=2.0)
+    args = parser.parse_args()
+    root = tempfile.mkdtemp(prefix="fake-sysfs-")
+    try:
+        scan_cost(args, root)
+        flapping(args, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
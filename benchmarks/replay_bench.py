@@ -0,0 +1,225 @@
+"""
+Records a synthetic multi-sensor session through the trackers' recorder hooks, replays it through
+fresh detectors as fast as they go, and checks that the replay reproduces the recorded risk.
+
+The session runs on a simulated clock for --seconds: pointer samples at 100 Hz with a fast
+burst every 20 s and a scroll every 30 s, a window switch every 15 s, a copy every 75 s, a
+blocked Ctrl+C every 40 s, a device scan every 5 s with a USB stick plugged in, flapping and
+pulled, 16 kHz audio with a 1.5 s voice burst every minute, and --fps camera frames per second
+(a gradient with a few levels of sensor noise). Frames go through
+face_detector when it imports, and are only recorded otherwise.
+
+Reported: the recording's size and records per channel, the recorder's cost per record, replay
+throughput and real-time factor, a seek to the middle of the session against a full scan, and
+each source's recorded and replayed risk.
+
+    python benchmarks/replay_bench.py --seconds 600 --fps 2
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_recorder import SessionReader, SessionRecorder, SessionReplayer, SimulatedClock  # noqa: E402
+from event_store import EventLog  # noqa: E402
+from mouse_tracker import MouseBehaviorTracker  # noqa: E402
+from window_tracker import WindowTracker  # noqa: E402
+from copy_tracker import CopyTracker  # noqa: E402
+from peripheral_detector import PeripheralDetector  # noqa: E402
+from peripheral_inventory import Device  # noqa: E402
+from voice_detector import VoiceDetector  # noqa: E402
+
+WINDOWS = [("Exam - Browser", "exam.exe"), ("ChatGPT - Chrome", "chrome.exe"), ("Notes", "notepad.exe")]
+BASE_DEVICES = {"usb:046d:c077": Device("usb:046d:c077", "usb", "USB Optical Mouse"),
+                "display:eDP-1": Device("display:eDP-1", "display", "Laptop Panel")}
+STICK = Device("usb:0781:5567:SN1", "usb", "Cruzer Blade")
+
+
+class ScriptedBackend:
+    """Device scans from a script of (from time, devices) steps."""
+
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = script
+
+    def scan(self):
+        devices = BASE_DEVICES
+        for since, step in self.script:
+            if self.clock() >= since:
+                devices = step
+        return dict(devices)
+
+
+def device_script(seconds):
+    with_stick = dict(BASE_DEVICES, **{STICK.key: STICK})
+    script = [(seconds * 0.2, with_stick)]
+    # The stick's cable drops out for a scan and comes back, three times.
+    for index in range(3):
+        start = seconds * 0.3 + index * 10
+        script += [(start, BASE_DEVICES), (start + 5, with_stick)]
+    script.append((seconds * 0.8, BASE_DEVICES))
+    return script
+
+
+def record(path, seconds, fps, face):
+    clock = SimulatedClock(1.7e9)
+    start = clock.now
+    mouse = MouseBehaviorTracker(event_log=EventLog("mouse"), clock=clock)
+    window = WindowTracker(event_log=EventLog("window"))
+    copy = CopyTracker(event_log=EventLog("copy"))
+    copy.shortcuts_disabled = True
+    peripheral = PeripheralDetector(event_log=EventLog("peripheral"), clock=clock,
+                                    backend=ScriptedBackend(lambda: clock.now - start, device_script(seconds)))
+    voice = VoiceDetector(event_log=EventLog("voice"), chunk_size=1024, rate=16000,
+                          recordings_dir=None, open_audio=False)
+    sources = {"mouse": lambda: mouse.risk_score, "window": lambda: window.risk_score,
+               "copy": lambda: copy.risk_score, "peripheral": lambda: peripheral.risk_score,
+               "voice": lambda: voice.risk_score}
+    if face is not None:
+        face.reset()
+        face.eye_risk_score = 0
+        face.eye_risk_events = EventLog("face")
+        sources["face"] = lambda: face.eye_risk_score
+    recorder = SessionRecorder(path, clock=clock, sources=sources, meta={
+        "mouse": {"speed_threshold": mouse.speed_threshold, "angle_threshold": mouse.angle_threshold},
+        "shortcuts": copy.policy.current.to_list(),
+        "peripheral": {"debounce": peripheral.inventory.debounce},
+        "voice": {"threshold": voice.threshold, "chunk_size": voice.chunk_size, "rate": voice.rate},
+    })
+    for tracker in (mouse, window, copy, peripheral, voice):
+        tracker.recorder = recorder
+    if face is not None:
+        face.recorder = recorder
+
+    rng = np.random.default_rng(7)
+    gradient = np.add.outer(np.arange(240), np.arange(320)).astype(np.uint8)[:, :, None].repeat(3, axis=2)
+    chunk_seconds = voice.chunk_size / voice.rate
+    quiet = (rng.normal(0, 2, voice.chunk_size)).astype(np.int16).tobytes()
+    next_chunk = next_frame = 0.0
+    x = y = 500.0
+    hooks = 0.0
+    step = 0
+    while step * 0.01 < seconds:
+        t = step * 0.01
+        clock.now = start + t
+        hook_start = time.perf_counter()
+        burst = t % 20 < 1
+        x += 40 if burst else 1
+        y += 25 if burst and step % 20 < 10 else -1 if burst else 0.5
+        mouse.on_move(x, y)
+        if step % 3000 == 1500:
+            mouse.on_scroll(x, y, 0, -1)
+        if step % 5 == 4:
+            mouse.process_pending()
+        if step % 1500 == 0:
+            title, process = WINDOWS[step // 1500 % len(WINDOWS)]
+            recorder.window(title, process, clock.now)
+            window._on_window(title, process, clock.now)
+        if step % 7500 == 2000:
+            text = " ".join(f"word{index}" for index in range(15 + step // 7500 * 7))
+            recorder.clipboard(text, clock.now)
+            copy._on_clipboard(text, clock.now)
+        if step % 4000 == 3000:
+            for key in ("ctrl_l", "c"):
+                copy.on_press(_Key(key))
+            for key in ("c", "ctrl_l"):
+                copy.on_release(_Key(key))
+        if step % 500 == 0:
+            peripheral.scan()
+        while next_chunk <= t:
+            speaking = next_chunk % 60 < 1.5
+            data = ((rng.normal(0, 3000, voice.chunk_size)).astype(np.int16).tobytes() if speaking else quiet)
+            recorder.audio(data, clock.now)
+            voice.process_chunk(data, clock.now)
+            next_chunk += chunk_seconds
+        if fps and next_frame <= t:
+            frame = np.clip(gradient + rng.integers(0, 8, gradient.shape), 0, 255).astype(np.uint8)
+            recorder.frame(frame, clock.now)
+            if face is not None:
+                face.process_frame(frame, clock.now)
+            next_frame += 1.0 / fps
+        hooks += time.perf_counter() - hook_start
+        step += 1
+    mouse.process_pending()
+    mouse.flush()
+    recorder.close()
+    return recorder, hooks
+
+
+class _Key:
+    def __init__(self, name):
+        self.name = name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=600, help="Session length.")
+    parser.add_argument("--fps", type=float, default=2, help="Camera frames recorded per second (0 for none).")
+    parser.add_argument("--no-face", action="store_true", help="Record frames without running face detection.")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    face = None
+    if args.fps and not args.no_face:
+        try:
+            import face_detector as face
+        except ImportError as exc:
+            print(f"face detection unavailable ({exc}); frames are only recorded")
+
+    directory = tempfile.mkdtemp(prefix="replay-bench-")
+    path = os.path.join(directory, "session.drec")
+    recorder, hooks = record(path, args.seconds, args.fps, face)
+    records = sum(recorder.counts.values())
+    size = os.path.getsize(path)
+    print(f"recorded {args.seconds:.0f} s: {records} records, {size / 2 ** 20:.2f} MiB "
+          f"({size * 8 / args.seconds / 1e3:.0f} kbit/s), live loop {hooks:.2f} s")
+    for channel, count in sorted(recorder.counts.items()):
+        print(f"  {channel:10} {count:8}")
+
+    # The recorder's own cost, apart from the detectors: the same inputs into a second file.
+    reader = SessionReader(path)
+    inputs = list(reader.records())
+    copy_path = os.path.join(directory, "copy.drec")
+    again = SessionRecorder(copy_path)
+    start = time.perf_counter()
+    for timestamp, channel, payload in inputs:
+        again.record(channel, payload, timestamp)
+    again.close()
+    print(f"recorder cost          {(time.perf_counter() - start) / len(inputs) * 1e6:8.2f} us/record (encoded)")
+
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.records())
+    full = time.perf_counter() - start
+    middle = reader.index[len(reader.index) // 2][0]
+    start = time.perf_counter()
+    first = next(reader.records(start=middle))
+    seek = time.perf_counter() - start
+    print(f"full scan              {full * 1e3:8.2f} ms for {count} records")
+    print(f"seek to t+{middle - reader.index[0][0]:.0f} s        {seek * 1e3:8.3f} ms (first record at {first[0]:.2f})")
+    reader.close()
+
+    replayer = SessionReplayer(path)
+    # Without face detection there is nothing to replay frames into.
+    result = replayer.run(channels=None if face is not None else [c for c in recorder.counts if c != "frame"])
+    print(f"replay                 {result['records_per_second']:8.0f} records/s, "
+          f"{result['realtime_factor']:.1f}x real time ({result['wall_seconds']:.2f} s)")
+    for channel, skipped in result["skipped"].items():
+        print(f"  skipped {channel}: {skipped['records']} records ({skipped['reason']})")
+    print(f"{'source':12} {'recorded':>9} {'replayed':>9}")
+    for source, value in sorted(result.get("recorded_risk", {}).items()):
+        print(f"{source:12} {value:9} {result['risk'].get(source, '-'):>9}")
+    print("risk matches" if result.get("risk_matches") else "RISK DIFFERS")
+    replayer.reader.close()
+    for name in os.listdir(directory):
+        os.unlink(os.path.join(directory, name))
+    os.rmdir(directory)
+    return 0 if result.get("risk_matches") else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Compares serving modes under many long-lived connections.
+
+For each server URL, opens N /api/stream dashboards and V /video_feed viewers and holds them,
+then measures /api/risk latency while they stay open. Run one app.py per mode, e.g.
+
+    python app.py --server werkzeug --port 5000
+    python app.py --server asgi --port 5001
+    python benchmarks/serve_bench.py --url http://127.0.0.1:5000 --url http://127.0.0.1:5001 --streams 300
+
+Reports connections held, connection failures and p50/p95/p99 API latency per server, plus the
+server's thread count when its --pid is given.
+"""
+import argparse
+import http.client
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class HeldConnection(threading.Thread):
+    """Opens a streaming request and keeps reading it until told to stop."""
+
+    def __init__(self, host, port, path, stop):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.path = path
+        self.stop = stop
+        self.held = threading.Event()
+        self.failed = threading.Event()
+        self.bytes = 0
+
+    def run(self):
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            conn.request("GET", self.path)
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            self.held.set()
+            while not self.stop.is_set():
+                chunk = response.read1(65536)
+                if not chunk:
+                    break
+                self.bytes += len(chunk)
+            conn.close()
+        except (OSError, http.client.HTTPException, RuntimeError):
+            self.failed.set()
+
+
+def api_latencies(host, port, requests, concurrency):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_worker = max(1, requests // concurrency)
+
+    def worker():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            try:
+                conn.request("GET", "/api/risk")
+                conn.getresponse().read()
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors.append(1)
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, len(errors)
+
+
+def server_threads(pid):
+    if psutil is None or pid is None:
+        return None
+    return psutil.Process(pid).num_threads()
+
+
+def bench(url, streams, viewers, requests, concurrency, settle, pid=None):
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    stop = threading.Event()
+    held = ([HeldConnection(host, port, "/api/stream", stop) for _ in range(streams)] +
+            [HeldConnection(host, port, "/video_feed", stop) for _ in range(viewers)])
+    for connection in held:
+        connection.start()
+    deadline = time.time() + settle
+    for connection in held:
+        while not (connection.held.is_set() or connection.failed.is_set()) and time.time() < deadline:
+            time.sleep(0.01)
+    open_count = sum(c.held.is_set() and not c.failed.is_set() for c in held)
+    threads = server_threads(pid)
+    latencies, errors = api_latencies(host, port, requests, concurrency)
+    still_open = sum(c.held.is_set() and not c.failed.is_set() for c in held)
+    stop.set()
+    print(f"{url}")
+    print(f"  streams held: {open_count}/{len(held)} at start, {still_open} after the API run, "
+          f"{sum(c.failed.is_set() for c in held)} failed")
+    if threads is not None:
+        print(f"  server threads while holding them: {threads}")
+    print(f"  /api/risk ms: p50 {percentile(latencies, 50) * 1e3:.1f}  p95 {percentile(latencies, 95) * 1e3:.1f}  "
+          f"p99 {percentile(latencies, 99) * 1e3:.1f}  ({len(latencies)} ok, {errors} errors)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", help="Server to test; repeat to compare several.")
+    parser.add_argument("--streams", type=int, default=300, help="Held /api/stream connections.")
+    parser.add_argument("--viewers", type=int, default=0, help="Held /video_feed connections.")
+    parser.add_argument("--requests", type=int, default=2000, help="API requests while the streams are held.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pid", type=int, action="append",
+                        help="Server process ID per --url, to report its thread count (needs psutil).")
+    parser.add_argument("--settle", type=float, default=15.0, help="Seconds to wait for streams to open.")
+    args = parser.parse_args()
+    socket.setdefaulttimeout(30)
+    urls = args.url or ["http://127.0.0.1:5000"]
+    pids = args.pid or []
+    for i, url in enumerate(urls):
+        bench(url, args.streams, args.viewers, args.requests, args.concurrency, args.settle,
+              pids[i] if i < len(pids) else None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Measures the keyboard hook callback, CopyTracker.on_press, with the previous frozenset scan and
+with the compiled shortcut policy, for policies of --rules sizes.
+
+The previous callback added the key to the held set and tested `issubset` against every blocked
+combination; the compiled policy looks up (key, held modifiers) in one dict. A typing stream
+(mostly plain letters, some Shift, now and then a Ctrl or Alt chord) is fed through both, and the
+per-keypress latency is reported. The counts of blocked keypresses differ where the previous
+callback missed a chord: it normalized only ctrl_r and alt_r, so chords held with another
+left/right variant it did not list went through. The keys are stand-ins with pynput's `name`/`char` attributes, so
+pynput (which needs a display on Linux) is not imported.
+
+    python benchmarks/shortcut_policy_bench.py --rules 10 100 1000 --keys 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shortcut_policy import DEFAULT_POLICY, MODIFIER_KEYS, ShortcutPolicy, key_id  # noqa: E402
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz0123456789-=[];',./`\\"
+SPECIAL = ["tab", "f1", "f2", "f3", "f4", "f5", "f6", "f7", "f8", "f9", "f10", "f11", "f12", "esc",
+           "delete", "home", "end", "page_up", "page_down", "insert", "print_screen"]
+MODIFIER_SETS = [combination for size in (1, 2, 3, 4) for combination in
+                 itertools.combinations(("ctrl", "alt", "shift", "cmd"), size)]
+
+
+class Key:
+    """Stand-in for pynput.keyboard.Key members."""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Key) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+class KeyCode:
+    """Stand-in for pynput.keyboard.KeyCode."""
+    __slots__ = ("char", "vk")
+
+    def __init__(self, char):
+        self.char = char
+        self.vk = None
+
+    def __eq__(self, other):
+        return isinstance(other, KeyCode) and other.char == self.char
+
+    def __hash__(self):
+        return hash(self.char)
+
+
+def key(name):
+    return KeyCode(name) if len(name) == 1 else Key(name)
+
+
+def make_rules(count, seed=3):
+    """The default policy plus distinct generated chords, `count` rules in all."""
+    rng = random.Random(seed)
+    chords = [(modifiers, name) for modifiers in MODIFIER_SETS for name in list(LETTERS) + SPECIAL]
+    rng.shuffle(chords)
+    rules = list(DEFAULT_POLICY)
+    taken = {rule["keys"] for rule in rules}
+    for modifiers, name in chords:
+        if len(rules) >= count:
+            break
+        keys = "+".join(modifiers + (name,))
+        if keys not in taken:
+            taken.add(keys)
+            rules.append({"keys": keys, "action": rng.choice(["block", "log"]), "risk": rng.randint(0, 5)})
+    return rules[:count]
+
+
+def typing_stream(count, seed=5):
+    """(key, pressed) pairs for `count` keypresses of typing with the occasional chord."""
+    rng = random.Random(seed)
+    stream = []
+    while len(stream) < 2 * count:
+        roll = rng.random()
+        letter = key(rng.choice(LETTERS))
+        if roll < 0.85:
+            stream += [(letter, True), (letter, False)]
+        else:
+            modifier = key(rng.choice(["shift", "shift_r"] if roll < 0.95 else ["ctrl_l", "ctrl_r", "alt_l", "cmd"]))
+            stream += [(modifier, True), (letter, True), (letter, False), (modifier, False)]
+    return stream
+
+
+class Legacy:
+    """The previous CopyTracker callbacks: a held-key set scanned against frozensets."""
+
+    def __init__(self, rules):
+        self.pressed_keys = set()
+        self.blocked_combinations = []
+        for rule in rules:
+            if rule["action"] != "block":
+                continue
+            *modifiers, name = rule["keys"].split("+")
+            # The old list spelled out the left/right variants it cared about, one frozenset each.
+            variants = [[Key(m), Key(m + "_l")] for m in modifiers]
+            for chosen in itertools.product(*variants):
+                self.blocked_combinations.append(frozenset(chosen + (key(name),)))
+
+    def on_press(self, key):
+        if key == Key("ctrl_r"): key = Key("ctrl")
+        if key == Key("alt_r"): key = Key("alt")
+        self.pressed_keys.add(key)
+        for combination in self.blocked_combinations:
+            if combination.issubset(self.pressed_keys):
+                return False
+        return True
+
+    def on_release(self, key):
+        if key == Key("ctrl_r"): key = Key("ctrl")
+        if key == Key("alt_r"): key = Key("alt")
+        self.pressed_keys.discard(key)
+        return True
+
+
+class Compiled:
+    """CopyTracker's callbacks with a compiled ShortcutPolicy, without event recording."""
+
+    def __init__(self, rules):
+        self.policy = ShortcutPolicy(rules)
+        self.modifiers = 0
+        self._held_modifiers = set()
+
+    def on_press(self, key):
+        name = key_id(key)
+        bit = MODIFIER_KEYS.get(name)
+        if bit:
+            self._held_modifiers.add(name)
+            self.modifiers |= bit
+            return True
+        rule = self.policy.lookup(name, self.modifiers)
+        return rule is None or rule.action != "block"
+
+    def on_release(self, key):
+        name = key_id(key)
+        if name in MODIFIER_KEYS:
+            self._held_modifiers.discard(name)
+            modifiers = 0
+            for held in self._held_modifiers:
+                modifiers |= MODIFIER_KEYS[held]
+            self.modifiers = modifiers
+        return True
+
+
+def measure(hook, stream):
+    timings = []
+    clock = time.perf_counter_ns
+    blocked = 0
+    for key, pressed in stream:
+        start = clock()
+        if pressed:
+            blocked += not hook.on_press(key)
+        else:
+            hook.on_release(key)
+        timings.append(clock() - start)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)], sum(timings) / len(timings), blocked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--keys", type=int, default=200000, help="Keypresses per run.")
+    args = parser.parse_args()
+    stream = typing_stream(args.keys)
+    print(f"{'rules':>6} {'hook':9} {'p50 ns':>8} {'p99 ns':>8} {'mean ns':>8} {'blocked':>8}")
+    for count in args.rules:
+        rules = make_rules(count)
+        start = time.perf_counter()
+        compiled = Compiled(rules)
+        compile_ms = (time.perf_counter() - start) * 1e3
+        for name, hook in (("frozenset", Legacy(rules)), ("compiled", compiled)):
+            p50, p99, mean, blocked = measure(hook, stream)
+            print(f"{len(rules):6d} {name:9} {p50:8d} {p99:8d} {mean:8.0f} {blocked:8d}")
+        print(f"{'':6} compiled {len(compiled.policy._table)} table entries in {compile_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
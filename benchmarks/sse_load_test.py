@@ -0,0 +1,120 @@
+"""
+Load test for the /api/stream push channel.
+
+Opens N concurrent dashboard connections to a running app.py instance, then registers copy
+events through /api/register_copy and measures how long each event takes to reach every
+connected dashboard.
+
+    python benchmarks/sse_load_test.py --url http://127.0.0.1:5000 --clients 100 --events 50
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class StreamClient(threading.Thread):
+    """One simulated dashboard tab holding an SSE connection open."""
+
+    def __init__(self, host, port, marker, latencies, lock):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.marker = marker
+        self.latencies = latencies
+        self.lock = lock
+        self.connected = threading.Event()
+        self.messages = 0
+        self.error = None
+
+    def run(self):
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            conn.request("GET", "/api/stream?sources=copy", headers={"Accept": "text/event-stream"})
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            self.connected.set()
+            event_type = None
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event:"):
+                    event_type = line[6:].strip()
+                elif line.startswith("data:") and event_type == "events":
+                    self.messages += 1
+                    received = time.time()
+                    for event in json.loads(line[5:])["events"].get("copy", []):
+                        preview = event.get("content_preview", "")
+                        if preview.startswith(self.marker):
+                            sent = float(preview.split()[1])
+                            with self.lock:
+                                self.latencies.append(received - sent)
+        except Exception as e:
+            self.error = e
+            self.connected.set()
+
+
+def register_copy(host, port, marker):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    body = json.dumps({"content": f"{marker} {time.time():.6f}"})
+    conn.request("POST", "/api/register_copy", body=body, headers={"Content-Type": "application/json"})
+    conn.getresponse().read()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between injected events.")
+    args = parser.parse_args()
+
+    parsed = urlparse(args.url)
+    host, port = parsed.hostname, parsed.port or 80
+    marker = f"loadtest-{int(time.time())}"
+    latencies = []
+    lock = threading.Lock()
+
+    clients = [StreamClient(host, port, marker, latencies, lock) for _ in range(args.clients)]
+    start = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.connected.wait(timeout=30)
+    connected = sum(1 for c in clients if c.connected.is_set() and c.error is None)
+    print(f"Connected {connected}/{args.clients} dashboards in {time.time() - start:.2f}s")
+
+    for _ in range(args.events):
+        register_copy(host, port, marker)
+        time.sleep(args.interval)
+    time.sleep(2)
+
+    expected = connected * args.events
+    print(f"Deliveries: {len(latencies)}/{expected}")
+    print(f"Messages received: {sum(c.messages for c in clients)}")
+    if latencies:
+        ms = [l * 1000 for l in latencies]
+        print(f"Delivery latency ms: mean={statistics.mean(ms):.1f} p50={percentile(ms, 50):.1f} "
+              f"p95={percentile(ms, 95):.1f} p99={percentile(ms, 99):.1f} max={max(ms):.1f}")
+    errors = [c.error for c in clients if c.error is not None]
+    if errors:
+        print(f"Errors: {len(errors)} (first: {errors[0]!r})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures trajectory recording size and replay speed.
+
+Synthesizes --minutes of human-like pointer movement at --rate Hz: minimum-jerk reaches to random
+targets separated by pauses. The movement is then recorded as it would be by the tracker's
+worker, once per RDP tolerance. For each tolerance it reports bytes per minute of movement,
+samples kept, the reconstruction error in pixels and encode time, next to a dict per sample held
+in memory and as NDJSON. It then decodes each recording and replays it through the detection
+logic.
+
+    python benchmarks/trajectory_bench.py --minutes 1 --tolerance 0 --tolerance 1 --tolerance 2
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trajectory import Trajectory, decode, replay  # noqa: E402
+from mouse_tracker import MouseBehaviorTracker  # noqa: E402
+from event_store import EventLog  # noqa: E402
+
+
+def synthetic_movement(minutes, rate, seed=7):
+    """(t, x, y) rows of reaches between random targets, with pauses in between."""
+    rng = np.random.default_rng(seed)
+    t, x, y = 1.7e9, 960.0, 540.0
+    parts = []
+    end = t + minutes * 60
+    while t < end:
+        duration = rng.uniform(0.2, 1.0)
+        tx, ty = rng.uniform(0, 1920), rng.uniform(0, 1080)
+        steps = max(int(duration * rate), 2)
+        s = np.linspace(0, 1, steps)
+        profile = 10 * s ** 3 - 15 * s ** 4 + 6 * s ** 5  # Minimum-jerk position profile.
+        # A slight arc and hand tremor, so the path is not a straight line.
+        bend = np.sin(np.pi * s) * rng.normal(0, 60)
+        nx, ny = -(ty - y), tx - x
+        norm = np.hypot(nx, ny) or 1.0
+        px = x + (tx - x) * profile + bend * nx / norm + rng.normal(0, 0.4, steps)
+        py = y + (ty - y) * profile + bend * ny / norm + rng.normal(0, 0.4, steps)
+        times = t + np.arange(steps) / rate + rng.normal(0, 0.00005, steps)
+        parts.append(np.column_stack((np.sort(times), np.round(px), np.round(py))))
+        t += duration + rng.uniform(0.1, 1.5)
+        x, y = tx, ty
+    return np.concatenate(parts)
+
+
+def reconstruction_error(raw, kept):
+    """Pixel distance between every raw sample and the replayed path at the same time."""
+    x = np.interp(raw[:, 0], kept[:, 0], kept[:, 1])
+    y = np.interp(raw[:, 0], kept[:, 0], kept[:, 2])
+    return np.hypot(x - raw[:, 1], y - raw[:, 2])
+
+
+def dict_sample_bytes(raw, sample=1000):
+    """Memory and NDJSON size per sample when every sample is kept as an event dict."""
+    events = [{"timestamp": float(t), "x": int(x), "y": int(y)} for t, x, y in raw[:sample]]
+    memory = sum(sys.getsizeof(e) + sum(sys.getsizeof(v) for v in e.values()) for e in events)
+    text = sum(len(json.dumps(e)) + 1 for e in events)
+    return memory / len(events), text / len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=1000.0, help="Pointer samples per second while moving.")
+    parser.add_argument("--tolerance", type=float, action="append",
+                        help="RDP tolerance in pixels; 0 records losslessly. Repeatable.")
+    parser.add_argument("--batch", type=int, default=50, help="Samples per appended batch, as the worker sees them.")
+    args = parser.parse_args()
+    quiet = logging.getLogger("MouseBehaviorTracker.bench")
+    quiet.setLevel(logging.ERROR)
+
+    raw = synthetic_movement(args.minutes, args.rate)
+    minutes = (raw[-1, 0] - raw[0, 0]) / 60
+    memory, text = dict_sample_bytes(raw)
+    print(f"{len(raw)} samples over {minutes:.2f} min")
+    print(f"dict per sample: {memory * len(raw) / minutes / 1024:10.1f} KiB/min in memory, "
+          f"{text * len(raw) / minutes / 1024:.1f} KiB/min as NDJSON")
+    print(f"{'tolerance':>9} {'KiB/min':>9} {'B/sample':>9} {'kept':>7} {'err mean':>9} {'err max':>8} "
+          f"{'encode ms':>9} {'replay':>14} {'x realtime':>10} {'episodes':>8}")
+    for tolerance in args.tolerance or [0.0, 0.5, 1.0, 2.0, 5.0]:
+        trajectory = Trajectory(tolerance=tolerance or None)
+        start = time.perf_counter()
+        for first in range(0, len(raw), args.batch):
+            trajectory.append(raw[first:first + args.batch])
+        data = trajectory.to_bytes()
+        encode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        samples = decode(data)
+        tracker = MouseBehaviorTracker(event_log=EventLog("replay", capacity=100000), buffer_size=1)
+        tracker.logger = quiet
+        events = replay(samples, tracker)
+        replay_seconds = time.perf_counter() - start
+
+        error = reconstruction_error(raw, samples)
+        print(f"{tolerance:9.1f} {len(data) / minutes / 1024:9.1f} {len(data) / len(raw):9.2f} "
+              f"{len(samples) / len(raw) * 100:6.1f}% {error.mean():9.2f} {error.max():8.2f} "
+              f"{encode_seconds * 1e3:9.1f} {len(samples) / replay_seconds:10.0f} s/s "
+              f"{minutes * 60 / replay_seconds:10.0f} {len(events):8d}")
+
+
+if __name__ == '__main__':
+    main()
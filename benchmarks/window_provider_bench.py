@@ -0,0 +1,164 @@
+"""
+Compares focus providers on detection latency, missed switches and wake-ups per minute.
+
+A driver thread plays the same scripted focus activity against each provider: the exam window
+held for a few seconds at a time, interrupted by quick alt-tab round trips (--min-flick to
+--max-flick seconds in another window) and the occasional longer visit. A consumer thread calls
+`changes()` in a loop, as WindowTracker does, and every change it receives is matched against the
+script.
+
+    python benchmarks/window_provider_bench.py --seconds 60 --interval 0.5
+
+Providers:
+  poll   PollingProvider reading the scripted title every --interval seconds (the previous
+         WindowTracker behaviour).
+  event  FakeProvider fed by the driver, i.e. any queued event backend (Win32 hooks).
+  x11    X11Provider against $DISPLAY; the driver creates two windows and sets _NET_ACTIVE_WINDOW
+         on the root window as a window manager would. Run under `xvfb-run` or a local Xvfb.
+"""
+import os
+import sys
+import time
+import bisect
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from window_providers import FakeProvider, PollingProvider, X11Provider  # noqa: E402
+
+EXAM = "Exam - Dragon Proctor"
+
+
+def focus_script(seconds, min_flick, max_flick, seed=3):
+    """(delay_seconds, title) steps: dwell in the exam, quick round trips and longer visits."""
+    rng = random.Random(seed)
+    steps, elapsed = [], 0.0
+    while elapsed < seconds:
+        dwell = rng.expovariate(1 / 3.0)
+        other = rng.choice(["Notes", "Search - Browser", "Chat"])
+        away = rng.uniform(min_flick, max_flick) if rng.random() < 0.7 else rng.uniform(1.0, 4.0)
+        steps += [(dwell, other), (away, EXAM)]
+        elapsed += dwell + away
+    return steps
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class ScriptedTitle:
+    """Shared foreground title for the polling provider."""
+
+    def __init__(self):
+        self.title = EXAM
+
+    def __call__(self):
+        return self.title, None
+
+
+class X11Driver:
+    """Plays focus changes on a real X server by setting _NET_ACTIVE_WINDOW on the root window."""
+
+    def __init__(self, titles):
+        from Xlib import X, Xatom, display
+        self.display = display.Display()
+        screen = self.display.screen()
+        self.root = screen.root
+        self.active = self.display.intern_atom("_NET_ACTIVE_WINDOW")
+        net_wm_name = self.display.intern_atom("_NET_WM_NAME")
+        utf8 = self.display.intern_atom("UTF8_STRING")
+        self.windows = {}
+        for title in titles:
+            window = self.root.create_window(0, 0, 10, 10, 0, screen.root_depth)
+            window.change_property(net_wm_name, utf8, 8, title.encode("utf-8"))
+            self.windows[title] = window
+        self.window_type = Xatom.WINDOW
+        self.mode = X.PropModeReplace
+        self.set(EXAM)
+
+    def set(self, title):
+        self.root.change_property(self.active, self.window_type, 32, [self.windows[title].id], self.mode)
+        self.display.flush()
+
+
+def run(provider, apply, script, seconds):
+    """Drives `script` through `apply` while consuming `provider`; returns actual and seen changes."""
+    actual = [(time.time(), EXAM)]
+    seen = []
+    wakeups = [0]
+
+    def consume():
+        while not provider.closed:
+            changes = provider.changes()
+            wakeups[0] += 1
+            now = time.time()
+            seen.extend((now, title) for _, title, _ in changes)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    start = time.time()
+    for delay, title in script:
+        time.sleep(delay)
+        if time.time() - start > seconds:
+            break
+        apply(title)
+        actual.append((time.time(), title))
+    time.sleep(0.6)
+    elapsed = time.time() - start
+    provider.close()
+    consumer.join(5)
+    return actual, seen, wakeups[0], elapsed
+
+
+def report(name, actual, seen, wakeups, elapsed):
+    """A change counts as detected when its title is seen before the next change replaces it."""
+    times = [t for t, _ in actual]
+    detected, latencies = set(), []
+    for received, title in seen:
+        index = bisect.bisect_right(times, received) - 1
+        if index >= 0 and actual[index][1] == title and index not in detected:
+            detected.add(index)
+            latencies.append(received - actual[index][0])
+    switches = len(actual) - 1
+    missed = sum(1 for index in range(1, len(actual)) if index not in detected)
+    print(f"{name:6} {switches:8d} {missed:7d} {percentile(latencies, 50) * 1e3:9.2f} "
+          f"{percentile(latencies, 95) * 1e3:9.2f} {max(latencies or [0]) * 1e3:9.2f} "
+          f"{wakeups / elapsed * 60:11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--interval", type=float, default=0.5, help="Poll interval of the polling provider.")
+    parser.add_argument("--min-flick", type=float, default=0.05, help="Shortest alt-tab round trip, seconds.")
+    parser.add_argument("--max-flick", type=float, default=0.4, help="Longest alt-tab round trip, seconds.")
+    parser.add_argument("--provider", action="append", choices=["poll", "event", "x11"],
+                        help="Providers to run; repeatable. Defaults to poll and event.")
+    args = parser.parse_args()
+    script = focus_script(args.seconds, args.min_flick, args.max_flick)
+
+    print(f"{'':6} {'switches':>8} {'missed':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'wakeups/min':>11}")
+    for name in args.provider or ["poll", "event"]:
+        if name == "poll":
+            title = ScriptedTitle()
+            provider = PollingProvider(title, interval=args.interval)
+
+            def apply(new, title=title):
+                title.title = new
+        elif name == "event":
+            provider = FakeProvider(initial=EXAM)
+            apply = provider.push
+        else:
+            driver = X11Driver({EXAM} | {other for _, other in script})
+            provider = X11Provider()
+            apply = driver.set
+        report(name, *run(provider, apply, script, args.seconds))
+
+
+if __name__ == '__main__':
+    main()
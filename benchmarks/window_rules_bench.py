@@ -0,0 +1,133 @@
+"""
+Measures window-title classification cost.
+
+Builds --titles distinct realistic window titles (browser tabs, documents, editors, chat and
+remote-desktop apps), pads the default rule set with --extra-rules generated rules, and classifies
+a stream of --lookups titles drawn with Zipf-like repetition, as a candidate switching between a
+few windows would produce. It compares:
+
+  naive     every rule tried one after another (`in` per substring, `re.search` per regex)
+  combined  WindowRules' single compiled alternation, LRU cache bypassed
+  cached    WindowRules.classify, through the LRU cache
+
+    python benchmarks/window_rules_bench.py --titles 5000 --lookups 200000 --extra-rules 200
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from window_rules import CATEGORIES, DEFAULT_RULES, UNMATCHED, Classification, WindowRules  # noqa: E402
+
+SITES = ["Google Search", "Stack Overflow", "Wikipedia", "YouTube", "GitHub", "Gmail", "Chegg Study",
+         "Khan Academy", "Reddit", "Coursera", "MDN Web Docs", "ChatGPT", "Bing Search"]
+APPS = ["Google Chrome", "Mozilla Firefox", "Microsoft Edge", "Visual Studio Code", "Notepad",
+        "Microsoft Word", "Adobe Acrobat Reader", "File Explorer", "Terminal", "Calculator"]
+CHAT = ["Discord", "WhatsApp", "Telegram", "Slack", "Messenger", "Microsoft Teams"]
+WORDS = ["calculus", "homework", "chapter", "lecture", "notes", "final", "review", "python", "loops",
+         "integral", "derivative", "essay", "draft", "answers", "quiz", "project", "report", "summary"]
+
+
+def realistic_titles(count, seed=11):
+    rng = random.Random(seed)
+    titles = set()
+    while len(titles) < count:
+        kind = rng.random()
+        words = " ".join(rng.sample(WORDS, rng.randint(1, 4)))
+        if kind < 0.5:
+            titles.add(f"{words} - {rng.choice(SITES)} - {rng.choice(APPS[:3])}")
+        elif kind < 0.8:
+            titles.add(f"{words}_{rng.randint(1, 999)}.docx - {rng.choice(APPS[3:])}")
+        elif kind < 0.95:
+            titles.add(f"#{rng.choice(WORDS)} | {rng.choice(['study group', 'class', 'friends'])} - {rng.choice(CHAT)}")
+        else:
+            titles.add(f"Exam {rng.randint(1, 20)} - Dragon Proctor")
+    return sorted(titles)
+
+
+def padded_rules(extra, seed=5):
+    """The default rules plus `extra` generated title substrings and regexes spread over categories."""
+    rng = random.Random(seed)
+    rules = {category: {key: list(values) for key, values in spec.items()} for category, spec in DEFAULT_RULES.items()}
+    for i in range(extra):
+        spec = rules[CATEGORIES[i % len(CATEGORIES)]]
+        if i % 4:
+            spec.setdefault("titles", []).append(f"blocked-site-{i}-{rng.randint(0, 10 ** 6)}")
+        else:
+            spec.setdefault("regexes", []).append(rf"\bforum{i}\.example\.(com|org)\b")
+    return rules
+
+
+class NaiveRules:
+    """Tries each rule in turn, most severe category first."""
+
+    def __init__(self, rules):
+        self.rules = []
+        for category in CATEGORIES:
+            spec = rules.get(category, {})
+            for text in spec.get("titles", ()):
+                self.rules.append((Classification(category, text), text.lower(), None))
+            for pattern in spec.get("regexes", ()):
+                self.rules.append((Classification(category, pattern), None, re.compile(pattern, re.IGNORECASE)))
+
+    def classify(self, title, process=None):
+        lowered = title.lower()
+        for found, text, regex in self.rules:
+            if (text in lowered) if regex is None else regex.search(title):
+                return found
+        return UNMATCHED
+
+
+def zipf_stream(titles, lookups, seed=13):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(titles))]
+    return rng.choices(titles, weights=weights, k=lookups)
+
+
+def timed(classify, stream):
+    start = time.perf_counter()
+    results = [classify(title) for title in stream]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=5000, help="Distinct window titles.")
+    parser.add_argument("--lookups", type=int, default=200000, help="Classifications in the stream.")
+    parser.add_argument("--extra-rules", type=int, default=200, help="Generated rules added to the defaults.")
+    parser.add_argument("--cache-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    titles = realistic_titles(args.titles)
+    stream = zipf_stream(titles, args.lookups)
+    rules = padded_rules(args.extra_rules)
+    start = time.perf_counter()
+    compiled = WindowRules(rules=rules, cache_size=args.cache_size)
+    compile_ms = (time.perf_counter() - start) * 1e3
+    naive = NaiveRules(rules)
+    print(f"{len(titles)} distinct titles, {len(stream)} lookups, {compiled.rule_count} rules "
+          f"(compiled in {compile_ms:.1f} ms)")
+
+    naive_seconds, expected = timed(naive.classify, stream)
+    combined_seconds, combined = timed(compiled._classify, stream)
+    cached_seconds, cached = timed(compiled.classify, stream)
+    mismatches = sum(1 for a, b in zip(expected, combined) if a.category != b.category)
+    info = compiled.cache_info()
+
+    print(f"{'':9} {'us/title':>9} {'titles/s':>12}")
+    for name, seconds in (("naive", naive_seconds), ("combined", combined_seconds), ("cached", cached_seconds)):
+        print(f"{name:9} {seconds / len(stream) * 1e6:9.2f} {len(stream) / seconds:12.0f}")
+    print(f"cache: {info.hits} hits, {info.misses} misses ({info.hits / (info.hits + info.misses) * 100:.1f}% hit rate)")
+    print(f"category mismatches between naive and combined: {mismatches}")
+    counts = {}
+    for found in cached:
+        counts[found.category] = counts.get(found.category, 0) + 1
+    print("categories:", ", ".join(f"{category} {count}" for category, count in sorted(counts.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+import os
+import sys
+import time
+import queue
+import select
+import hashlib
+import logging
+import threading
+import metrics
+
+try:
+    import pyperclip
+except ImportError:
+    pyperclip = None
+
+try:
+    from Xlib import X
+    from Xlib import display as xdisplay
+    from Xlib import error as xerror
+    from Xlib.ext import xfixes
+except ImportError:
+    X = None
+
+CLIPBOARD_READ_SECONDS = metrics.histogram("dragon_clipboard_read_seconds", "Latency of one clipboard read.")
+CLIPBOARD_ERRORS = metrics.counter("dragon_clipboard_read_errors_total", "Clipboard reads that failed.")
+CLIPBOARD_SPAWNS = metrics.counter("dragon_clipboard_subprocess_spawns_total",
+                                   "Subprocesses (xclip, xsel, wl-paste, ...) started to read the clipboard.")
+
+# pyperclip backends that run a command for every paste.
+SPAWNING_PASTES = {"paste_xclip", "paste_xsel", "paste_wl", "paste_klipper", "paste_osx_pbcopy"}
+
+logger = logging.getLogger("ClipboardSources")
+
+
+def _window_id(window):
+    # Xlib hands window fields over as resource objects, or as plain ints for None (0).
+    return getattr(window, "id", window)
+
+
+def content_hash(text):
+    """Hex digest identifying clipboard text, so only the hash needs keeping between copies."""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+class SourceUnavailable(RuntimeError):
+    """No clipboard backend can run on this machine."""
+
+
+class ClipboardSource:
+    """
+    Source of clipboard contents for CopyTracker.
+
+    `changes` blocks until the clipboard changes, or the source is closed, and returns the new
+    contents as (timestamp, text) pairs. The first call reports what is already on the clipboard.
+    `reads` and `spawns` count clipboard reads and the subprocesses they started.
+    """
+
+    name = "base"
+    event_driven = False
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.closed = False
+        self.reads = 0
+        self.spawns = 0
+
+    def changes(self, timeout=None):
+        """
+        Args:
+            timeout (float, optional): Seconds to wait for a change; None waits until one arrives
+                or the source is closed.
+
+        Returns:
+            list: (timestamp, text) pairs in the order they happened; empty on timeout or close.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the backend and wakes up a blocked `changes` call."""
+        self.closed = True
+
+
+class FakeClipboardSource(ClipboardSource):
+    """In-process clipboard for tests and benchmarks: `copy` delivers text straight to `changes`."""
+
+    name = "fake"
+    event_driven = True
+
+    def __init__(self, initial=None, clock=time.time):
+        super().__init__(clock=clock)
+        self._queue = queue.Queue()
+        if initial is not None:
+            self.copy(initial)
+
+    def copy(self, text, timestamp=None):
+        self._queue.put((self.clock() if timestamp is None else timestamp, text))
+
+    def changes(self, timeout=None):
+        if self.closed:
+            return []
+        try:
+            out = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                out.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        out = [change for change in out if change is not None]
+        self.reads += len(out)
+        return out
+
+    def close(self):
+        super().close()
+        self._queue.put(None)
+
+
+class PollingClipboardSource(ClipboardSource):
+    """
+    Reads the clipboard with `read` every `interval` seconds and reports it when its hash differs
+    from the previous read's. Only the hash is kept between reads.
+    """
+
+    name = "poll"
+
+    def __init__(self, read, interval=1.0, spawns_per_read=0, clock=time.time):
+        """
+        Args:
+            read (callable): Returns the clipboard text.
+            interval (float, optional): Seconds between reads. Defaults to 1.0.
+            spawns_per_read (int, optional): Subprocesses each read starts, for accounting. Defaults to 0.
+        """
+        super().__init__(clock=clock)
+        self.read = read
+        self.interval = interval
+        self.spawns_per_read = spawns_per_read
+        self._wake = threading.Event()
+        self._last_hash = None
+        self._first = True
+
+    def _read(self):
+        self.reads += 1
+        self.spawns += self.spawns_per_read
+        CLIPBOARD_SPAWNS.inc(self.spawns_per_read)
+        try:
+            with CLIPBOARD_READ_SECONDS.time():
+                return self.read()
+        except Exception as exc:
+            CLIPBOARD_ERRORS.inc()
+            logger.debug("Could not read clipboard: %s", exc)
+            return None
+
+    def _changed(self):
+        """Whether the clipboard may have changed since the last read; pollers always read."""
+        return True
+
+    def changes(self, timeout=None):
+        if not self._first:
+            self._wake.wait(self.interval if timeout is None else min(self.interval, timeout))
+        self._first = False
+        if self.closed or not self._changed():
+            return []
+        text = self._read()
+        if text is None:
+            return []
+        digest = content_hash(text)
+        if digest == self._last_hash:
+            return []
+        self._last_hash = digest
+        return [(self.clock(), text)]
+
+    def close(self):
+        super().close()
+        self._wake.set()
+
+
+def pyperclip_source(interval=1.0, clock=time.time):
+    """Polls pyperclip, counting a spawn per read when its backend runs xclip, xsel or similar."""
+    if pyperclip is None:
+        raise SourceUnavailable("pyperclip is not installed")
+    _, paste = pyperclip.determine_clipboard()
+    spawns = 1 if getattr(paste, "__name__", "") in SPAWNING_PASTES else 0
+    return PollingClipboardSource(pyperclip.paste, interval=interval, spawns_per_read=spawns, clock=clock)
+
+
+class Win32SequenceSource(PollingClipboardSource):
+    """
+    Windows backend: checks GetClipboardSequenceNumber, which the system bumps on every clipboard
+    change and which costs no more than a syscall, every `interval` seconds, and only opens the
+    clipboard when it moved.
+    """
+
+    name = "win32"
+
+    def __init__(self, interval=0.02, clock=time.time):
+        if sys.platform != "win32":
+            raise SourceUnavailable("Clipboard sequence numbers need Windows")
+        if pyperclip is None:
+            raise SourceUnavailable("pyperclip is not installed")
+        import ctypes
+        super().__init__(pyperclip.paste, interval=interval, clock=clock)
+        self._sequence_number = ctypes.windll.user32.GetClipboardSequenceNumber
+        self._sequence = None
+
+    def _changed(self):
+        sequence = self._sequence_number()
+        if sequence == self._sequence:
+            return False
+        self._sequence = sequence
+        return True
+
+
+class X11SelectionSource(ClipboardSource):
+    """
+    X11 backend: asks XFixes for SetSelectionOwnerNotify on CLIPBOARD, which the server sends
+    whenever an application takes the clipboard, then converts the selection to UTF8_STRING into
+    a property on a window of its own (following INCR for large transfers). `changes` waits in
+    select() on the X connection, so nothing runs between copies and no subprocess is started.
+    """
+
+    name = "x11"
+    event_driven = True
+
+    def __init__(self, display=None, clock=time.time):
+        if X is None:
+            raise SourceUnavailable("python-xlib is not installed")
+        try:
+            self._display = xdisplay.Display(display)
+        except Exception as exc:
+            raise SourceUnavailable(f"Cannot open X display: {exc}")
+        if not self._display.has_extension("XFIXES"):
+            self._display.close()
+            raise SourceUnavailable("The X server has no XFIXES extension")
+        super().__init__(clock=clock)
+        display = self._display
+        display.xfixes_query_version()
+        self._clipboard = display.intern_atom("CLIPBOARD")
+        self._utf8_string = display.intern_atom("UTF8_STRING")
+        self._incr = display.intern_atom("INCR")
+        self._property = display.intern_atom("DRAGON_CLIPBOARD")
+        root = display.screen().root
+        self._window = root.create_window(0, 0, 1, 1, 0, X.CopyFromParent,
+                                          event_mask=X.PropertyChangeMask)
+        display.xfixes_select_selection_input(root, self._clipboard, xfixes.XFixesSetSelectionOwnerNotifyMask)
+        self._owner_event = display.extension_event.SetSelectionOwnerNotify
+        self._chunks = None  # Parts of an INCR transfer in progress.
+        self._pending = []
+        self._last_hash = None
+        self._wake_read, self._wake_write = os.pipe()
+        self._request()
+
+    def _request(self):
+        self._window.convert_selection(self._clipboard, self._utf8_string, self._property, X.CurrentTime)
+        self._display.flush()
+
+    def _deliver(self, data):
+        self.reads += 1
+        text = data.decode("utf-8", "replace") if isinstance(data, bytes) else str(data)
+        digest = content_hash(text)
+        if digest != self._last_hash:
+            self._last_hash = digest
+            self._pending.append((self.clock(), text))
+
+    def _take_property(self):
+        prop = self._window.get_full_property(self._property, X.AnyPropertyType, sizehint=65536)
+        self._window.delete_property(self._property)
+        self._display.flush()
+        return prop
+
+    def _handle(self, event):
+        if (event.type, getattr(event, "sub_code", None)) == self._owner_event:
+            if _window_id(event.owner) not in (X.NONE, self._window.id):
+                self._request()
+        elif event.type == X.SelectionNotify and _window_id(event.requestor) == self._window.id:
+            if event.property == X.NONE:
+                return  # The owner could not provide text (e.g. an image was copied).
+            with CLIPBOARD_READ_SECONDS.time():
+                prop = self._take_property()
+            if prop is None:
+                return
+            if prop.property_type == self._incr:
+                # Large transfer: deleting the property asks the owner for the next chunk.
+                self._chunks = []
+            else:
+                self._deliver(prop.value)
+        elif (event.type == X.PropertyNotify and self._chunks is not None and
+              _window_id(event.window) == self._window.id and event.atom == self._property and
+              event.state == X.PropertyNewValue):
+            prop = self._take_property()
+            if prop is None or not len(prop.value):
+                chunks, self._chunks = self._chunks, None
+                self._deliver(b"".join(chunks))
+            else:
+                self._chunks.append(bytes(prop.value))
+
+    def _drain(self):
+        display = self._display
+        while display.pending_events():
+            try:
+                self._handle(display.next_event())
+            except xerror.XError as exc:
+                CLIPBOARD_ERRORS.inc()
+                logger.debug("Could not read clipboard: %s", exc)
+
+    def changes(self, timeout=None):
+        if self.closed:
+            self._release()
+            return []
+        self._drain()
+        while not self._pending:
+            ready, _, _ = select.select([self._display.fileno(), self._wake_read], [], [], timeout)
+            if self.closed:
+                self._release()
+                return []
+            if not ready:
+                break
+            self._drain()
+        out, self._pending = self._pending, []
+        return out
+
+    def _release(self):
+        # Runs on the thread that calls `changes`, which is the only one using the connection.
+        if self._display is not None:
+            self._display.close()
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+            self._display = None
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        os.write(self._wake_write, b"\0")
+
+
+def make_source(name="auto", poll_interval=1.0, clock=time.time):
+    """
+    Picks a clipboard backend.
+
+    Args:
+        name (str, optional): "win32" (sequence numbers), "x11" (XFixes), "poll" (pyperclip) or
+            "auto", which tries this platform's change-notifying backend first and falls back to
+            polling pyperclip. Defaults to "auto".
+        poll_interval (float, optional): Interval for the pyperclip fallback. Defaults to 1.0.
+
+    Returns:
+        ClipboardSource: The source.
+
+    Raises:
+        SourceUnavailable: If no requested backend can run here.
+    """
+    if name in ("win32", "auto") and sys.platform == "win32":
+        try:
+            return Win32SequenceSource(clock=clock)
+        except (SourceUnavailable, OSError, AttributeError) as exc:
+            if name == "win32":
+                raise SourceUnavailable(str(exc))
+            logger.warning("Clipboard sequence numbers unavailable (%s); polling instead.", exc)
+    if name in ("x11", "auto") and sys.platform != "win32":
+        try:
+            return X11SelectionSource(clock=clock)
+        except SourceUnavailable:
+            if name == "x11":
+                raise
+    if name in ("poll", "auto"):
+        return pyperclip_source(interval=poll_interval, clock=clock)
+    raise SourceUnavailable(f"Unknown clipboard source {name!r}")
@@ -0,0 +1,239 @@
+import os
+import re
+import zlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from clipboard_sources import content_hash
+
+_TOKEN = re.compile(r"\w+")
+
+Match = namedtuple("Match", ["hash", "similarity", "label"])
+
+
+def shingles(text, size=3):
+    """
+    Hashes of the overlapping `size`-word shingles of `text`, lower-cased, as a uint64 array.
+
+    Words are hashed once with CRC-32 and each shingle's hash is a polynomial of its words'
+    hashes, computed for all shingles at once, so long pastes cost no Python loop per shingle.
+    """
+    words = _TOKEN.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    size = min(size, len(hashes))
+    count = len(hashes) - size + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        # Wraps modulo 2**64, which is fine for a hash.
+        combined = combined * np.uint64(1000003) + hashes[offset:offset + count]
+    return np.unique(combined & np.uint64(0xFFFFFFFF))
+
+
+def match_fields(matches):
+    """
+    Flat event fields describing `matches`: the closest stored text and its similarity, and the
+    label of the closest reference text, if any matched.
+    """
+    if not matches:
+        return {}
+    fields = {"near_duplicate": matches[0].hash, "similarity": matches[0].similarity}
+    reference = next((match for match in matches if match.label), None)
+    if reference is not None:
+        fields["reference"] = reference.label
+        fields["reference_similarity"] = reference.similarity
+    return fields
+
+
+class MinHasher:
+    """MinHash signatures: for each of `num_perm` hash functions, the smallest hash of any shingle."""
+
+    def __init__(self, num_perm=64, seed=1, block=8192):
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits, with a odd. NumPy's uint64
+        # arithmetic wraps, which is exactly the modulo.
+        self.a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None] * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+        self.num_perm = num_perm
+        self.block = block
+
+    def signature(self, shingle_hashes):
+        signature = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint64)
+        for first in range(0, len(shingle_hashes), self.block):
+            block = shingle_hashes[None, first:first + self.block]
+            np.minimum(signature, ((self.a * block + self.b) >> np.uint64(32)).min(axis=1), out=signature)
+        return signature
+
+
+class _Entry:
+    __slots__ = ("text", "size", "signature", "label", "count")
+
+    def __init__(self, text, size, signature, label):
+        self.text = text
+        self.size = size
+        self.signature = signature
+        self.label = label
+        self.count = 1
+
+
+class ContentStore:
+    """
+    Content-addressed store for copied text with near-duplicate detection.
+
+    Text is kept once per content hash however often it is pasted; events reference it by hash.
+    Each new text gets a MinHash signature of its word shingles, indexed with LSH (`bands` bands of
+    `num_perm / bands` rows), so pasting something close to an earlier paste or to a registered
+    reference text (e.g. the exam questions) is found by looking up a handful of buckets, not by
+    comparing against everything stored. Texts are held in memory up to `max_bytes`, least
+    recently used first out; with a `directory` every text is also written there once, named by
+    its hash, and read back on demand.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024, num_perm=64, bands=16, shingle_size=3,
+                 threshold=0.6):
+        """
+        Args:
+            directory (str, optional): Where texts are persisted; None keeps them in memory only.
+            max_bytes (int, optional): Text bytes held in memory. Defaults to 64 MiB.
+            num_perm (int, optional): MinHash signature length. Defaults to 64.
+            bands (int, optional): LSH bands; must divide num_perm. Defaults to 16.
+            shingle_size (int, optional): Words per shingle. Defaults to 3.
+            threshold (float, optional): Estimated Jaccard similarity from which a stored text
+                counts as a near duplicate. Defaults to 0.6.
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self.bytes_in_memory = 0
+        self.puts = 0
+        self._entries = {}
+        self._resident = OrderedDict()  # Hashes whose text is in memory, least recently used first.
+        self._buckets = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, digest):
+        return digest in self._entries
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest + ".txt")
+
+    def put(self, text, label=None):
+        """
+        Stores `text` unless its hash is already present.
+
+        Args:
+            text (str): The copied text.
+            label (str, optional): Marks a reference text, e.g. "exam question 3"; matches report it.
+
+        Returns:
+            tuple: (content hash, list of Match) for the other stored texts close to `text`, most
+                similar first. An exact repeat is recognized by its hash alone.
+        """
+        digest = content_hash(text)
+        with self._lock:
+            self.puts += 1
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry.count += 1
+                if label and not entry.label:
+                    entry.label = label
+                return digest, self._matches(digest, entry.signature)
+        # Signatures are computed outside the lock; they are the only expensive part.
+        signature = self.hasher.signature(shingles(text, self.shingle_size))
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                entry.count += 1
+                return digest, self._matches(digest, entry.signature)
+            matches = self._matches(digest, signature)
+            entry = _Entry(text, len(text.encode("utf-8", "surrogatepass")), signature, label)
+            self._entries[digest] = entry
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                bucket.setdefault(key, []).append(digest)
+            if self.directory:
+                self._write(digest, text)
+            self._resident[digest] = None
+            self.bytes_in_memory += entry.size
+            self._evict()
+            return digest, matches
+
+    def _write(self, digest, text):
+        path = self._path(digest)
+        if not os.path.exists(path):
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8", errors="surrogatepass") as fh:
+                fh.write(text)
+            os.replace(tmp, path)
+
+    def _evict(self):
+        # Callers hold the lock. Without a directory an evicted text is gone; its hash,
+        # signature and label stay, so near duplicates of it are still reported.
+        while self.bytes_in_memory > self.max_bytes and len(self._resident) > 1:
+            digest, _ = self._resident.popitem(last=False)
+            entry = self._entries[digest]
+            entry.text = None
+            self.bytes_in_memory -= entry.size
+
+    def _matches(self, digest, signature):
+        # Callers hold the lock.
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(bucket.get(key, ()))
+        candidates.discard(digest)
+        matches = []
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            similarity = float(np.count_nonzero(entry.signature == signature)) / len(signature)
+            if similarity >= self.threshold:
+                matches.append(Match(candidate, round(similarity, 3), entry.label))
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        return matches
+
+    def query(self, text):
+        """Near duplicates of `text` among the stored texts, without storing it."""
+        digest = content_hash(text)
+        signature = self.hasher.signature(shingles(text, self.shingle_size))
+        with self._lock:
+            return self._matches(digest, signature)
+
+    def get(self, digest):
+        """The text stored under `digest`, or None if unknown (or evicted without a directory)."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry.text is not None:
+                self._resident.move_to_end(digest)
+                return entry.text
+        if self.directory and len(digest) == 32 and all(c in "0123456789abcdef" for c in digest):
+            try:
+                with open(self._path(digest), encoding="utf-8", errors="surrogatepass") as fh:
+                    return fh.read()
+            except FileNotFoundError:
+                return None
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "texts": len(self._entries),
+                "resident": len(self._resident),
+                "bytes_in_memory": self.bytes_in_memory,
+                "puts": self.puts,
+                "references": sum(1 for entry in self._entries.values() if entry.label),
+            }
@@ -1,182 +1,297 @@
-import time
-import threading
-import logging
-import pyperclip
-from pynput import keyboard
-
-
-class CopyTracker:
-    def __init__(self, poll_interval=1.0, callback=None):
-        self.poll_interval = poll_interval
-        self.callback = callback
-        self.event_log = []
-        self.last_clipboard = ""
-        self.running = False
-        self.shortcuts_disabled = False
-        self.risk_score = 0
-        self.last_event_time = None
-        self.event_count = 0
-        self.keyboard_listener = None
-
-        self.logger = logging.getLogger("CopyTracker")
-        self.logger.setLevel(logging.INFO)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-
-        # --- FINAL FIX: A robust stateful listener approach ---
-        # This set will hold all keys that are currently pressed down.
-        self.pressed_keys = set()
-
-        # Define the combinations to block. A combination is a frozenset of keys.
-        self.blocked_combinations = [
-            frozenset([keyboard.Key.ctrl, keyboard.KeyCode.from_char('c')]),
-            frozenset([keyboard.Key.ctrl, keyboard.KeyCode.from_char('v')]),
-            frozenset([keyboard.Key.ctrl, keyboard.KeyCode.from_char('x')]),
-            frozenset([keyboard.Key.ctrl, keyboard.KeyCode.from_char('a')]),
-            frozenset([keyboard.Key.alt, keyboard.Key.tab]),
-            frozenset([keyboard.Key.alt_l, keyboard.Key.tab]),
-            frozenset([keyboard.Key.alt_r, keyboard.Key.tab]),
-            frozenset([keyboard.Key.alt, keyboard.Key.f4]),
-            frozenset([keyboard.Key.alt_l, keyboard.Key.f4]),
-            frozenset([keyboard.Key.alt_r, keyboard.Key.f4]),
-        ]
-
-    def on_press(self, key):
-        """When a key is pressed, add it to the set and check for blocked combinations."""
-        if not self.shortcuts_disabled:
-            return True
-
-        # For modifiers like Ctrl, Alt, pynput sometimes sends a generic version.
-        # We normalize it to the left-side version for consistency.
-        if key == keyboard.Key.ctrl_r: key = keyboard.Key.ctrl
-        if key == keyboard.Key.alt_r: key = keyboard.Key.alt
-
-        # Add the newly pressed key to our set of currently held keys.
-        self.pressed_keys.add(key)
-
-        # Check if the set of currently pressed keys matches any blocked combination.
-        for combination in self.blocked_combinations:
-            if combination.issubset(self.pressed_keys):
-                self.logger.info(f"Blocked shortcut combination: {combination}")
-                return False  # Suppress the key press
-
-        return True  # Allow the key press
-
-    def on_release(self, key):
-        """When a key is released, remove it from the set."""
-        if not self.shortcuts_disabled:
-            return True
-
-        # Normalize the key on release as well
-        if key == keyboard.Key.ctrl_r: key = keyboard.Key.ctrl
-        if key == keyboard.Key.alt_r: key = keyboard.Key.alt
-
-        try:
-            self.pressed_keys.remove(key)
-        except KeyError:
-            # This can happen if the listener starts after a key was already held down.
-            pass
-        return True
-
-    def disable_shortcuts(self):
-        """Starts the listener to block shortcuts."""
-        if not self.shortcuts_disabled:
-            self.shortcuts_disabled = True
-            if self.keyboard_listener is None:
-                # The listener with suppress=True will block keys if on_press returns False.
-                self.keyboard_listener = keyboard.Listener(
-                    on_press=self.on_press,
-                    on_release=self.on_release,
-                    suppress=True
-                )
-                self.keyboard_listener.start()
-            self.logger.info("Keyboard shortcut blocking enabled.")
-            return True
-        return False
-
-    def enable_shortcuts(self):
-        """Stops the listener to allow all shortcuts."""
-        if self.shortcuts_disabled:
-            self.shortcuts_disabled = False
-            if self.keyboard_listener:
-                self.keyboard_listener.stop()
-                self.keyboard_listener = None
-            self.pressed_keys.clear()  # Clear any lingering keys
-            self.logger.info("Keyboard shortcut blocking disabled.")
-            return True
-        return False
-
-    def poll_clipboard(self):
-        while self.running:
-            try:
-                text = pyperclip.paste()
-                if text != self.last_clipboard and text.strip() != "":
-                    current_time = time.time()
-                    word_count = len(text.split())
-                    base_risk = (word_count // 10) * 10
-
-                    if self.last_event_time and (current_time - self.last_event_time) < 60:
-                        self.event_count += 1
-                    else:
-                        self.event_count = 1
-                    self.last_event_time = current_time
-
-                    multiplier = 2 ** (self.event_count - 1)
-                    risk_increment = base_risk * multiplier
-                    self.risk_score += risk_increment
-
-                    event = {
-                        "timestamp": current_time, "event": "Copy-Paste Detected",
-                        "content_preview": text[:50], "word_count": word_count,
-                        "risk": risk_increment
-                    }
-                    self.event_log.append(event)
-                    if self.callback:
-                        self.callback(event)
-                    self.last_clipboard = text
-            except Exception as e:
-                self.logger.debug("Could not read clipboard: %s", e)
-
-            time.sleep(self.poll_interval)
-
-    def start(self):
-        self.running = True
-        self.thread = threading.Thread(target=self.poll_clipboard, daemon=True)
-        self.thread.start()
-        self.logger.info("CopyTracker started.")
-
-    def stop(self):
-        self.running = False
-        if self.thread:
-            self.thread.join()
-        if self.keyboard_listener:
-            self.keyboard_listener.stop()
-            self.keyboard_listener = None
-        self.logger.info("CopyTracker stopped.")
-
-
-if __name__ == "__main__":
-    def event_callback(event):
-        print("Copy Event:", event)
-
-
-    tracker = CopyTracker(callback=event_callback)
-    tracker.start()
-
-    print("Starting test... Shortcuts will be disabled in 5 seconds.")
-    time.sleep(5)
-    tracker.disable_shortcuts()
-    print("Shortcuts disabled. Try typing normally, then try Ctrl+C, Alt+Tab, etc.")
-
-    time.sleep(15)
-    tracker.enable_shortcuts()
-    print("Shortcuts enabled again.")
-
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        tracker.stop()
+import time
+import threading
+import os
+import sys
+import logging
+from pynput import keyboard
+from event_store import EventLog
+from clipboard_sources import SourceUnavailable, content_hash, make_source
+from content_store import match_fields
+from shortcut_policy import MODIFIER_KEYS, PolicyFile, key_id
+import metrics
+
+CLIPBOARD_POLLS = metrics.counter("dragon_clipboard_polls_total",
+                                  "CopyTracker wake-ups: clipboard polls, or change notifications.")
+
+# Characters of copied text kept on an event; the text itself is only kept as its hash.
+PREVIEW_CHARS = 50
+
+# Key-down messages of the Windows low-level keyboard hook, and the macOS key-down event type.
+WM_KEYDOWN, WM_SYSKEYDOWN = 0x0100, 0x0104
+CG_EVENT_KEY_DOWN = 10
+
+_win32_special_keys = None
+
+
+def _win32_key(vk):
+    """The pynput key for a Windows virtual-key code, named like the listener's own callbacks."""
+    global _win32_special_keys
+    if _win32_special_keys is None:
+        _win32_special_keys = {key.value.vk: key for key in keyboard.Key}
+    return _win32_special_keys.get(vk) or keyboard.KeyCode.from_vk(vk)
+
+
+class CopyTracker:
+    def __init__(self, poll_interval=1.0, callback=None, event_log=None, source=None, content_store=None,
+                 policy=None):
+        """
+        Args:
+            poll_interval (float, optional): Poll interval when falling back to pyperclip. Defaults to 1.0.
+            callback (callable, optional): Called with each copy event.
+            event_log (EventLog, optional): Where events are recorded.
+            source (ClipboardSource, optional): Clipboard backend; by default `make_source` picks
+                one on start, from DRAGON_CLIPBOARD_SOURCE ("auto", "win32", "x11" or "poll").
+            content_store (ContentStore, optional): Keeps each copied text once and reports near
+                duplicates of earlier copies and reference texts on the event.
+            policy (PolicyFile, optional): Shortcut policy applied while shortcuts are disabled;
+                defaults to the built-in one.
+        """
+        self.poll_interval = poll_interval
+        self.callback = callback
+        self.source = source
+        self.content_store = content_store
+        self.policy = policy if policy is not None else PolicyFile()
+        self.recorder = None  # session_recorder.SessionRecorder receiving clipboard changes and shortcut keys.
+        self.event_log = event_log if event_log is not None else EventLog("copy")
+        self.last_hash = None
+        self.running = False
+        self.thread = None
+        self.shortcuts_disabled = False
+        self.risk_score = 0
+        self.last_event_time = None
+        self.event_count = 0
+        self.keyboard_listener = None
+
+        self.logger = logging.getLogger("CopyTracker")
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+        # Modifiers held right now, as a bitmask and by key name (so releasing Left Alt while
+        # Right Alt is held keeps Alt set), and non-modifier keys held, so auto-repeat of a
+        # blocked shortcut is recorded once.
+        self.modifiers = 0
+        self._held_modifiers = set()
+        self._held_keys = set()
+
+    def on_press(self, key, now=None):
+        """
+        Looks the key up in the shortcut policy and records a blocked or logged shortcut. `now` is
+        the time of the key press, by default the current time. Always returns True: returning
+        False would stop the listener. Blocked keys are suppressed by the platform event filters.
+        """
+        if not self.shortcuts_disabled:
+            return True
+
+        name = key_id(key)
+        self._record_key(name, True)
+        bit = MODIFIER_KEYS.get(name)
+        if bit:
+            self._held_modifiers.add(name)
+            self.modifiers |= bit
+            return True
+
+        rule = self.policy.current.lookup(name, self.modifiers)
+        if rule is None or rule.action == "allow":
+            return True
+        if name not in self._held_keys:
+            self._held_keys.add(name)
+            self._record_shortcut(rule, now)
+        return True
+
+    def blocks(self, name):
+        """Whether pressing `name` (a key_id) now, with the modifiers held, is a blocked shortcut."""
+        if not self.shortcuts_disabled or name in MODIFIER_KEYS:
+            return False
+        rule = self.policy.current.lookup(name, self.modifiers)
+        return rule is not None and rule.action == "block"
+
+    def _suppress(self, key):
+        # The listener skips the callbacks for a suppressed event, so the press is handled here.
+        self.on_press(key)
+        self.keyboard_listener.suppress_event()
+
+    def _win32_event_filter(self, msg, data):
+        # Runs in the hook before on_press. suppress_event() raises to drop this one key press.
+        if msg in (WM_KEYDOWN, WM_SYSKEYDOWN):
+            key = _win32_key(data.vkCode)
+            if self.blocks(key_id(key)):
+                self._suppress(key)
+        return True
+
+    def _darwin_intercept(self, event_type, event):
+        # Runs after on_press; returning None drops the event from the system's event stream.
+        if event_type == CG_EVENT_KEY_DOWN and self.blocks(key_id(self.keyboard_listener._event_to_key(event))):
+            return None
+        return event
+
+    def on_release(self, key, now=None):
+        """Clears a released key from the held modifiers and keys."""
+        if not self.shortcuts_disabled:
+            return True
+
+        name = key_id(key)
+        self._record_key(name, False)
+        if name in MODIFIER_KEYS:
+            self._held_modifiers.discard(name)
+            modifiers = 0
+            for held in self._held_modifiers:
+                modifiers |= MODIFIER_KEYS[held]
+            self.modifiers = modifiers
+        else:
+            # Missing when the listener started after the key was already held down.
+            self._held_keys.discard(name)
+        return True
+
+    def _record_key(self, name, pressed):
+        # Only keys the policy could act on are recorded, never the text the candidate types.
+        if self.recorder is not None and (name in MODIFIER_KEYS or name in self.policy.current.keys):
+            self.recorder.key(name, pressed)
+
+    def _record_shortcut(self, rule, now=None):
+        self.risk_score += rule.risk
+        event = {
+            "timestamp": time.time() if now is None else now,
+            "event": "Shortcut blocked" if rule.action == "block" else "Shortcut used",
+            "shortcut": rule.keys, "action": rule.action, "risk": rule.risk
+        }
+        self.event_log.append(event)
+        self.logger.info("%s: %s (risk +%d)", event["event"], rule.keys, rule.risk)
+        if self.callback:
+            self.callback(event)
+
+    def disable_shortcuts(self):
+        """Starts the listener to block shortcuts."""
+        if not self.shortcuts_disabled:
+            try:
+                self.policy.reload()
+            except (OSError, ValueError, KeyError) as exc:
+                self.logger.error("Could not reload shortcut policy, keeping the current one: %s", exc)
+            self.shortcuts_disabled = True
+            if self.keyboard_listener is None:
+                # Only blocked shortcuts are suppressed, through the Windows and macOS event
+                # filters (pynput passes each platform only its own options). X11 cannot drop a
+                # single key press, so there blocked shortcuts are only recorded.
+                self.keyboard_listener = keyboard.Listener(
+                    on_press=self.on_press,
+                    on_release=self.on_release,
+                    win32_event_filter=self._win32_event_filter,
+                    darwin_intercept=self._darwin_intercept,
+                )
+                self.keyboard_listener.start()
+                if sys.platform not in ("win32", "darwin"):
+                    self.logger.warning("Blocked shortcuts can only be recorded, not suppressed, on %s.",
+                                        sys.platform)
+            self.logger.info("Keyboard shortcut blocking enabled.")
+            return True
+        return False
+
+    def enable_shortcuts(self):
+        """Stops the listener to allow all shortcuts."""
+        if self.shortcuts_disabled:
+            self.shortcuts_disabled = False
+            if self.keyboard_listener:
+                self.keyboard_listener.stop()
+                self.keyboard_listener = None
+            # Clear any lingering keys.
+            self.modifiers = 0
+            self._held_modifiers.clear()
+            self._held_keys.clear()
+            self.logger.info("Keyboard shortcut blocking disabled.")
+            return True
+        return False
+
+    def poll_clipboard(self):
+        source = self.source
+        while self.running:
+            # Blocks until the source reports new clipboard contents.
+            changes = source.changes()
+            CLIPBOARD_POLLS.inc()
+            for current_time, text in changes:
+                if self.recorder is not None:
+                    self.recorder.clipboard(text, current_time)
+                self._on_clipboard(text, current_time)
+
+    def _on_clipboard(self, text, current_time):
+        digest = content_hash(text)
+        if digest == self.last_hash or text.strip() == "":
+            return
+        matches = []
+        if self.content_store is not None:
+            digest, matches = self.content_store.put(text)
+        word_count = len(text.split())
+        base_risk = (word_count // 10) * 10
+
+        if self.last_event_time and (current_time - self.last_event_time) < 60:
+            self.event_count += 1
+        else:
+            self.event_count = 1
+        self.last_event_time = current_time
+
+        multiplier = 2 ** (self.event_count - 1)
+        risk_increment = base_risk * multiplier
+        self.risk_score += risk_increment
+
+        event = {
+            "timestamp": current_time, "event": "Copy-Paste Detected",
+            "content_preview": text[:PREVIEW_CHARS], "content_hash": digest,
+            "length": len(text), "word_count": word_count,
+            "risk": risk_increment
+        }
+        event.update(match_fields(matches))
+        self.event_log.append(event)
+        if self.callback:
+            self.callback(event)
+        self.last_hash = digest
+
+    def start(self):
+        if self.source is None:
+            try:
+                self.source = make_source(os.environ.get("DRAGON_CLIPBOARD_SOURCE", "auto"),
+                                          poll_interval=self.poll_interval)
+            except SourceUnavailable as exc:
+                self.logger.error("CopyTracker not started: %s", exc)
+                return
+        self.running = True
+        self.thread = threading.Thread(target=self.poll_clipboard, daemon=True)
+        self.thread.start()
+        self.logger.info("CopyTracker started (%s clipboard source).", self.source.name)
+
+    def stop(self):
+        self.running = False
+        if self.source is not None:
+            self.source.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.keyboard_listener:
+            self.keyboard_listener.stop()
+            self.keyboard_listener = None
+        self.logger.info("CopyTracker stopped.")
+
+
+if __name__ == "__main__":
+    def event_callback(event):
+        print("Copy Event:", event)
+
+
+    tracker = CopyTracker(callback=event_callback)
+    tracker.start()
+
+    print("Starting test... Shortcuts will be disabled in 5 seconds.")
+    time.sleep(5)
+    tracker.disable_shortcuts()
+    print("Shortcuts disabled. Try typing normally, then try Ctrl+C, Alt+Tab, etc.")
+
+    time.sleep(15)
+    tracker.enable_shortcuts()
+    print("Shortcuts enabled again.")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        tracker.stop()
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def minmax_downsample(x, y, max_points):
+    """
+    Reduces a series to at most `max_points` points while keeping its visual envelope.
+
+    The samples are split into max_points // 2 equal-count buckets and the minimum and maximum
+    of every bucket are kept, in their original order, so spikes survive the reduction.
+
+    Args:
+        x (array-like): Sample positions, sorted ascending.
+        y (array-like): Sample values.
+        max_points (int): Upper bound on the number of returned points.
+
+    Returns:
+        tuple: (x, y) as NumPy arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    buckets = max_points // 2
+    if n <= max_points or buckets < 1:
+        return x, y
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+    # Sorting by (bucket, value) puts each bucket's minimum first and its maximum last.
+    order = np.lexsort((y, bucket_ids))
+    keep = np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1])))
+    return x[keep], y[keep]
+
+
+def lttb_downsample(x, y, max_points):
+    """
+    Largest-Triangle-Three-Buckets downsampling to at most `max_points` points.
+
+    The first and last samples are always kept. The rest are split into max_points - 2
+    equal-count buckets, and each bucket keeps the sample that forms the largest triangle with
+    the previously kept point and the mean of the next bucket, which preserves the shape of the
+    series far better than uniform striding. Triangle areas are computed for a whole bucket at
+    once, so the Python loop runs once per output point rather than once per sample.
+
+    Args:
+        x (array-like): Sample positions, sorted ascending.
+        y (array-like): Sample values.
+        max_points (int): Upper bound on the number of returned points.
+
+    Returns:
+        tuple: (x, y) as NumPy arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return x, y
+    buckets = max_points - 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+    # Mean of every bucket, used as the third triangle vertex of the bucket before it.
+    counts = np.diff(edges)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    means_x = np.append(sums_x / counts, x[-1])
+    means_y = np.append(sums_y / counts, y[-1])
+
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    previous = 0
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[previous], y[previous]
+        # Twice the triangle area; the constant factor does not change the argmax.
+        areas = np.abs((ax - means_x[i + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (means_y[i + 1] - ay))
+        previous = lo + int(np.argmax(areas))
+        keep[i + 1] = previous
+    return x[keep], y[keep]
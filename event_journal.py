@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+
+from event_store import json_default
+
+
+def new_session_id():
+    """A sortable, unique name for a run's journal directory, e.g. "20261019-153012-3f9c2a"."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def journal_sessions(root):
+    """Session directories under `root` that hold journal segments, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    sessions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and any(entry.startswith(EventJournal.SEGMENT_PREFIX) and
+                                       entry.endswith(EventJournal.SEGMENT_SUFFIX) for entry in os.listdir(path)):
+            sessions.append((os.path.getmtime(path), name))
+    return [name for _, name in sorted(sessions)]
+
+
+def prune_sessions(root, keep, current=None):
+    """
+    Deletes the journals of all but the `keep` most recently written sessions under `root`,
+    never `current`, with everything in their directories (e.g. their copied texts). Directories
+    under `root` that hold no journal are left alone.
+
+    Returns:
+        list: Names of the deleted session directories.
+    """
+    sessions = [name for name in journal_sessions(root) if name != current]
+    if current is not None:
+        keep -= 1
+    removed = sessions[:max(0, len(sessions) - max(keep, 0))]
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return removed
+
+
+class EventJournal:
+    """
+    Append-only, segmented NDJSON journal of every event recorded in an EventStore.
+
+    Trackers never wait on the disk: `on_event` only enqueues. A background writer drains the
+    queue in batches, writes each batch with a single flush (group commit) and fsyncs at most
+    once per `fsync_interval` seconds. On startup `replay_into` rebuilds the in-memory store,
+    skipping a torn final record left behind by a crash.
+    """
+
+    SEGMENT_PREFIX = "journal-"
+    SEGMENT_SUFFIX = ".ndjson"
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync_interval=1.0, max_batch=4096):
+        """
+        Args:
+            directory (str): Directory holding the journal segments.
+            segment_bytes (int, optional): Size after which a new segment is started. Defaults to 16 MiB.
+            fsync_interval (float, optional): Seconds between fsyncs. 0 fsyncs every batch and None
+                leaves syncing to the OS. Defaults to 1.0.
+            max_batch (int, optional): Maximum events written per group commit. Defaults to 4096.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._segment_index = 0
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self._thread = None
+        self.written = 0
+        self.logger = logging.getLogger("EventJournal")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def segments(self):
+        names = [n for n in os.listdir(self.directory)
+                 if n.startswith(self.SEGMENT_PREFIX) and n.endswith(self.SEGMENT_SUFFIX)]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def replay(self):
+        """Yields (source, event) for every intact record, oldest first."""
+        for path in self.segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                        yield record["source"], record["event"]
+                    except (ValueError, KeyError):
+                        # A torn write from a crash can only be the tail of a segment; skip it.
+                        self.logger.warning("Skipping corrupt journal record %s:%d", path, line_number)
+
+    def replay_into(self, store):
+        """Restores every journaled event into an EventStore. Returns the number of events."""
+        start = time.perf_counter()
+        count = 0
+        for source, event in self.replay():
+            store.restore(source, event)
+            count += 1
+        self.logger.info("Replayed %d events in %.3f s", count, time.perf_counter() - start)
+        return count
+
+    def on_event(self, source, event):
+        """EventStore listener; never blocks the calling tracker."""
+        self._queue.put((source, event))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def start(self):
+        existing = self.segments()
+        if existing:
+            name = os.path.basename(existing[-1])
+            self._segment_index = int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.logger.info("EventJournal started in %s.", self.directory)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.logger.info("EventJournal stopped after writing %d events.", self.written)
+
+    def _open_next_segment(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+        self._segment_index += 1
+        path = os.path.join(self.directory, f"{self.SEGMENT_PREFIX}{self._segment_index:06d}{self.SEGMENT_SUFFIX}")
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+    def _next_item(self):
+        # While unsynced data is pending, wake up in time to fsync it even if no more events arrive.
+        if not self._dirty or self.fsync_interval is None:
+            return self._queue.get()
+        timeout = max(0.0, self._last_fsync + self.fsync_interval - time.monotonic())
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            self._sync()
+            return self._queue.get()
+
+    def _run(self):
+        self._open_next_segment()
+        running = True
+        while running:
+            batch = [self._next_item()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in batch:
+                if item is None:
+                    running = False
+                    continue
+                source, event = item
+                lines.append(json.dumps({"source": source, "event": event}, default=json_default))
+            try:
+                if lines:
+                    self._file.write("\n".join(lines) + "\n")
+                    self._file.flush()
+                    self.written += len(lines)
+                    self._dirty = True
+                if not running or (self.fsync_interval is not None and
+                                   time.monotonic() - self._last_fsync >= self.fsync_interval):
+                    self._sync()
+                if self._file.tell() >= self.segment_bytes:
+                    self._open_next_segment()
+            except OSError as e:
+                self.logger.error("Failed to write %d journal records: %s", len(lines), e)
+        self._file.close()
+        self._file = None
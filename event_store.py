@@ -0,0 +1,262 @@
+import os
+import json
+import threading
+import logging
+from collections import deque
+
+
+def json_default(obj):
+    # NumPy scalars (e.g. landmark coordinates from the face detector) expose .item().
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+class EventLog:
+    """
+    A bounded, per-source ring buffer of event dicts.
+
+    Writers are serialized by a lock and stamp every event with a monotonically
+    increasing ``seq``. Readers never take the lock: each slot holds an
+    ``(index, event)`` tuple, so a reader can tell when a slot it is looking at has
+    already been overwritten by a newer event and skip it. Evicted events are queued
+    under the writer lock but written to the spill file after it is released, so a
+    slow disk never holds up the other sources sharing the lock.
+    """
+
+    def __init__(self, name, capacity=5000, spill_path=None, lock=None, sequence=None, listeners=None):
+        """
+        Args:
+            name (str): Source name, e.g. "mouse" or "face".
+            capacity (int, optional): Number of events kept in memory. Defaults to 5000.
+            spill_path (str, optional): NDJSON file that evicted events are appended to.
+                Evicted events are dropped when None. Defaults to None.
+            lock (threading.Lock, optional): Writer lock, shared when owned by an EventStore.
+            sequence (callable, optional): Returns the next sequence ID, shared when owned
+                by an EventStore.
+            listeners (list, optional): Callables invoked as ``listener(name, event)`` after
+                every append, shared when owned by an EventStore.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.name = name
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self._slots = [None] * capacity
+        self._count = 0
+        self._lock = lock if lock is not None else threading.Lock()
+        self._sequence = sequence if sequence is not None else self._local_sequence
+        self._local_seq = 0
+        self._spill_file = None
+        self._evicted = deque()
+        self._spill_lock = threading.Lock()
+        # Index of the newest event stamped earlier than the event before it, and that event's time.
+        self._last_disorder = -1
+        self._last_time = None
+        self.last_seq = 0
+        self.listeners = listeners if listeners is not None else []
+
+    def _local_sequence(self):
+        self._local_seq += 1
+        return self._local_seq
+
+    def append(self, event):
+        """Stores an event, stamping it with its sequence ID, and notifies listeners."""
+        with self._lock:
+            seq = self._sequence()
+            event["seq"] = seq
+            self._store(event)
+        if self._evicted:
+            self._spill()
+        for listener in self.listeners:
+            listener(self.name, event)
+        return seq
+
+    def _store(self, event):
+        # Callers hold the writer lock and have already stamped event["seq"].
+        index = self._count
+        slot = index % self.capacity
+        evicted = self._slots[slot]
+        self._slots[slot] = (index, event)
+        self._count = index + 1
+        self.last_seq = event["seq"]
+        timestamp = event.get("timestamp")
+        timestamp = timestamp if isinstance(timestamp, (int, float)) else 0.0
+        if self._last_time is not None and timestamp < self._last_time:
+            self._last_disorder = index
+        self._last_time = timestamp
+        if evicted is not None and self.spill_path is not None:
+            self._evicted.append(evicted[1])
+
+    def _spill(self):
+        # Called without the writer lock. Events are queued in eviction order under the writer
+        # lock and taken off in that order here, so the file stays in order.
+        with self._spill_lock:
+            while self._evicted:
+                event = self._evicted.popleft()
+                try:
+                    if self._spill_file is None:
+                        self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+                    self._spill_file.write(json.dumps(event, default=json_default) + "\n")
+                except OSError as e:
+                    logging.error(f"Failed to spill evicted {self.name} event: {e}")
+
+    def _slot_range(self):
+        count = self._count
+        return max(0, count - self.capacity), count
+
+    def __iter__(self):
+        """Lazily yields the retained events in insertion order without copying the buffer."""
+        first, count = self._slot_range()
+        for index in range(first, count):
+            entry = self._slots[index % self.capacity]
+            if entry is not None and entry[0] == index:
+                yield entry[1]
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.snapshot()[item]
+        while True:
+            first, count = self._slot_range()
+            index = count + item if item < 0 else first + item
+            if not first <= index < count:
+                raise IndexError("event index out of range")
+            entry = self._slots[index % self.capacity]
+            if entry[0] == index:
+                return entry[1]
+            # Overwritten since the range was read; look again relative to the new range.
+
+    @property
+    def ordered(self):
+        """
+        Whether the retained events are in timestamp order (events without a numeric timestamp
+        count as 0). Sources that log an event when it ends but stamp it with when it began, such
+        as mouse episodes, are not always.
+        """
+        return self._last_disorder <= self._slot_range()[0]
+
+    @property
+    def total(self):
+        """Number of events ever appended, including evicted ones."""
+        return self._count
+
+    def snapshot(self, since=None, limit=None):
+        """
+        Returns a list copy of the retained events.
+
+        Args:
+            since (int, optional): Only return events with ``seq`` greater than this.
+            limit (int, optional): Return at most this many events (the oldest ones first).
+        """
+        if since is None:
+            events = list(self)
+        else:
+            # Walk backwards from the newest event so the cost is proportional to the delta.
+            first, count = self._slot_range()
+            events = []
+            for index in range(count - 1, first - 1, -1):
+                entry = self._slots[index % self.capacity]
+                if entry is None or entry[0] != index:
+                    break
+                if entry[1]["seq"] <= since:
+                    break
+                events.append(entry[1])
+            events.reverse()
+        if limit is not None:
+            events = events[:limit]
+        return events
+
+    def close(self):
+        if self._evicted:
+            self._spill()
+        with self._spill_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+
+class EventStore:
+    """
+    Owns one EventLog per event source. All logs share a writer lock and a global
+    sequence counter, so sequence IDs are ordered across sources.
+    """
+
+    def __init__(self, capacity=5000, spill_dir=None):
+        """
+        Args:
+            capacity (int, optional): Ring buffer size of each source. Defaults to 5000.
+            spill_dir (str, optional): Directory evicted events are written to as
+                ``<source>.ndjson``. Evicted events are dropped when None. Defaults to None.
+        """
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.sources = {}
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._changed = threading.Condition()
+        self.listeners.append(self._notify)
+        if spill_dir and not os.path.exists(spill_dir):
+            os.makedirs(spill_dir)
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    @property
+    def last_seq(self):
+        """Highest sequence ID whose event is fully stored in its log."""
+        with self._lock:
+            return self._seq
+
+    def _notify(self, name, event):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for(self, after_seq, timeout=None):
+        """Blocks until an event newer than `after_seq` is stored. Returns False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._seq > after_seq, timeout)
+
+    def source(self, name):
+        """Returns the EventLog for a source, creating it on first use."""
+        log = self.sources.get(name)
+        if log is None:
+            with self._lock:
+                log = self.sources.get(name)
+                if log is None:
+                    spill_path = os.path.join(self.spill_dir, f"{name}.ndjson") if self.spill_dir else None
+                    log = EventLog(name, self.capacity, spill_path=spill_path,
+                                   lock=self._lock, sequence=self._next_seq,
+                                   listeners=self.listeners)
+                    self.sources[name] = log
+        return log
+
+    def restore(self, name, event):
+        """
+        Re-inserts a previously recorded event (e.g. from a journal) keeping its ``seq``, and
+        advances the global counter past it. Listeners are notified as for a new event.
+        """
+        log = self.source(name)
+        with self._lock:
+            seq = event.get("seq")
+            if not isinstance(seq, int):
+                seq = self._next_seq()
+                event["seq"] = seq
+            elif seq > self._seq:
+                self._seq = seq
+            log._store(event)
+        if log._evicted:
+            log._spill()
+        for listener in self.listeners:
+            listener(name, event)
+
+    def close(self):
+        for log in list(self.sources.values()):
+            log.close()
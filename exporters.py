@@ -0,0 +1,147 @@
+import csv
+import math
+from io import StringIO, BytesIO
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CSV_CHUNK_ROWS = 500
+
+
+def in_time_range(events, start=None, end=None):
+    """Lazily yields the events whose timestamp lies in [start, end]."""
+    for event in events:
+        timestamp = event.get("timestamp")
+        if start is not None and (timestamp is None or timestamp < start):
+            continue
+        if end is not None and (timestamp is None or timestamp > end):
+            continue
+        yield event
+
+
+def stream_csv(header, rows, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Yields CSV text in chunks of `chunk_rows` rows, so only one chunk is ever held in memory.
+
+    Args:
+        header (list): Column names written as the first row.
+        rows (iterable): Row sequences, consumed lazily.
+        chunk_rows (int, optional): Rows per yielded chunk. Defaults to CSV_CHUNK_ROWS.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _scalar(value):
+    # NumPy scalars (e.g. face landmark coordinates) are unwrapped to plain Python values.
+    return value.item() if hasattr(value, "item") else value
+
+
+def to_columns(records, exclude=()):
+    """
+    Converts (source, event) records into typed NumPy columns.
+
+    Numeric fields become float64 (NaN where missing), "seq" becomes int64 and every other
+    field is dictionary-encoded as int32 codes into a string table, which keeps repetitive
+    fields such as "event" compact. Returns (columns, dictionaries).
+    """
+    # One pass over the records, filling a value list per field (None-padded where missing).
+    fields = {}
+    numeric_fields = {}
+    count = 0
+    for source, event in records:
+        row = {"source": source}
+        for key, value in event.items():
+            if key in exclude:
+                continue
+            if isinstance(value, (tuple, list)) and len(value) == 2 and all(_is_number(v) for v in value):
+                # Coordinate pairs such as mouse positions become two numeric columns.
+                row[f"{key}_x"], row[f"{key}_y"] = value
+            else:
+                row[key] = _scalar(value)
+        for key, value in row.items():
+            values = fields.get(key)
+            if values is None:
+                values = fields[key] = [None] * count
+                numeric_fields[key] = True
+            values.append(value)
+            if value is not None and not _is_number(value):
+                numeric_fields[key] = False
+        count += 1
+        for values in fields.values():
+            if len(values) < count:
+                values.append(None)
+
+    columns = {}
+    dictionaries = {}
+    for key, values in fields.items():
+        numeric = numeric_fields[key]
+        if key == "seq":
+            columns[key] = np.array([v if v is not None else -1 for v in values], dtype=np.int64)
+        elif numeric:
+            columns[key] = np.array([math.nan if v is None else float(v) for v in values], dtype=np.float64)
+        else:
+            table = {}
+            codes = np.empty(len(values), dtype=np.int32)
+            for i, value in enumerate(values):
+                if value is None:
+                    codes[i] = -1
+                    continue
+                codes[i] = table.setdefault(str(value), len(table))
+            columns[key] = codes
+            dictionaries[key] = np.array(list(table), dtype=np.str_) if table else np.array([], dtype=np.str_)
+    return columns, dictionaries
+
+
+def columnar_export(records, fmt="npz", exclude=()):
+    """
+    Serializes (source, event) records in a typed columnar format.
+
+    Args:
+        records (iterable): (source, event) pairs.
+        fmt (str, optional): "arrow" for an Arrow IPC stream (requires pyarrow) or "npz" for a
+            NumPy archive where a dictionary-encoded column "x" has its strings in "x.dict".
+            Defaults to "npz"; "arrow" falls back to "npz" when pyarrow is not installed.
+        exclude (iterable, optional): Fields to leave out, e.g. large clipboard payloads.
+
+    Returns:
+        tuple: (payload bytes, mimetype, file extension)
+    """
+    columns, dictionaries = to_columns(records, exclude)
+    buffer = BytesIO()
+    if fmt == "arrow" and pa is not None:
+        arrays = {}
+        for key, column in columns.items():
+            if key in dictionaries:
+                indices = pa.array(column, mask=column < 0)
+                arrays[key] = pa.DictionaryArray.from_arrays(indices, pa.array(dictionaries[key].tolist(), pa.string()))
+            else:
+                arrays[key] = pa.array(column)
+        table = pa.table(arrays)
+        with pa.ipc.new_stream(buffer, table.schema) as writer:
+            writer.write_table(table)
+        return buffer.getvalue(), "application/vnd.apache.arrow.stream", "arrow"
+    payload = dict(columns)
+    payload.update({f"{key}.dict": values for key, values in dictionaries.items()})
+    np.savez_compressed(buffer, **payload)
+    return buffer.getvalue(), "application/octet-stream", "npz"
@@ -0,0 +1,378 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import ipaddress
+import subprocess
+from collections import namedtuple
+import metrics
+
+FIREWALL_APPLY_SECONDS = metrics.histogram("dragon_firewall_apply_seconds",
+                                           "Time to apply or remove the lockdown rule set, including rollback.")
+FIREWALL_ROLLBACKS = metrics.counter("dragon_firewall_rollbacks_total",
+                                     "Lockdown rule sets that failed to apply and were rolled back.")
+
+logger = logging.getLogger("FirewallBackends")
+
+# Name shared by every rule, chain or table the lockdown creates, so they can be found and removed
+# without touching anything else in the firewall.
+PREFIX = "DragonLockdown"
+NFT_TABLE = "dragon_lockdown"
+IPT_CHAINS = ("DRAGON_IN", "DRAGON_OUT")
+EMPTY_FILTER = "*filter\n:INPUT ACCEPT [0:0]\n:FORWARD ACCEPT [0:0]\n:OUTPUT ACCEPT [0:0]\nCOMMIT\n"
+
+RuleSet = namedtuple("RuleSet", ["allowed_programs", "allowed_addresses", "allowed_inbound_ports"])
+
+
+def ruleset(allowed_programs=(), allowed_addresses=(), allowed_inbound_ports=()):
+    """
+    The lockdown: block all traffic except loopback, replies to established connections,
+    outbound traffic of `allowed_programs` (Windows only) or to `allowed_addresses`, and inbound
+    TCP on `allowed_inbound_ports`.
+
+    Raises:
+        ValueError: If an address is not an IP address or network, or a port is out of range.
+    """
+    networks = tuple(str(ipaddress.ip_network(address, strict=False)) for address in allowed_addresses)
+    ports = tuple(int(port) for port in allowed_inbound_ports)
+    if any(not 0 < port < 65536 for port in ports):
+        raise ValueError(f"Invalid port in {allowed_inbound_ports!r}")
+    return RuleSet(tuple(allowed_programs), networks, ports)
+
+
+def _split(networks):
+    v4 = [network for network in networks if ipaddress.ip_network(network).version == 4]
+    v6 = [network for network in networks if ipaddress.ip_network(network).version == 6]
+    return v4, v6
+
+
+class FirewallError(RuntimeError):
+    """The firewall rejected the rule set, or its tool could not be run."""
+
+
+class BackendUnavailable(RuntimeError):
+    """No firewall backend can run on this machine."""
+
+
+class FirewallBackend:
+    """
+    Applies a lockdown RuleSet as one batch.
+
+    `render` turns the rule set into the batch the firewall tool reads, without running anything.
+    `apply` replaces whatever lockdown is in place with the rule set in one atomic step, or
+    restores the previous state and raises FirewallError. `remove` takes the lockdown out again,
+    leaving every rule the lockdown did not create as it was. Commands go through `run`, which
+    tests and benchmarks can replace. `last_seconds` is how long the last apply or remove took.
+    """
+
+    name = "base"
+
+    def __init__(self, run=None):
+        self.run = run or self._run
+        self.last_seconds = None
+        self._warned = False
+
+    @staticmethod
+    def _run(args, input_text=None):
+        try:
+            result = subprocess.run(args, input=input_text, capture_output=True, text=True)
+        except OSError as exc:
+            raise FirewallError(f"Cannot run {args[0]}: {exc}")
+        if result.returncode != 0:
+            raise FirewallError(f"{' '.join(args)} failed ({result.returncode}): "
+                                f"{(result.stderr or result.stdout).strip()}")
+        return result.stdout
+
+    def render(self, rules):
+        raise NotImplementedError
+
+    def _apply(self, rules):
+        raise NotImplementedError
+
+    def _remove(self):
+        raise NotImplementedError
+
+    def _addresses_only(self, rules):
+        if rules.allowed_programs and not self._warned:
+            self._warned = True
+            logger.warning("%s cannot match programs; only the allowed addresses are let out.", self.name)
+
+    def _timed(self, action, *args):
+        start = time.perf_counter()
+        try:
+            return action(*args)
+        finally:
+            self.last_seconds = time.perf_counter() - start
+            FIREWALL_APPLY_SECONDS.observe(self.last_seconds)
+
+    def apply(self, rules):
+        """
+        Raises:
+            FirewallError: If the rule set could not be applied; the firewall is as it was before.
+        """
+        self._timed(self._apply, rules)
+
+    def remove(self):
+        """
+        Raises:
+            FirewallError: If the lockdown could not be removed.
+        """
+        self._timed(self._remove)
+
+
+class NftablesBackend(FirewallBackend):
+    """
+    Linux backend on nftables: the lockdown is a table of its own, loaded with one `nft -f`.
+    nft applies a whole file as a single transaction, so a rejected rule set changes nothing, and
+    redefining the table in the same file swaps an old lockdown for a new one atomically.
+    """
+
+    name = "nftables"
+
+    def __init__(self, run=None, nft="nft"):
+        super().__init__(run)
+        self.nft = nft
+
+    def render(self, rules):
+        v4, v6 = _split(rules.allowed_addresses)
+        # ICMPv6 carries neighbour discovery; without it no IPv6 address on the link is reachable.
+        inbound = ["iif \"lo\" accept", "ct state established,related accept", "meta l4proto ipv6-icmp accept"]
+        if rules.allowed_inbound_ports:
+            inbound.append(f"tcp dport {{ {', '.join(map(str, rules.allowed_inbound_ports))} }} accept")
+        outbound = ["oif \"lo\" accept", "ct state established,related accept", "meta l4proto ipv6-icmp accept"]
+        if v4:
+            outbound.append(f"ip daddr {{ {', '.join(v4)} }} accept")
+        if v6:
+            outbound.append(f"ip6 daddr {{ {', '.join(v6)} }} accept")
+        lines = [
+            # Declaring, deleting and redefining the table makes the file apply whether or not a
+            # lockdown is already loaded.
+            f"table inet {NFT_TABLE}",
+            f"delete table inet {NFT_TABLE}",
+            f"table inet {NFT_TABLE} {{",
+            "    chain input {",
+            "        type filter hook input priority -10; policy drop;",
+            *(f"        {rule}" for rule in inbound),
+            "    }",
+            "    chain output {",
+            "        type filter hook output priority -10; policy drop;",
+            *(f"        {rule}" for rule in outbound),
+            "    }",
+            "}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def _apply(self, rules):
+        self._addresses_only(rules)
+        self.run([self.nft, "-f", "-"], self.render(rules))
+
+    def _remove(self):
+        self.run([self.nft, "-f", "-"], f"table inet {NFT_TABLE}\ndelete table inet {NFT_TABLE}\n")
+
+
+class IptablesBackend(FirewallBackend):
+    """
+    Linux backend on iptables-restore, for systems without nft. The filter table is saved, the
+    lockdown chains (and the jumps to them) are spliced into the saved rules, and the result is
+    restored in one commit per address family. If the IPv6 commit fails, the IPv4 table is
+    restored from the saved copy.
+    """
+
+    name = "iptables"
+
+    def __init__(self, run=None, save=("iptables-save", "ip6tables-save"),
+                 restore=("iptables-restore", "ip6tables-restore")):
+        super().__init__(run)
+        self.save = save
+        self.restore = restore
+
+    @staticmethod
+    def _strip(saved):
+        return [line for line in (saved or EMPTY_FILTER).splitlines()
+                if not any(chain in line for chain in IPT_CHAINS)]
+
+    def render(self, rules, saved=None, version=4):
+        """The filter table `saved` (iptables-save output) with the lockdown spliced in."""
+        v4, v6 = _split(rules.allowed_addresses)
+        lines = self._strip(saved)
+        ours_in = ["-A DRAGON_IN -i lo -j RETURN",
+                   "-A DRAGON_IN -m conntrack --ctstate ESTABLISHED,RELATED -j RETURN"]
+        ours_in += [f"-A DRAGON_IN -p tcp --dport {port} -j RETURN" for port in rules.allowed_inbound_ports]
+        ours_out = ["-A DRAGON_OUT -o lo -j RETURN",
+                    "-A DRAGON_OUT -m conntrack --ctstate ESTABLISHED,RELATED -j RETURN"]
+        if version == 6:
+            # Neighbour discovery, without which no IPv6 address on the link is reachable.
+            ours_in.append("-A DRAGON_IN -p ipv6-icmp -j RETURN")
+            ours_out.append("-A DRAGON_OUT -p ipv6-icmp -j RETURN")
+        ours_in.append("-A DRAGON_IN -j DROP")
+        ours_out += [f"-A DRAGON_OUT -d {network} -j RETURN" for network in (v4 if version == 4 else v6)]
+        ours_out.append("-A DRAGON_OUT -j DROP")
+        start = lines.index("*filter")
+        declarations = start + 1
+        while declarations < len(lines) and lines[declarations].startswith(":"):
+            declarations += 1
+        # The jumps go first in INPUT and OUTPUT, ahead of the rules already there.
+        lines[declarations:declarations] = [":DRAGON_IN - [0:0]", ":DRAGON_OUT - [0:0]",
+                                            "-A INPUT -j DRAGON_IN", "-A OUTPUT -j DRAGON_OUT"]
+        commit = lines.index("COMMIT", start)
+        lines[commit:commit] = ours_in + ours_out
+        return "\n".join(lines) + "\n"
+
+    def _saved(self):
+        return [self.run([save, "-t", "filter"]) for save in self.save]
+
+    def _restore_all(self, tables):
+        done = []
+        try:
+            for restore, table in zip(self.restore, tables):
+                self.run([restore], table)
+                done.append(restore)
+        except FirewallError:
+            if done:
+                FIREWALL_ROLLBACKS.inc()
+                for restore, table in zip(done, self._previous):
+                    try:
+                        self.run([restore], table or EMPTY_FILTER)
+                    except FirewallError as exc:
+                        logger.error("Rollback with %s failed: %s", restore, exc)
+            raise
+
+    def _apply(self, rules):
+        self._addresses_only(rules)
+        self._previous = self._saved()
+        self._restore_all([self.render(rules, saved, version)
+                           for saved, version in zip(self._previous, (4, 6))])
+
+    def _remove(self):
+        self._previous = self._saved()
+        self._restore_all(["\n".join(self._strip(saved)) + "\n" for saved in self._previous])
+
+
+class NetshBackend(FirewallBackend):
+    """
+    Windows backend: the firewall configuration is exported, then every command of the lockdown
+    runs from one `netsh -f` batch file. netsh has no transactions, so a failed batch is rolled
+    back by importing the export, and so is a removal: the firewall returns to exactly what it was
+    before the lockdown instead of being reset to its defaults.
+    """
+
+    name = "netsh"
+
+    def __init__(self, run=None, state_dir=None, netsh="netsh"):
+        super().__init__(run)
+        self.netsh = netsh
+        self.state_dir = state_dir or tempfile.gettempdir()
+        self.snapshot = os.path.join(self.state_dir, "dragon-firewall-before-lockdown.wfw")
+
+    def render(self, rules):
+        lines = [
+            # Every lockdown rule has the same name, so one delete clears those of an earlier
+            # lockdown, if the app stopped without removing them.
+            f'advfirewall firewall delete rule name="{PREFIX}"',
+            "advfirewall set allprofiles firewallpolicy blockinbound,blockoutbound",
+        ]
+        for program in rules.allowed_programs:
+            lines.append(f'advfirewall firewall add rule name="{PREFIX}" dir=out action=allow program="{program}"')
+        if rules.allowed_addresses:
+            lines.append(f'advfirewall firewall add rule name="{PREFIX}" dir=out action=allow '
+                         f'remoteip={",".join(rules.allowed_addresses)}')
+        if rules.allowed_inbound_ports:
+            lines.append(f'advfirewall firewall add rule name="{PREFIX}" dir=in action=allow protocol=TCP '
+                         f'localport={",".join(map(str, rules.allowed_inbound_ports))}')
+        return "\n".join(lines) + "\n"
+
+    def _batch(self, text):
+        fd, path = tempfile.mkstemp(prefix="dragon-lockdown-", suffix=".netsh")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(text)
+            output = self.run([self.netsh, "-f", path])
+        finally:
+            os.unlink(path)
+        # netsh -f carries on after a failed command; its output is the only sign of one.
+        failed = [line for line in output.splitlines()
+                  if line.strip() and line.strip() != "Ok." and "No rules match" not in line]
+        if failed:
+            raise FirewallError("netsh batch failed: " + " / ".join(failed[:3]))
+
+    def _apply(self, rules):
+        # An existing snapshot predates a lockdown still in place; it is the state to return to.
+        if not os.path.exists(self.snapshot):
+            self.run([self.netsh, "advfirewall", "export", self.snapshot])
+        try:
+            self._batch(self.render(rules))
+        except FirewallError:
+            FIREWALL_ROLLBACKS.inc()
+            self._restore()
+            raise
+
+    def _restore(self):
+        self.run([self.netsh, "advfirewall", "import", self.snapshot])
+        os.unlink(self.snapshot)
+
+    def _remove(self):
+        if os.path.exists(self.snapshot):
+            self._restore()
+        else:
+            # No record of the earlier state: drop the lockdown rules and go back to the defaults.
+            self._batch(f'advfirewall firewall delete rule name="{PREFIX}"\n'
+                        "advfirewall set allprofiles firewallpolicy blockinbound,allowoutbound\n")
+
+
+class DryRunBackend(FirewallBackend):
+    """
+    Renders with another backend's `render` and records the batches instead of running them:
+    `active` is the batch in force (None without a lockdown) and `history` every one applied.
+    With `fail` set, applying raises FirewallError and leaves `active` as it was.
+    """
+
+    name = "dry-run"
+
+    def __init__(self, renderer=None, fail=False):
+        super().__init__()
+        self.renderer = renderer or NftablesBackend()
+        self.fail = fail
+        self.active = None
+        self.history = []
+
+    def render(self, rules):
+        return self.renderer.render(rules)
+
+    def _apply(self, rules):
+        batch = self.render(rules)
+        if self.fail:
+            FIREWALL_ROLLBACKS.inc()
+            raise FirewallError("dry run set to fail")
+        self.active = batch
+        self.history.append(batch)
+
+    def _remove(self):
+        self.active = None
+
+
+def make_backend(name="auto", state_dir=None):
+    """
+    Picks a firewall backend.
+
+    Args:
+        name (str, optional): "nftables", "iptables", "netsh", "dry-run" or "auto", which picks netsh
+            on Windows and nft, or else iptables-restore, on Linux. Defaults to "auto".
+        state_dir (str, optional): Where netsh keeps the pre-lockdown export. Defaults to the temp dir.
+
+    Returns:
+        FirewallBackend: The backend.
+
+    Raises:
+        BackendUnavailable: If no requested backend can run here.
+    """
+    if name == "dry-run":
+        return DryRunBackend()
+    if name == "netsh" or (name == "auto" and sys.platform == "win32"):
+        return NetshBackend(state_dir=state_dir)
+    if name in ("nftables", "auto") and shutil.which("nft"):
+        return NftablesBackend()
+    if name in ("iptables", "auto") and shutil.which("iptables-restore"):
+        return IptablesBackend()
+    raise BackendUnavailable(f"No firewall backend {name!r} on this machine")
@@ -0,0 +1,119 @@
+import time
+import logging
+import threading
+
+
+class FrameBroadcaster:
+    """
+    Shares one camera pipeline between any number of MJPEG viewers.
+
+    A single capture thread drives the frame generator (capture, detection, JPEG encoding) and
+    publishes the latest chunk; every viewer sends whichever frame is newest when it is ready, so
+    a slow viewer skips frames instead of holding back the camera or the other viewers. The
+    capture stops `idle_timeout` seconds after the last viewer leaves.
+    """
+
+    def __init__(self, frames, on_stop=None, idle_timeout=5.0):
+        """
+        Args:
+            frames (callable): Returns an iterator of ready-to-send multipart chunks, e.g.
+                face_detector.gen_frames.
+            on_stop (callable, optional): Called on the capture thread once it stops, e.g. to
+                release the camera.
+            idle_timeout (float, optional): Seconds without viewers before capture stops. Defaults to 5.
+        """
+        self.frames = frames
+        self.on_stop = on_stop
+        self.idle_timeout = idle_timeout
+        self.frame = None
+        self.index = 0
+        self.viewers = 0
+        self.listeners = []
+        self._thread = None
+        self._cond = threading.Condition()
+        self.logger = logging.getLogger("FrameBroadcaster")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def attach(self):
+        """Registers a viewer, starting the capture thread if it is not running."""
+        with self._cond:
+            self.viewers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def detach(self):
+        with self._cond:
+            self.viewers -= 1
+            self._cond.notify_all()
+
+    def latest(self, after=0):
+        """Returns (index, frame) of the newest frame, or (after, None) if none is newer than `after`."""
+        with self._cond:
+            if self.index > after:
+                return self.index, self.frame
+            return after, None
+
+    def stream(self):
+        """Blocking generator of frames for a thread-per-connection server."""
+        self.attach()
+        try:
+            index = 0
+            while True:
+                with self._cond:
+                    if self.index <= index:
+                        self._cond.wait(timeout=self.idle_timeout)
+                    if self.index <= index:
+                        if self._thread is None:
+                            return  # The camera stopped or could not be opened.
+                        continue
+                    index, frame = self.index, self.frame
+                yield frame
+        finally:
+            self.detach()
+
+    def _run(self):
+        self.logger.info("Capture started.")
+        frames = self.frames()
+        idle_since = None
+        stopped_idle = False
+        try:
+            for frame in frames:
+                with self._cond:
+                    self.frame = frame
+                    self.index += 1
+                    self._cond.notify_all()
+                    viewers = self.viewers
+                for listener in self.listeners:
+                    listener()
+                if viewers > 0:
+                    idle_since = None
+                elif idle_since is None:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since >= self.idle_timeout:
+                    stopped_idle = True
+                    break
+        finally:
+            if hasattr(frames, "close"):
+                frames.close()
+            if self.on_stop is not None:
+                self.on_stop()
+            with self._cond:
+                self._thread = None
+                if stopped_idle and self.viewers > 0:
+                    # A viewer arrived while the idle capture was shutting down.
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+            for listener in self.listeners:
+                listener()
+            self.logger.info("Capture stopped.")
@@ -0,0 +1,100 @@
+import threading
+from io import BytesIO
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from downsample import minmax_downsample
+
+
+class GraphRenderer:
+    """
+    Renders event graphs as PNG through Matplotlib's object-oriented API on an Agg canvas, so
+    no pyplot global state is touched and concurrent requests are safe. PNGs are cached in an
+    LRU keyed by (event type, event-log version, size), and series longer than `max_points`
+    are min/max-downsampled so render time stays flat as the session grows.
+    """
+
+    def __init__(self, max_points=2000, cache_size=64):
+        self.max_points = max_points
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, event_type, events, version, size=(8, 4), dpi=100):
+        """
+        Returns the PNG bytes of the graph, or None when no event has a timestamp.
+
+        Args:
+            event_type (str): Source name, used in the title and the cache key.
+            events (iterable): The source's event dicts.
+            version: Anything that changes whenever `events` changes, e.g. the log's last seq.
+            size (tuple, optional): Figure size in inches. Defaults to (8, 4).
+            dpi (int, optional): Output resolution. Defaults to 100.
+        """
+        key = (event_type, version, size, dpi)
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+
+        png = self._draw(event_type, events, size, dpi)
+        if png is None:
+            return None
+        with self._lock:
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return png
+
+    def stats(self):
+        """Cached PNGs, the bytes they hold, and cache hits and misses so far."""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "bytes": sum(len(png) for png in self._cache.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _draw(self, event_type, events, size, dpi):
+        times = []
+        values = []
+        has_risk = False
+        for event in events:
+            t = event.get('timestamp')
+            if t is not None:
+                times.append(t)
+                # For events carrying a risk, use it; otherwise, default to 1.
+                has_risk = has_risk or 'risk' in event
+                values.append(event.get('risk', 1))
+        if not times:
+            return None
+        # Mouse episodes are logged when they close but stamped with their start, so the log is not
+        # always in time order.
+        times = np.asarray(times, dtype=np.float64)
+        order = np.argsort(times, kind="stable")
+        times, values = minmax_downsample(times[order], np.asarray(values, dtype=np.float64)[order],
+                                          self.max_points)
+
+        fig = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        ax.plot(times, values, marker='o', linestyle='-', color='cyan')
+        ax.set_xlabel('Timestamp')
+        ax.set_ylabel('Risk Value' if has_risk else 'Event Count')
+        ax.set_title(f'{event_type.capitalize()} Events Graph')
+        ax.grid(True)
+        fig.tight_layout()
+
+        buf = BytesIO()
+        fig.savefig(buf, format='png')
+        return buf.getvalue()
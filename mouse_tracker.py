@@ -1,113 +1,311 @@
-import time
-import math
-import logging
-from pynput import mouse
-
-class MouseBehaviorTracker:
-    def __init__(self, speed_threshold=1500, angle_threshold=90, callback=None):
-        self.speed_threshold = speed_threshold
-        self.angle_threshold = angle_threshold
-        self.callback = callback
-        self.event_log = []
-        self.prev_time = None
-        self.prev_pos = None
-        self.prev_direction = None
-        self.logger = logging.getLogger("MouseBehaviorTracker")
-        self.logger.setLevel(logging.DEBUG)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-
-    def on_move(self, x, y):
-        current_time = time.time()
-        if self.prev_pos is not None:
-            dt = current_time - self.prev_time
-            dx = x - self.prev_pos[0]
-            dy = y - self.prev_pos[1]
-            distance = math.sqrt(dx ** 2 + dy ** 2)
-            if dt > 0:
-                speed = distance / dt
-                if speed > self.speed_threshold:
-                    event = {
-                        "timestamp": current_time,
-                        "event": "High speed",
-                        "speed": speed,
-                        "position": (x, y)
-                    }
-                    self.event_log.append(event)
-                    self.logger.warning("High speed detected: %.2f px/sec", speed)
-                    if self.callback:
-                        self.callback(event)
-            current_direction = math.degrees(math.atan2(dy, dx)) if distance > 0 else None
-            if self.prev_direction is not None and current_direction is not None:
-                angle_diff = abs(current_direction - self.prev_direction)
-                if angle_diff > 180:
-                    angle_diff = 360 - angle_diff
-                if angle_diff > self.angle_threshold:
-                    event = {
-                        "timestamp": current_time,
-                        "event": "Abrupt direction change",
-                        "angle_diff": angle_diff,
-                        "position": (x, y)
-                    }
-                    self.event_log.append(event)
-                    self.logger.warning("Abrupt direction change: %.2f°", angle_diff)
-                    if self.callback:
-                        self.callback(event)
-            if current_direction is not None:
-                self.prev_direction = current_direction
-        self.prev_time = current_time
-        self.prev_pos = (x, y)
-
-    def on_click(self, x, y, button, pressed):
-        if pressed:
-            current_time = time.time()
-            event = {
-                "timestamp": current_time,
-                "event": f"Mouse click {button}",
-                "position": (x, y)
-            }
-            self.event_log.append(event)
-            self.logger.info("Mouse click detected: %s", button)
-            if self.callback:
-                self.callback(event)
-
-    def on_scroll(self, x, y, dx, dy):
-        current_time = time.time()
-        event = {
-            "timestamp": current_time,
-            "event": "Mouse scroll",
-            "dx": dx,
-            "dy": dy,
-            "position": (x, y)
-        }
-        self.event_log.append(event)
-        self.logger.info("Mouse scroll detected")
-        if self.callback:
-            self.callback(event)
-
-    def start(self):
-        self.listener = mouse.Listener(
-            on_move=self.on_move,
-            on_click=self.on_click,
-            on_scroll=self.on_scroll
-        )
-        self.listener.start()
-        self.logger.info("MouseBehaviorTracker started.")
-
-    def stop(self):
-        self.listener.stop()
-        self.logger.info("MouseBehaviorTracker stopped.")
-
-if __name__ == '__main__':
-    def sample_event_handler(event):
-        print(event)
-    tracker = MouseBehaviorTracker(callback=sample_event_handler)
-    tracker.start()
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        tracker.stop()
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+from pynput import mouse
+from event_store import EventLog
+
+# Quick flicks across the screen are normal; only erratic movement sustained for at least
+# ERRATIC_MIN_SECONDS scores, ERRATIC_RISK_PER_SEC for every full second the episode lasts.
+ERRATIC_MIN_SECONDS = 1.0
+ERRATIC_RISK_PER_SEC = 5
+
+class MouseBehaviorTracker:
+    """
+    Detects high-speed pointer movement and abrupt direction changes.
+
+    `on_move` runs on the input hook thread for every pointer sample, so it only writes (t, x, y)
+    into a preallocated NumPy ring buffer. A worker thread analyzes the new samples every
+    `batch_interval` seconds: speed, direction change, jerk and curvature are computed for the
+    whole batch at once, off the hook thread. If the worker falls more than `buffer_size` samples
+    behind, the oldest unread samples are counted in `dropped` and skipped.
+
+    Detections are coalesced into episodes rather than recorded one event per sample: flagged
+    samples (and scroll ticks) less than `episode_gap` seconds apart extend the same episode,
+    which is recorded once it goes quiet with its start, end, sample count, peaks and bounding
+    box. Sustained movement episodes carry risk, summed in `risk_score`.
+
+    When a `trajectory` (trajectory.Trajectory) is given, every analyzed batch is also appended to
+    it, so the full pointer path can be audited or replayed later. A `recorder`
+    (session_recorder.SessionRecorder) receives each batch as analyzed, with its scroll ticks.
+    """
+
+    def __init__(self, speed_threshold=1500, angle_threshold=90, callback=None, event_log=None,
+                 buffer_size=8192, batch_interval=0.05, episode_gap=0.5, speed_window=0.02, trajectory=None,
+                 clock=time.time):
+        self.speed_threshold = speed_threshold
+        self.angle_threshold = angle_threshold
+        self.callback = callback
+        self.event_log = event_log if event_log is not None else EventLog("mouse")
+        self.buffer_size = buffer_size
+        self.batch_interval = batch_interval
+        self.episode_gap = episode_gap
+        self.speed_window = speed_window
+        self.trajectory = trajectory
+        self.recorder = None
+        self.clock = clock
+        self.risk_score = 0
+        self._samples = np.empty((buffer_size, 3))
+        # Flat float64 view of the same memory: a memoryview store is several times cheaper on the
+        # hook thread than NumPy's item assignment, and the worker still reads the NumPy array.
+        self._slots = memoryview(self._samples).cast("B").cast("d")
+        self._written = 0
+        self._read = 0
+        # Last samples of the previous batch, so derivatives continue across batch boundaries.
+        self._context = self._samples[:0].copy()
+        self.prev_direction = None
+        self.move_calls = 0
+        self.dropped = 0
+        self._scrolls = deque()
+        self._episodes = {}
+        self._stop = threading.Event()
+        self._worker = None
+        self.logger = logging.getLogger("MouseBehaviorTracker")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    def on_move(self, x, y):
+        # A plain attribute rather than a metrics.Counter: this runs for every pointer sample on
+        # the listener thread alone, and /metrics reads it at scrape time.
+        self.move_calls += 1
+        # Single writer: the slot is filled before the count that publishes it to the worker.
+        i = self._written % self.buffer_size * 3
+        slots = self._slots
+        slots[i] = self.clock()
+        slots[i + 1] = x
+        slots[i + 2] = y
+        self._written += 1
+
+    def process_pending(self):
+        """Analyzes the samples appended since the last call and returns how many were analyzed."""
+        written = self._written
+        start = max(self._read, written - self.buffer_size)
+        reset = False
+        if start == written:
+            # No new samples, but scroll ticks may have arrived and open episodes may have gone quiet.
+            batch = np.empty((0, 3))
+        else:
+            batch = self._samples[np.arange(start, written) % self.buffer_size]
+            # Slots the hook thread overwrote while they were being copied are no longer this batch's.
+            overwritten = self._written - self.buffer_size - start
+            if overwritten > 0:
+                batch = batch[overwritten:]
+                start += overwritten
+            reset = start > self._read
+            if reset:
+                self.dropped += start - self._read
+                self.logger.warning("Mouse analysis fell behind; %d samples dropped", start - self._read)
+            self._read = written
+        scrolls = []
+        while self._scrolls:
+            scrolls.append(self._scrolls.popleft())
+        now = self.clock()
+        if self.recorder is not None and (len(batch) or scrolls or reset):
+            self.recorder.mouse(batch, scrolls, reset, now)
+        if len(batch) and self.trajectory is not None:
+            self.trajectory.append(batch)
+        self.feed(batch, scrolls, reset, now)
+        return len(batch)
+
+    def feed(self, samples, scrolls=(), reset=False, now=None):
+        """
+        Analyzes an (n, 3) array of (t, x, y) rows directly instead of the ring buffer, e.g. a
+        recorded trajectory being replayed, and closes the episodes quiet by `now`, or by its last
+        timestamp.
+
+        Args:
+            samples (np.ndarray): (t, x, y) rows.
+            scrolls (iterable, optional): (t, x, y, dx, dy) scroll ticks that arrived with them.
+            reset (bool, optional): Samples were dropped before these; derivatives restart.
+            now (float, optional): Current time. Defaults to the last sample's.
+        """
+        if reset:
+            self._context = self._context[:0]
+            self.prev_direction = None
+        if len(samples):
+            self._analyze(samples)
+        for t, x, y, dx, dy in scrolls:
+            self._observe("Mouse scroll", t, x, y, sums={"dx": dx, "dy": dy})
+        if now is None:
+            if not len(samples):
+                return
+            now = samples[-1, 0]
+        self._close_quiet(now)
+
+    def _analyze(self, batch):
+        context = len(self._context)
+        samples = np.concatenate((self._context, batch))
+        # Keep what the next batch looks back to: speed_window seconds of samples and three for jerk.
+        keep = min(np.searchsorted(samples[:, 0], samples[-1, 0] - self.speed_window) - 1, len(samples) - 3)
+        self._context = samples[max(keep, 0):].copy()
+        if len(samples) < 2:
+            return
+        t, x, y = samples[:, 0], samples[:, 1], samples[:, 2]
+
+        # Segment j runs from sample j to sample j + 1.
+        dt = np.diff(t)
+        dx = np.diff(x)
+        dy = np.diff(y)
+        distance = np.hypot(dx, dy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moving = dt > 0
+            # Speed is measured back to the last sample at least speed_window seconds earlier: over
+            # a single jittery sample interval, a 1 px step can read as thousands of px/sec.
+            back = np.minimum(np.searchsorted(t, t - self.speed_window, side="right") - 1,
+                              np.arange(len(t)) - 1)
+            span = t - t[back]
+            speed = np.where((back >= 0) & (span > 0),
+                             np.hypot(x - x[back], y - y[back]) / np.where(span > 0, span, 1), np.nan)
+            vx = np.where(moving, dx / dt, np.nan)
+            vy = np.where(moving, dy / dt, np.nan)
+            # Acceleration at the sample shared by consecutive segments, jerk between those.
+            segment_mid = (t[1:] + t[:-1]) / 2
+            ax = np.diff(vx) / np.diff(segment_mid)
+            ay = np.diff(vy) / np.diff(segment_mid)
+            jerk = np.full(len(t), np.nan)
+            if len(ax) > 1:
+                jerk[2:-1] = np.hypot(np.diff(ax), np.diff(ay)) / np.diff(t[1:-1])
+            # Curvature |v x a| / |v|^3 at the shared sample, from the mean of both segment velocities.
+            mvx = (vx[1:] + vx[:-1]) / 2
+            mvy = (vy[1:] + vy[:-1]) / 2
+            curvature = np.full(len(t), np.nan)
+            curvature[1:-1] = np.abs(mvx * ay - mvy * ax) / np.hypot(mvx, mvy) ** 3
+
+        found = []
+        new_segments = np.arange(len(dt)) + 1 >= context
+        new_samples = np.arange(len(t)) >= max(context, 1)
+        for i in np.flatnonzero(new_samples & (speed > self.speed_threshold)):
+            found.append((i, "high_speed", {"peak_speed": float(speed[i])}))
+
+        # A direction change compares each new segment with the previous segment that moved.
+        heading = np.where(distance > 0, np.degrees(np.arctan2(dy, dx)), np.nan)
+        valid = np.flatnonzero(new_segments & ~np.isnan(heading))
+        headings = heading[valid]
+        if len(headings):
+            previous = np.concatenate(([self.prev_direction], headings[:-1])) \
+                if self.prev_direction is not None else headings[:-1]
+            compared = valid if self.prev_direction is not None else valid[1:]
+            turn = np.abs(headings[len(headings) - len(previous):] - previous)
+            turn = np.where(turn > 180, 360 - turn, turn)
+            for j, angle in zip(compared[turn > self.angle_threshold], turn[turn > self.angle_threshold]):
+                found.append((j + 1, "direction_changes", {"max_angle": float(angle)}))
+            self.prev_direction = float(headings[-1])
+
+        # A sample can be both fast and turning; it counts once in its episode.
+        flagged = {}
+        for index, kind, fields in found:
+            maxima, sums = flagged.setdefault(index, ({}, {}))
+            maxima.update(fields)
+            sums[kind] = 1
+        for index in sorted(flagged):
+            maxima, sums = flagged[index]
+            for key, values in (("peak_jerk", jerk), ("max_curvature", curvature)):
+                if np.isfinite(values[index]):
+                    maxima[key] = float(values[index])
+            self._observe("Movement episode", float(t[index]), int(x[index]), int(y[index]), maxima, sums)
+
+    def _observe(self, kind, t, x, y, maxima=None, sums=None):
+        """Adds one detection to the open episode of `kind`, first closing that episode if it went quiet."""
+        episode = self._episodes.get(kind)
+        if episode is not None and t - episode["end"] > self.episode_gap:
+            self._close(kind)
+            episode = None
+        if episode is None:
+            episode = self._episodes[kind] = {"timestamp": t, "end": t, "event": kind, "samples": 0,
+                                              "bbox": [x, y, x, y]}
+        episode["end"] = t
+        episode["samples"] += 1
+        bbox = episode["bbox"]
+        bbox[0], bbox[1] = min(bbox[0], x), min(bbox[1], y)
+        bbox[2], bbox[3] = max(bbox[2], x), max(bbox[3], y)
+        for key, value in (maxima or {}).items():
+            episode[key] = max(episode.get(key, value), value)
+        for key, value in (sums or {}).items():
+            episode[key] = episode.get(key, 0) + value
+
+    def _close_quiet(self, now):
+        quiet = [kind for kind, episode in self._episodes.items() if now - episode["end"] > self.episode_gap]
+        for kind in sorted(quiet, key=lambda kind: self._episodes[kind]["timestamp"]):
+            self._close(kind)
+
+    def flush(self):
+        """Records every open episode now, e.g. when the tracker stops."""
+        for kind in sorted(self._episodes, key=lambda kind: self._episodes[kind]["timestamp"]):
+            self._close(kind)
+
+    def _close(self, kind):
+        event = self._episodes.pop(kind)
+        event["duration"] = event["end"] - event["timestamp"]
+        event["bbox"] = tuple(event["bbox"])
+        if kind == "Movement episode":
+            risk = 0
+            if event["duration"] >= ERRATIC_MIN_SECONDS:
+                risk = int(event["duration"]) * ERRATIC_RISK_PER_SEC
+            self.risk_score += risk
+            event["risk"] = risk
+            self.logger.warning("Movement episode: %.2f s, %d samples, peak %.0f px/sec, max turn %.0f°; risk +%d",
+                                event["duration"], event["samples"], event.get("peak_speed", 0),
+                                event.get("max_angle", 0), risk)
+        else:
+            self.logger.info("Mouse scroll: %d ticks over %.2f s", event["samples"], event["duration"])
+        self.event_log.append(event)
+        if self.callback:
+            self.callback(event)
+
+    def _run(self):
+        while not self._stop.wait(self.batch_interval):
+            self.process_pending()
+        self.process_pending()
+        self.flush()
+
+    def on_click(self, x, y, button, pressed):
+        if pressed:
+            current_time = time.time()
+            event = {
+                "timestamp": current_time,
+                "event": f"Mouse click {button}",
+                "position": (x, y)
+            }
+            self.event_log.append(event)
+            self.logger.info("Mouse click detected: %s", button)
+            if self.callback:
+                self.callback(event)
+
+    def on_scroll(self, x, y, dx, dy):
+        # Every wheel tick arrives here; the worker coalesces them into scroll episodes.
+        self._scrolls.append((self.clock(), x, y, dx, dy))
+
+    def start(self):
+        self.listener = mouse.Listener(
+            on_move=self.on_move,
+            on_click=self.on_click,
+            on_scroll=self.on_scroll
+        )
+        self.listener.start()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="mouse-analysis", daemon=True)
+        self._worker.start()
+        self.logger.info("MouseBehaviorTracker started.")
+
+    def stop(self):
+        self.listener.stop()
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+        self.logger.info("MouseBehaviorTracker stopped.")
+
+if __name__ == '__main__':
+    def sample_event_handler(event):
+        print(event)
+    tracker = MouseBehaviorTracker(callback=sample_event_handler)
+    tracker.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        tracker.stop()
@@ -1,49 +1,63 @@
-import subprocess
-import logging
-
-class NetworkLockdown:
-    def __init__(self, allowed_exe):
-        self.allowed_exe = allowed_exe  # Full path to the allowed exam browser, e.g., "C:\\Program Files\\ExamBrowser\\exam.exe"
-        self.active = False
-        self.logger = logging.getLogger("NetworkLockdown")
-        self.logger.setLevel(logging.DEBUG)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-
-    def activate(self):
-        try:
-            # Method 1: Set global outbound policy to block for all profiles
-            subprocess.run('netsh advfirewall set allprofiles firewallpolicy blockinbound,blockoutbound', shell=True, check=True)
-            self.logger.info("Global outbound policy set to block.")
-        except Exception as e:
-            self.logger.error("Error setting global firewall policy: %s", e)
-        try:
-            # Remove any pre-existing block rule (if exists)
-            subprocess.run('netsh advfirewall firewall delete rule name="BlockAllOutbound"', shell=True)
-        except Exception as e:
-            self.logger.warning("No existing BlockAllOutbound rule to delete: %s", e)
-        try:
-            # Method 2: Explicitly add a rule to block all outbound traffic
-            subprocess.run('netsh advfirewall firewall add rule name="BlockAllOutbound" dir=out action=block', shell=True, check=True)
-            self.logger.info("Explicit outbound block rule added.")
-        except Exception as e:
-            self.logger.error("Error adding outbound block rule: %s", e)
-        try:
-            # Add an exception rule for the allowed exam application
-            subprocess.run(f'netsh advfirewall firewall add rule name="AllowExam" dir=out action=allow program="{self.allowed_exe}"', shell=True, check=True)
-            self.logger.info("Allowed rule for exam browser added.")
-            self.active = True
-        except Exception as e:
-            self.logger.error("Error adding allowed rule: %s", e)
-
-    def deactivate(self):
-        try:
-            # Reset the firewall to its default settings
-            subprocess.run('netsh advfirewall reset', shell=True, check=True)
-            self.logger.info("Network lockdown deactivated and firewall reset to default.")
-            self.active = False
-        except Exception as e:
-            self.logger.error("Failed to deactivate network lockdown: %s", e)
+import os
+import logging
+from firewall_backends import BackendUnavailable, FirewallError, make_backend, ruleset
+
+class NetworkLockdown:
+    def __init__(self, allowed_exe, backend=None, allowed_addresses=(), allowed_inbound_ports=()):
+        """
+        Args:
+            allowed_exe (str): Full path to the allowed exam browser, e.g. "C:\\Program Files\\ExamBrowser\\exam.exe".
+            backend (FirewallBackend, optional): Applies the rules; by default `make_backend` picks
+                one on first use, from DRAGON_FIREWALL_BACKEND ("auto", "nftables", "iptables",
+                "netsh" or "dry-run").
+            allowed_addresses (iterable, optional): IP addresses or networks the exam may reach,
+                e.g. the exam server. Needed on Linux, where rules cannot name a program.
+            allowed_inbound_ports (iterable, optional): TCP ports left open inbound, e.g. the dashboard's.
+        """
+        self.allowed_exe = allowed_exe
+        self.backend = backend
+        self.rules = ruleset(allowed_programs=[allowed_exe] if allowed_exe else [],
+                             allowed_addresses=allowed_addresses, allowed_inbound_ports=allowed_inbound_ports)
+        self.active = False
+        self.logger = logging.getLogger("NetworkLockdown")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    def allow_inbound(self, *ports):
+        """Leaves more TCP ports open inbound; takes effect the next time the lockdown is applied."""
+        rules = self.rules
+        self.rules = ruleset(rules.allowed_programs, rules.allowed_addresses,
+                             tuple(dict.fromkeys(rules.allowed_inbound_ports + tuple(ports))))
+
+    def _backend(self):
+        if self.backend is None:
+            self.backend = make_backend(os.environ.get("DRAGON_FIREWALL_BACKEND", "auto"))
+        return self.backend
+
+    def activate(self):
+        """Applies the lockdown in one batch; returns whether it is in place."""
+        try:
+            backend = self._backend()
+            backend.apply(self.rules)
+        except (BackendUnavailable, FirewallError) as e:
+            self.logger.error("Network lockdown not applied, firewall left unchanged: %s", e)
+            return False
+        self.active = True
+        self.logger.info("Network lockdown activated with %s in %.1f ms.", backend.name, backend.last_seconds * 1e3)
+        return True
+
+    def deactivate(self):
+        """Removes the lockdown rules, leaving the rest of the firewall as it was."""
+        try:
+            backend = self._backend()
+            backend.remove()
+        except (BackendUnavailable, FirewallError) as e:
+            self.logger.error("Failed to deactivate network lockdown: %s", e)
+            return False
+        self.active = False
+        self.logger.info("Network lockdown deactivated with %s in %.1f ms.", backend.name, backend.last_seconds * 1e3)
+        return True
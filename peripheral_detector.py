@@ -1,95 +1,153 @@
-import time
-import threading
-import logging
-import wmi
-import win32api
-import pythoncom
-
-class PeripheralDetector:
-    def __init__(self, callback=None):
-        self.callback = callback  # Callback function when an event is detected
-        self.event_log = []       # List to store peripheral events
-        self.running = False
-        self.risk_score = 0       # Cumulative risk score for peripheral detection
-        self.last_monitor_count = 0  # Track previous monitor count
-        self.logger = logging.getLogger("PeripheralDetector")
-        self.logger.setLevel(logging.DEBUG)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-
-    def monitor_pnp(self):
-        # Initialize COM for this thread.
-        pythoncom.CoInitialize()
-        c = wmi.WMI()
-        watcher = c.watch_for(notification_type="Creation", wmi_class="Win32_PnPEntity")
-        while self.running:
-            try:
-                event = watcher(timeout_ms=5000)
-                if event:
-                    risk_inc = 35
-                    self.risk_score += risk_inc
-                    log_entry = {
-                        "timestamp": time.time(),
-                        "device": event.Caption,
-                        "risk": risk_inc
-                    }
-                    self.event_log.append(log_entry)
-                    self.logger.info("New peripheral detected: %s; risk increased by %d", event.Caption, risk_inc)
-                    if self.callback:
-                        self.callback(log_entry)
-            except wmi.x_wmi_timed_out:
-                continue
-            except Exception as e:
-                self.logger.error("Error in monitor_pnp: %s", e)
-                time.sleep(1)
-        pythoncom.CoUninitialize()
-
-    def monitor_monitors(self):
-        while self.running:
-            try:
-                monitors = win32api.EnumDisplayMonitors()
-                count = len(monitors)
-                if count != self.last_monitor_count:
-                    if count > 1:
-                        risk_inc = 35
-                        self.risk_score += risk_inc
-                        log_entry = {
-                            "timestamp": time.time(),
-                            "device": f"Multiple monitors detected: {count}",
-                            "risk": risk_inc
-                        }
-                        self.event_log.append(log_entry)
-                        self.logger.info("Multiple monitors detected (%d monitors); risk increased by %d", count, risk_inc)
-                        if self.callback:
-                            self.callback(log_entry)
-                    self.last_monitor_count = count
-            except Exception as e:
-                self.logger.error("Error checking monitors: %s", e)
-            time.sleep(5)
-
-    def start(self):
-        self.running = True
-        self.thread_pnp = threading.Thread(target=self.monitor_pnp, daemon=True)
-        self.thread_monitors = threading.Thread(target=self.monitor_monitors, daemon=True)
-        self.thread_pnp.start()
-        self.thread_monitors.start()
-        self.logger.info("PeripheralDetector started.")
-
-    def stop(self):
-        self.running = False
-        self.thread_pnp.join()
-        self.thread_monitors.join()
-        self.logger.info("PeripheralDetector stopped.")
-
-if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
-    detector = PeripheralDetector(callback=lambda event: print("Detected:", event))
-    detector.start()
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        detector.stop()
+import os
+import time
+import threading
+import logging
+from event_store import EventLog
+from peripheral_inventory import BackendUnavailable, Inventory, make_backend
+import metrics
+
+SCANS = metrics.counter("dragon_peripheral_scans_total", "Device inventory scans.")
+SCAN_SECONDS = metrics.histogram("dragon_peripheral_scan_seconds", "Time spent per device inventory scan.")
+
+# Risk added for a device the session has not seen before, or for a display beyond the first.
+NEW_DEVICE_RISK = 35
+
+ACTIONS = {"added": "Device added", "removed": "Device removed"}
+
+
+class PeripheralDetector:
+    def __init__(self, callback=None, event_log=None, backend=None, debounce=2.0, poll_interval=5.0,
+                 rescan_interval=60.0, clock=time.time):
+        """
+        Args:
+            callback (callable, optional): Called with each peripheral event.
+            event_log (EventLog, optional): Where events are recorded.
+            backend (InventoryBackend, optional): Device scanner; by default `make_backend` picks
+                one on start, from DRAGON_PERIPHERAL_BACKEND ("auto", "wmi" or "sysfs").
+            debounce (float, optional): Seconds a change must last before it is reported. Defaults to 2.0.
+            poll_interval (float, optional): Seconds between scans for backends without change
+                notifications. Defaults to 5.0.
+            rescan_interval (float, optional): Seconds between safety scans for backends with
+                change notifications. Defaults to 60.0.
+        """
+        self.callback = callback  # Callback function when an event is detected
+        self.event_log = event_log if event_log is not None else EventLog("peripheral")  # Bounded peripheral event log
+        self.backend = backend
+        self.inventory = Inventory(debounce=debounce)
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.clock = clock
+        self.recorder = None  # session_recorder.SessionRecorder receiving every scan.
+        self.running = False
+        self.thread = None
+        self.risk_score = 0       # Cumulative risk score for peripheral detection
+        self.logger = logging.getLogger("PeripheralDetector")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    def displays(self):
+        return sum(1 for device in self.inventory.snapshot.values() if device.kind == "display")
+
+    def scan(self):
+        """Scans once and reports the changes the inventory commits."""
+        SCANS.inc()
+        with SCAN_SECONDS.time():
+            devices = self.backend.scan()
+        now = self.clock()
+        if self.recorder is not None:
+            self.recorder.devices(devices, now)
+        self.apply_scan(devices, now)
+
+    def apply_scan(self, devices, now):
+        """Reports what changed with the scan `devices` (Device.key -> Device) taken at `now`."""
+        first = self.inventory.snapshot is None
+        changes = self.inventory.update(devices, now)
+        if first:
+            self.logger.info("Baseline: %d devices.", len(devices))
+            count = self.displays()
+            if count > 1:
+                self._report(now, "Multiple monitors detected", f"Multiple monitors detected: {count}",
+                             "display", None, NEW_DEVICE_RISK)
+        for change in changes:
+            self._on_change(change)
+
+    def _on_change(self, change):
+        device = change.device
+        # Only first-time arrivals carry risk: removals and re-plugs of a device already seen this
+        # session (a mouse unplugged and plugged back) are logged without any.
+        risk = 0
+        if change.action == "added" and not change.replug:
+            if device.kind != "display" or self.displays() > 1:
+                risk = NEW_DEVICE_RISK
+        event = "Device re-plugged" if change.replug else ACTIONS[change.action]
+        self._report(change.timestamp, event, device.name, device.kind, device.key, risk)
+
+    def _report(self, timestamp, event, device, kind, key, risk):
+        self.risk_score += risk
+        log_entry = {
+            "timestamp": timestamp,
+            "event": event,
+            "device": device,
+            "kind": kind,
+            "key": key,
+            "risk": risk
+        }
+        self.event_log.append(log_entry)
+        self.logger.info("%s: %s; risk increased by %d", event, device, risk)
+        if self.callback:
+            self.callback(log_entry)
+
+    def monitor(self):
+        backend = self.backend
+        try:
+            backend.open()
+            interval = self.rescan_interval if backend.event_driven else self.poll_interval
+            while self.running:
+                try:
+                    self.scan()
+                except Exception as e:
+                    self.logger.error("Error scanning devices: %s", e)
+                # Sleep until the system reports a device change, a debounced change is due, or
+                # the next scheduled scan.
+                timeout = interval
+                due = self.inventory.next_due()
+                if due is not None:
+                    timeout = min(timeout, max(0.0, due - self.clock()))
+                backend.wait(timeout)
+        except Exception as e:
+            self.logger.error("PeripheralDetector stopped: %s", e)
+        finally:
+            backend.release()
+
+    def start(self):
+        if self.backend is None:
+            try:
+                self.backend = make_backend(os.environ.get("DRAGON_PERIPHERAL_BACKEND", "auto"))
+            except BackendUnavailable as exc:
+                self.logger.error("PeripheralDetector not started: %s", exc)
+                return
+        self.running = True
+        self.thread = threading.Thread(target=self.monitor, daemon=True)
+        self.thread.start()
+        self.logger.info("PeripheralDetector started (%s backend).", self.backend.name)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.backend.close()
+            self.thread.join()
+        self.logger.info("PeripheralDetector stopped.")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG)
+    detector = PeripheralDetector(callback=lambda event: print("Detected:", event))
+    detector.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        detector.stop()
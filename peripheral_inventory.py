@@ -0,0 +1,412 @@
+import os
+import sys
+import time
+import errno
+import socket
+import select
+import hashlib
+import logging
+from collections import namedtuple
+
+try:
+    import wmi
+    import pythoncom
+    import win32api
+except ImportError:
+    wmi = None
+
+logger = logging.getLogger("PeripheralInventory")
+
+# Netlink protocol on which the kernel broadcasts uevents (device add/remove/change).
+NETLINK_KOBJECT_UEVENT = 15
+
+Device = namedtuple("Device", ["key", "kind", "name"])
+Change = namedtuple("Change", ["timestamp", "action", "device", "replug"])
+
+
+class BackendUnavailable(RuntimeError):
+    """No peripheral backend can run on this machine."""
+
+
+def diff(old, new):
+    """Devices in `new` but not `old`, and in `old` but not `new`; both are dicts keyed by Device.key."""
+    added = [device for key, device in new.items() if key not in old]
+    removed = [device for key, device in old.items() if key not in new]
+    return added, removed
+
+
+class Inventory:
+    """
+    Keyed snapshot of the attached devices and displays.
+
+    `update` takes a fresh scan and returns what changed since the committed snapshot. A change
+    only commits once it has been seen for `debounce` seconds, so a device that drops off and
+    comes back within that time (a loose cable, a hub resetting, a display waking up) produces no
+    events at all; `flaps` counts those. Keys stay remembered after a removal, so plugging the same
+    device back in later is reported as a re-plug.
+    """
+
+    def __init__(self, debounce=2.0):
+        self.debounce = debounce
+        self.snapshot = None
+        self.flaps = 0
+        self._pending = {}  # Key -> (first seen at, device) for changes not yet committed.
+        self._seen = set()
+
+    def update(self, devices, now):
+        """
+        Args:
+            devices (dict): The latest scan, Device.key -> Device.
+            now (float): Time of the scan.
+
+        Returns:
+            list: Change tuples committed by this scan, stamped with the scan that first saw them;
+                the first scan is the baseline and returns none.
+        """
+        if self.snapshot is None:
+            self.snapshot = dict(devices)
+            self._seen.update(devices)
+            return []
+        snapshot = self.snapshot
+        added, removed = diff(snapshot, devices)
+        observed = {device.key: device for device in added + removed}
+        for key in list(self._pending):
+            if key not in observed:
+                del self._pending[key]
+                self.flaps += 1
+        changes = []
+        for key, device in observed.items():
+            first, _ = self._pending.setdefault(key, (now, device))
+            if now - first < self.debounce:
+                continue
+            del self._pending[key]
+            if key in devices:
+                snapshot[key] = device
+                changes.append(Change(first, "added", device, key in self._seen))
+                self._seen.add(key)
+            else:
+                del snapshot[key]
+                changes.append(Change(first, "removed", device, False))
+        return changes
+
+    def next_due(self):
+        """When the earliest pending change can commit, or None; a scan is needed then."""
+        if not self._pending:
+            return None
+        return min(first for first, _ in self._pending.values()) + self.debounce
+
+
+class InventoryBackend:
+    """
+    Source of device scans for PeripheralDetector.
+
+    `scan` returns the attached devices as a dict keyed by Device.key. `wait` blocks until the
+    system hints that something changed, `timeout` passes or the backend is closed; backends
+    without change notifications just sleep. `files_read` counts sysfs/WMI reads, for benchmarks.
+    """
+
+    name = "base"
+    event_driven = False
+
+    def __init__(self):
+        self.closed = False
+        self.scans = 0
+        self.files_read = 0
+
+    def open(self):
+        """Prepares the backend on the thread that will scan with it."""
+
+    def scan(self):
+        raise NotImplementedError
+
+    def wait(self, timeout):
+        """
+        Returns:
+            bool: Whether a change notification arrived (False on timeout or close).
+        """
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        """Wakes up a blocked `wait` call; `wait` returns False from then on."""
+        self.closed = True
+
+    def release(self):
+        """Frees the backend's resources, on the thread that scanned with it, once it is closed."""
+
+
+class FakeSysfs:
+    """
+    Minimal sysfs tree under `root` with the files SysfsBackend reads, for tests and benchmarks:
+    USB devices in sys/bus/usb/devices and DRM connectors in sys/class/drm.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.usb = os.path.join(root, "sys", "bus", "usb", "devices")
+        self.drm = os.path.join(root, "sys", "class", "drm")
+        os.makedirs(self.usb, exist_ok=True)
+        os.makedirs(self.drm, exist_ok=True)
+
+    @staticmethod
+    def _write(directory, **files):
+        os.makedirs(directory, exist_ok=True)
+        for name, value in files.items():
+            mode = "wb" if isinstance(value, bytes) else "w"
+            with open(os.path.join(directory, name), mode) as fh:
+                fh.write(value)
+
+    def plug_usb(self, port, vendor, product, name, serial=None, manufacturer=None, device_class="00"):
+        """Adds USB device `port` (e.g. "1-2.3") with one interface directory, as the kernel does."""
+        files = {"idVendor": vendor + "\n", "idProduct": product + "\n", "product": name + "\n",
+                 "bDeviceClass": device_class + "\n"}
+        if serial:
+            files["serial"] = serial + "\n"
+        if manufacturer:
+            files["manufacturer"] = manufacturer + "\n"
+        self._write(os.path.join(self.usb, port), **files)
+        self._write(os.path.join(self.usb, f"{port}:1.0"), bInterfaceClass="03\n")
+
+    def unplug_usb(self, port):
+        for entry in (port, f"{port}:1.0"):
+            directory = os.path.join(self.usb, entry)
+            for name in os.listdir(directory):
+                os.unlink(os.path.join(directory, name))
+            os.rmdir(directory)
+
+    def connect_display(self, connector, monitor="Generic Monitor", serial=1):
+        """Marks DRM `connector` (e.g. "card0-HDMI-A-1") connected, with an EDID naming `monitor`."""
+        self._write(os.path.join(self.drm, connector), status="connected\n", edid=fake_edid(monitor, serial))
+
+    def disconnect_display(self, connector):
+        self._write(os.path.join(self.drm, connector), status="disconnected\n", edid=b"")
+
+
+def fake_edid(monitor, serial=1):
+    """A 128-byte EDID block carrying a serial number and a monitor name descriptor."""
+    edid = bytearray(128)
+    edid[0:8] = b"\x00\xff\xff\xff\xff\xff\xff\x00"
+    edid[12:16] = serial.to_bytes(4, "little")
+    edid[54:72] = b"\x00\x00\x00\xfc\x00" + monitor.encode("ascii")[:13].ljust(13, b"\n")
+    edid[127] = -sum(edid[:127]) & 0xFF
+    return bytes(edid)
+
+
+def edid_name(edid):
+    """The monitor name from an EDID's 0xFC display descriptor, or None."""
+    for offset in (54, 72, 90, 108):
+        block = edid[offset:offset + 18]
+        if len(block) == 18 and block[:3] == b"\x00\x00\x00" and block[3] == 0xFC:
+            return block[5:].split(b"\n", 1)[0].decode("ascii", "replace").strip() or None
+    return None
+
+
+class SysfsBackend(InventoryBackend):
+    """
+    Linux backend: lists /sys/bus/usb/devices and the DRM connectors in /sys/class/drm.
+
+    A USB device's attributes cannot change while it stays attached, and the kernel creates a new
+    sysfs directory (with a new inode) for every attach, so attributes are read once per directory
+    and cached by inode: a scan with nothing new costs one directory listing, plus a status read
+    per display connector. `wait` listens for kernel uevents on a netlink socket, so scans happen
+    when a device comes or goes rather than on a timer; without netlink it sleeps.
+    """
+
+    name = "sysfs"
+
+    def __init__(self, root="/", uevents=True):
+        super().__init__()
+        self.usb_dir = os.path.join(root, "sys", "bus", "usb", "devices")
+        self.drm_dir = os.path.join(root, "sys", "class", "drm")
+        if not os.path.isdir(self.usb_dir) and not os.path.isdir(self.drm_dir):
+            raise BackendUnavailable(f"No USB or DRM devices under {os.path.join(root, 'sys')}")
+        self._usb_cache = {}  # (entry name, inode) -> Device, or None for hubs and interfaces.
+        self._socket = None
+        self._wake_read, self._wake_write = os.pipe()
+        if uevents and hasattr(socket, "AF_NETLINK"):
+            try:
+                self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+                self._socket.bind((0, 1))
+                self.event_driven = True
+            except OSError as exc:
+                logger.info("Kernel uevents unavailable (%s); rescanning on a timer.", exc)
+                self._socket = None
+
+    def _read(self, directory, name):
+        self.files_read += 1
+        try:
+            with open(os.path.join(directory, name), "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def _text(self, directory, name):
+        data = self._read(directory, name)
+        return data.decode("utf-8", "replace").strip() if data is not None else None
+
+    def _usb_device(self, entry):
+        # Interfaces ("1-2:1.0") and root hubs ("usb1") are not devices a candidate plugs in.
+        if ":" in entry.name or entry.name.startswith("usb"):
+            return None
+        directory = entry.path
+        vendor, product = self._text(directory, "idVendor"), self._text(directory, "idProduct")
+        if vendor is None or product is None:
+            return None
+        if self._text(directory, "bDeviceClass") == "09":
+            return None  # Hubs only matter through the devices behind them.
+        serial = self._text(directory, "serial")
+        name = " ".join(filter(None, (self._text(directory, "manufacturer"), self._text(directory, "product"))))
+        # Keyed by serial where the device has one, so the same stick in another port is a re-plug.
+        key = f"usb:{vendor}:{product}:{serial or entry.name}"
+        return Device(key, "usb", name or f"USB device {vendor}:{product}")
+
+    def scan(self):
+        self.scans += 1
+        devices = {}
+        cache = {}
+        try:
+            entries = list(os.scandir(self.usb_dir))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            try:
+                ident = (entry.name, entry.inode())
+            except OSError:
+                continue
+            device = self._usb_cache[ident] if ident in self._usb_cache else self._usb_device(entry)
+            cache[ident] = device
+            if device is not None:
+                devices[device.key] = device
+        self._usb_cache = cache
+        try:
+            connectors = list(os.scandir(self.drm_dir))
+        except FileNotFoundError:
+            connectors = []
+        for entry in connectors:
+            if "-" not in entry.name:
+                continue  # card0 itself; connectors are card0-HDMI-A-1 and the like.
+            if self._text(entry.path, "status") != "connected":
+                continue
+            edid = self._read(entry.path, "edid") or b""
+            connector = entry.name.split("-", 1)[1]
+            # The EDID identifies the monitor, so swapping monitors on one connector is a change.
+            key = f"display:{connector}:{hashlib.blake2b(edid, digest_size=6).hexdigest()}"
+            name = edid_name(edid)
+            devices[key] = Device(key, "display", f"{name} on {connector}" if name else connector)
+        return devices
+
+    def wait(self, timeout):
+        if self.closed:
+            return False
+        watched = [self._wake_read] + ([self._socket] if self._socket is not None else [])
+        try:
+            ready, _, _ = select.select(watched, [], [], timeout)
+        except (OSError, ValueError):
+            return False
+        if self.closed or self._socket is None or self._socket not in ready:
+            return False
+        # A plug produces a burst of uevents (device, interfaces, drivers); one scan covers them all.
+        while True:
+            try:
+                self._socket.recv(65536, socket.MSG_DONTWAIT)
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        os.write(self._wake_write, b"\0")
+
+    def release(self):
+        if self._wake_read is not None:
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+            self._wake_read = self._wake_write = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class WmiBackend(InventoryBackend):
+    """
+    Windows backend: present Plug and Play devices from WMI and monitors from EnumDisplayMonitors.
+    `wait` blocks on a WMI instance-operation event query for Win32_PnPEntity, so both arrivals and
+    removals trigger a scan. WMI objects are bound to the COM apartment of the thread that
+    created them, so everything happens on the thread that calls `open`.
+    """
+
+    name = "wmi"
+    event_driven = True
+
+    def __init__(self):
+        if wmi is None:
+            raise BackendUnavailable("wmi and pywin32 are not installed")
+        super().__init__()
+        self._wmi = None
+        self._watcher = None
+
+    def open(self):
+        pythoncom.CoInitialize()
+        self._wmi = wmi.WMI()
+        self._watcher = self._wmi.watch_for(notification_type="Operation", wmi_class="Win32_PnPEntity",
+                                            delay_secs=1)
+
+    def scan(self):
+        self.scans += 1
+        devices = {}
+        for entity in self._wmi.query("SELECT PNPDeviceID, Caption, PNPClass FROM Win32_PnPEntity "
+                                      "WHERE Present = TRUE"):
+            self.files_read += 1
+            if entity.PNPClass in ("USB", "HIDClass", "Keyboard", "Mouse", "Camera", "Image", "DiskDrive",
+                                   "Bluetooth", "AudioEndpoint", "Media", "Net"):
+                key = f"pnp:{entity.PNPDeviceID}"
+                devices[key] = Device(key, "pnp", entity.Caption or entity.PNPDeviceID)
+        for index, (_, _, rect) in enumerate(win32api.EnumDisplayMonitors()):
+            key = f"display:{index}"
+            devices[key] = Device(key, "display", f"Monitor {index + 1} {rect}")
+        return devices
+
+    def wait(self, timeout):
+        # The watcher cannot be woken from another thread, so it is polled in short slices.
+        deadline = time.monotonic() + timeout
+        while not self.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                self._watcher(timeout_ms=int(min(remaining, 1.0) * 1000))
+                return True
+            except wmi.x_wmi_timed_out:
+                continue
+        return False
+
+    def release(self):
+        if self._wmi is not None:
+            self._watcher = self._wmi = None
+            pythoncom.CoUninitialize()
+
+
+def make_backend(name="auto", root="/"):
+    """
+    Picks a peripheral backend.
+
+    Args:
+        name (str, optional): "wmi", "sysfs" or "auto", which picks the one for this platform.
+            Defaults to "auto".
+        root (str, optional): Filesystem root the sysfs backend scans. Defaults to "/".
+
+    Returns:
+        InventoryBackend: The backend.
+
+    Raises:
+        BackendUnavailable: If no requested backend can run here.
+    """
+    if name == "wmi" or (name == "auto" and sys.platform == "win32"):
+        return WmiBackend()
+    if name in ("sysfs", "auto"):
+        return SysfsBackend(root=root)
+    raise BackendUnavailable(f"Unknown peripheral backend {name!r}")
@@ -0,0 +1,303 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter, deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class _Bucket:
+    """Everything observed during one wall-clock second."""
+
+    __slots__ = ("second", "stacks", "spans", "cpu")
+
+    def __init__(self, second):
+        self.second = second
+        self.stacks = Counter()   # (thread name, (outermost frame, ..., innermost frame)) -> samples
+        self.spans = {}           # span name -> [count, total seconds, max seconds]
+        self.cpu = {}             # thread name -> CPU seconds spent during this second
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._record_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler over every Python thread that can be switched on and off at runtime.
+
+    While running, a background thread snapshots the stack of every other thread through
+    `sys._current_frames` each `interval` seconds and counts identical stacks per wall-clock
+    second. Code marked with `span(name)` additionally reports per-stage timings. Only the last
+    `window` seconds are kept, so a query covers "the last N seconds" without unbounded growth.
+    When stopped, spans cost one attribute check and nothing is sampled.
+    """
+
+    def __init__(self, interval=0.01, window=300, max_depth=64, clock=time.time):
+        """
+        Args:
+            interval (float, optional): Seconds between stack samples. Defaults to 0.01 (100 Hz).
+            window (int, optional): Seconds of samples and spans kept. Defaults to 300.
+            max_depth (int, optional): Innermost frames kept per stack. Defaults to 64.
+            clock (callable, optional): Wall clock used to bucket samples. Defaults to time.time.
+        """
+        self.interval = interval
+        self.window = window
+        self.max_depth = max_depth
+        self.clock = clock
+        self.running = False
+        self.started_at = None
+        self.samples_taken = 0
+        self._buckets = deque(maxlen=window)
+        self._labels = {}
+        self._cpu_seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self, interval=None):
+        """Starts sampling; returns False when already running."""
+        with self._lock:
+            if self.running:
+                return False
+            if interval is not None:
+                self.interval = interval
+            self.running = True
+            self.started_at = self.clock()
+            self._stop.clear()
+            self._cpu_seen = self._thread_cpu()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        self.logger.info("Sampling profiler started at %.0f Hz.", 1 / self.interval)
+        return True
+
+    def stop(self):
+        """Stops sampling and keeps the collected window for querying; returns False when not running."""
+        with self._lock:
+            if not self.running:
+                return False
+            self.running = False
+            thread = self._thread
+            self._thread = None
+        self._stop.set()
+        thread.join(timeout=1)
+        self.logger.info("Sampling profiler stopped after %d samples.", self.samples_taken)
+        return True
+
+    def status(self):
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "window": self.window,
+            "started_at": self.started_at,
+            "samples": self.samples_taken,
+        }
+
+    def span(self, name):
+        """Context manager timing one stage of work under `name`; a no-op while stopped."""
+        if not self.running:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def _record_span(self, name, elapsed):
+        with self._lock:
+            bucket = self._bucket(self.clock())
+            stats = bucket.spans.get(name)
+            if stats is None:
+                bucket.spans[name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+
+    def _bucket(self, now):
+        # Callers hold the lock.
+        second = int(now)
+        if not self._buckets or self._buckets[-1].second != second:
+            self._buckets.append(_Bucket(second))
+        return self._buckets[-1]
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _stack(self, frame):
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    @staticmethod
+    def _thread_cpu():
+        """{native thread ID: (thread name, CPU seconds so far)}; empty without psutil."""
+        if psutil is None:
+            return {}
+        names = {t.native_id: t.name for t in threading.enumerate()}
+        try:
+            threads = psutil.Process().threads()
+        except psutil.Error:
+            return {}
+        return {t.id: (names.get(t.id, f"native-{t.id}"), t.user_time + t.system_time) for t in threads}
+
+    def _attribute_cpu(self, bucket):
+        current = self._thread_cpu()
+        for native_id, (name, seconds) in current.items():
+            previous = self._cpu_seen.get(native_id)
+            spent = seconds - previous[1] if previous is not None else seconds
+            if spent > 0:
+                bucket.cpu[name] = bucket.cpu.get(name, 0.0) + spent
+        self._cpu_seen = current
+
+    def _run(self):
+        own = threading.get_ident()
+        charged = None
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [(names.get(ident, str(ident)), self._stack(frame))
+                      for ident, frame in frames.items() if ident != own]
+            del frames
+            with self._lock:
+                bucket = self._bucket(self.clock())
+                if charged is not bucket:
+                    # Per-thread CPU is read once a second and charged to the second that just ended.
+                    if charged is not None:
+                        self._attribute_cpu(charged)
+                    charged = bucket
+                for key in stacks:
+                    bucket.stacks[key] += 1
+                self.samples_taken += 1
+        if charged is not None:
+            with self._lock:
+                self._attribute_cpu(charged)
+
+    def _recent(self, seconds):
+        cutoff = int(self.clock() - seconds)
+        with self._lock:
+            return [b for b in self._buckets if b.second > cutoff]
+
+    def _stacks(self, seconds, thread=None):
+        merged = Counter()
+        for bucket in self._recent(seconds):
+            for key, count in list(bucket.stacks.items()):
+                if thread is None or key[0] == thread:
+                    merged[key] += count
+        return merged
+
+    def collapsed(self, seconds=30, thread=None):
+        """
+        Returns the last `seconds` of samples in the collapsed-stack format read by flamegraph.pl,
+        speedscope and similar tools: one "thread;outer;...;inner count" line per distinct stack.
+        """
+        lines = [";".join((name,) + stack) + f" {count}"
+                 for (name, stack), count in self._stacks(seconds, thread).items()]
+        return "\n".join(sorted(lines)) + ("\n" if lines else "")
+
+    def top(self, seconds=30, limit=20, thread=None):
+        """
+        Summarizes the last `seconds`: per-thread samples and CPU, the `limit` functions with the
+        most self (innermost frame) and total (anywhere on the stack) samples, and span timings.
+        """
+        stacks = self._stacks(seconds, thread)
+        total = sum(stacks.values())
+        per_thread = Counter()
+        self_counts = Counter()
+        total_counts = Counter()
+        for (name, stack), count in stacks.items():
+            per_thread[name] += count
+            if stack:
+                self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        cpu = Counter()
+        spans = {}
+        buckets = self._recent(seconds)
+        for bucket in buckets:
+            cpu.update(bucket.cpu)
+            for name, (count, elapsed, longest) in list(bucket.spans.items()):
+                stats = spans.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += count
+                stats[1] += elapsed
+                stats[2] = max(stats[2], longest)
+        covered = len(buckets) or 1
+
+        def pct(count):
+            return round(count / total * 100, 2) if total else 0.0
+
+        threads = [{
+            "thread": name,
+            "samples": per_thread.get(name, 0),
+            "cpu_seconds": round(cpu.get(name, 0.0), 4),
+            "cpu_pct": round(cpu.get(name, 0.0) / covered * 100, 2),
+        } for name in (set(per_thread) | set(cpu) if thread is None else {thread})]
+        threads.sort(key=lambda row: (row["cpu_seconds"], row["samples"]), reverse=True)
+        functions = [{
+            "function": label,
+            "self": count,
+            "self_pct": pct(count),
+            "total": total_counts[label],
+            "total_pct": pct(total_counts[label]),
+        } for label, count in self_counts.most_common(limit)]
+        cumulative = [{"function": label, "total": count, "total_pct": pct(count)}
+                      for label, count in total_counts.most_common(limit)]
+        span_rows = [{
+            "span": name,
+            "count": count,
+            "total_ms": round(elapsed * 1e3, 3),
+            "mean_ms": round(elapsed / count * 1e3, 3),
+            "max_ms": round(longest * 1e3, 3),
+        } for name, (count, elapsed, longest) in spans.items()]
+        span_rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return {
+            "seconds": seconds,
+            "samples": total,
+            "threads": threads,
+            "self": functions,
+            "cumulative": cumulative,
+            "spans": span_rows,
+        }
+
+
+PROFILER = SamplingProfiler()
+
+
+def span(name):
+    return PROFILER.span(name)
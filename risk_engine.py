@@ -0,0 +1,113 @@
+import math
+import time
+import threading
+from collections import deque
+
+
+def event_risk(event):
+    """Returns the risk carried by an event; the voice detector reports it as 'risk_score'."""
+    value = event.get("risk", event.get("risk_score", 0))
+    return value if isinstance(value, (int, float)) else 0
+
+
+class SourceRisk:
+    """
+    Incremental risk aggregates for one event source.
+
+    Keeps a cumulative total, a sliding-window sum over the last `window` seconds and an
+    exponentially decayed score with the given half-life. Each event is O(1); window expiry
+    is amortized O(1) because every event enters and leaves the window deque once.
+    """
+
+    __slots__ = ("window", "decay_rate", "total", "count", "window_sum", "_window",
+                 "_decayed", "_last_time")
+
+    def __init__(self, window=300.0, half_life=120.0):
+        self.window = window
+        self.decay_rate = math.log(2) / half_life
+        self.total = 0
+        self.count = 0
+        self.window_sum = 0
+        self._window = deque()
+        self._decayed = 0.0
+        self._last_time = None
+
+    def add(self, timestamp, risk):
+        # Some trackers stamp events with the start of the offending interval, so effective
+        # time is clamped to be monotonic; this keeps the window deque sorted.
+        if self._last_time is not None and timestamp < self._last_time:
+            timestamp = self._last_time
+        self.count += 1
+        if not risk:
+            return
+        self.total += risk
+        self._decayed = self.decayed(timestamp) + risk
+        self._last_time = timestamp
+        self._window.append((timestamp, risk))
+        self.window_sum += risk
+        self._expire(timestamp)
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self._window and self._window[0][0] <= cutoff:
+            self.window_sum -= self._window.popleft()[1]
+        if not self._window:
+            self.window_sum = 0  # Drop accumulated float error once the window is empty.
+
+    def windowed(self, now):
+        self._expire(now)
+        return self.window_sum
+
+    def decayed(self, now):
+        if self._last_time is None:
+            return 0.0
+        return self._decayed * math.exp(-self.decay_rate * max(0.0, now - self._last_time))
+
+
+class RiskEngine:
+    """
+    Consumes events from all trackers (register `on_event` as an EventStore listener) and
+    maintains per-source cumulative, sliding-window and time-decayed risk.
+    """
+
+    def __init__(self, sources, window=300.0, half_life=120.0, clock=time.time):
+        """
+        Args:
+            sources (iterable): Names of the event sources to track.
+            window (float, optional): Sliding window length in seconds. Defaults to 300.
+            half_life (float, optional): Half-life of the decayed score in seconds. Defaults to 120.
+            clock (callable, optional): Returns the current time. Defaults to time.time.
+        """
+        self.window = window
+        self.half_life = half_life
+        self.clock = clock
+        self.sources = {name: SourceRisk(window, half_life) for name in sources}
+        self._lock = threading.Lock()
+
+    def on_event(self, source, event):
+        state = self.sources.get(source)
+        if state is None:
+            return
+        timestamp = event.get("timestamp")
+        if not isinstance(timestamp, (int, float)):
+            timestamp = self.clock()
+        with self._lock:
+            state.add(timestamp, event_risk(event))
+
+    def cumulative(self, source):
+        return self.sources[source].total
+
+    def snapshot(self, now=None):
+        """Returns {source: {"cumulative", "windowed", "decayed", "events"}} at time `now`."""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            return {
+                name: {
+                    "cumulative": state.total,
+                    "windowed": state.windowed(now),
+                    "decayed": state.decayed(now),
+                    "events": state.count,
+                }
+                for name, state in self.sources.items()
+            }
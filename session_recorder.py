@@ -0,0 +1,448 @@
+import os
+import json
+import time
+import zlib
+import struct
+import bisect
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+
+logger = logging.getLogger("SessionRecorder")
+
+MAGIC = b"DRGNREC\x01"
+INDEX_MAGIC = b"DRGNIDX\x01"
+# timestamp, channel, payload length
+RECORD = struct.Struct("<dBI")
+# index offset, magic
+TRAILER = struct.Struct("<Q8s")
+FRAME_HEADER = struct.Struct("<HHB")
+MOUSE_HEADER = struct.Struct("<IIB")
+
+# Raw inputs, one channel per sensor. Ids are positions in this tuple, so only append to it.
+CHANNELS = ("frame", "audio", "mouse", "window", "clipboard", "devices", "keys")
+CHANNEL_IDS = {name: index for index, name in enumerate(CHANNELS)}
+
+
+def encode_frame(frame):
+    """A BGR uint8 camera frame, losslessly: the replay must see exactly what detection saw."""
+    height, width = frame.shape[:2]
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    return FRAME_HEADER.pack(height, width, channels) + zlib.compress(np.ascontiguousarray(frame).tobytes(), 1)
+
+
+def decode_frame(payload):
+    height, width, channels = FRAME_HEADER.unpack_from(payload)
+    data = zlib.decompress(payload[FRAME_HEADER.size:])
+    shape = (height, width, channels) if channels > 1 else (height, width)
+    return np.frombuffer(data, dtype=np.uint8).reshape(shape).copy()
+
+
+def encode_mouse(samples, scrolls, reset):
+    samples = np.ascontiguousarray(samples, dtype="<f8").reshape(-1, 3)
+    scrolls = np.asarray(scrolls, dtype="<f8").reshape(-1, 5)
+    return MOUSE_HEADER.pack(len(samples), len(scrolls), bool(reset)) + samples.tobytes() + scrolls.tobytes()
+
+
+def decode_mouse(payload):
+    count, scrolls, reset = MOUSE_HEADER.unpack_from(payload)
+    offset = MOUSE_HEADER.size
+    samples = np.frombuffer(payload, dtype="<f8", count=count * 3, offset=offset).reshape(count, 3)
+    ticks = np.frombuffer(payload, dtype="<f8", count=scrolls * 5, offset=offset + count * 24).reshape(scrolls, 5)
+    return samples, [tuple(tick) for tick in ticks.tolist()], bool(reset)
+
+
+def decode(channel, payload):
+    """The Python value of a record's payload, as the corresponding tracker takes it."""
+    if channel == "frame":
+        return decode_frame(payload)
+    if channel == "audio":
+        return payload
+    if channel == "mouse":
+        return decode_mouse(payload)
+    if channel == "clipboard":
+        return payload.decode("utf-8", "surrogatepass")
+    return json.loads(payload)
+
+
+class SessionRecorder:
+    """
+    Records the raw inputs of every sensor into one append-only file, so that a session can be
+    replayed through the detectors later (see SessionReplayer).
+
+    Each record is a small header (timestamp, channel, length) and the channel's payload, in the
+    order the trackers received their inputs. Every `index_interval` seconds of session time the
+    file offset is noted; on close the index, per-channel counts, `meta` and the risk each
+    tracker accumulated while recording are appended, followed by a fixed-size trailer pointing
+    at them, so a reader can seek to any point in time without scanning. A file cut short by a
+    crash has no trailer; readers rebuild the index by scanning.
+
+    Trackers call the channel methods from their own threads; records are serialized by a lock.
+    """
+
+    def __init__(self, path, meta=None, sources=None, index_interval=1.0, clock=time.time):
+        """
+        Args:
+            path (str): The recording file; it is overwritten.
+            meta (dict, optional): Detector settings the replay needs (thresholds, rules, ...).
+            sources (dict, optional): Source name -> callable returning that tracker's risk score;
+                the risk added while recording is stored with the index.
+            index_interval (float, optional): Session seconds between index points. Defaults to 1.0.
+        """
+        self.path = path
+        self.meta = dict(meta or {})
+        self.sources = dict(sources or {})
+        self.index_interval = index_interval
+        self.clock = clock
+        self.counts = Counter()
+        self.bytes = 0
+        self.closed = False
+        self._index = []
+        self._next_index = None
+        self._baseline = {name: score() for name, score in self.sources.items()}
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self.meta.setdefault("started", clock())
+
+    def record(self, channel, payload, timestamp=None):
+        """Appends one record of already encoded `payload` bytes."""
+        timestamp = self.clock() if timestamp is None else float(timestamp)
+        header = RECORD.pack(timestamp, CHANNEL_IDS[channel], len(payload))
+        with self._lock:
+            if self.closed:
+                return
+            if self._next_index is None or timestamp >= self._next_index:
+                self._index.append((timestamp, self._file.tell()))
+                self._next_index = timestamp + self.index_interval
+                # A crash loses at most the records since the last index point.
+                self._file.flush()
+            self._file.write(header)
+            self._file.write(payload)
+            self.counts[channel] += 1
+            self.bytes += len(header) + len(payload)
+
+    def frame(self, frame, timestamp=None):
+        self.record("frame", encode_frame(frame), timestamp)
+
+    def audio(self, data, timestamp=None):
+        self.record("audio", bytes(data), timestamp)
+
+    def mouse(self, samples, scrolls=(), reset=False, timestamp=None):
+        self.record("mouse", encode_mouse(samples, scrolls, reset), timestamp)
+
+    def window(self, title, process=None, timestamp=None):
+        self.record("window", json.dumps([title, process]).encode(), timestamp)
+
+    def clipboard(self, text, timestamp=None):
+        self.record("clipboard", text.encode("utf-8", "surrogatepass"), timestamp)
+
+    def devices(self, devices, timestamp=None):
+        """A full device scan, Device.key -> Device, as PeripheralDetector.apply_scan takes it."""
+        self.record("devices", json.dumps([list(device) for device in devices.values()]).encode(), timestamp)
+
+    def key(self, name, pressed, timestamp=None):
+        """A shortcut key going down or up; CopyTracker passes only modifiers and keys its policy names."""
+        if name is not None:
+            self.record("keys", json.dumps([name, pressed]).encode(), timestamp)
+
+    def close(self):
+        """Writes the index and trailer. The recording is complete (and seekable) only after this."""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            risk = {name: score() - self._baseline[name] for name, score in self.sources.items()}
+            footer = {"meta": self.meta, "counts": dict(self.counts), "risk": risk, "index": self._index}
+            offset = self._file.tell()
+            self._file.write(zlib.compress(json.dumps(footer).encode()))
+            self._file.write(TRAILER.pack(offset, INDEX_MAGIC))
+            self._file.close()
+        logger.info("Recorded %d inputs (%.1f MiB) to %s", sum(self.counts.values()), self.bytes / 2 ** 20, self.path)
+
+
+class SessionReader:
+    """
+    Reads a SessionRecorder file: `records` yields (timestamp, channel, payload bytes) in recorded
+    order, starting from any point in time by way of the index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a session recording")
+        self.complete = False
+        self.meta, self.counts, self.risk, self.index = {}, {}, None, []
+        self._end = self.size
+        if self.size >= len(MAGIC) + TRAILER.size:
+            self._file.seek(self.size - TRAILER.size)
+            offset, magic = TRAILER.unpack(self._file.read(TRAILER.size))
+            if magic == INDEX_MAGIC:
+                self._file.seek(offset)
+                footer = json.loads(zlib.decompress(self._file.read(self.size - TRAILER.size - offset)))
+                self.meta, self.counts, self.risk = footer["meta"], footer["counts"], footer["risk"]
+                self.index = [tuple(point) for point in footer["index"]]
+                self._end = offset
+                self.complete = True
+        if not self.complete:
+            logger.warning("%s has no index (the recording was not closed); scanning it.", path)
+            self._rebuild()
+        self._times = [timestamp for timestamp, _ in self.index]
+
+    def _rebuild(self):
+        counts = Counter()
+        next_index = None
+        offset = len(MAGIC)
+        for timestamp, channel, _, start in self._scan(offset, None):
+            if next_index is None or timestamp >= next_index:
+                self.index.append((timestamp, start))
+                next_index = timestamp + 1.0
+            counts[channel] += 1
+            offset = self._file.tell()
+        self._end = offset  # A record cut off mid-write is ignored.
+        self.counts = dict(counts)
+
+    def _scan(self, offset, channels):
+        self._file.seek(offset)
+        read = self._file.read
+        while offset + RECORD.size <= self._end:
+            header = read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            timestamp, channel_id, length = RECORD.unpack(header)
+            if offset + RECORD.size + length > self._end or channel_id >= len(CHANNELS):
+                return
+            channel = CHANNELS[channel_id]
+            if channels is None or channel in channels:
+                payload = read(length)
+            else:
+                self._file.seek(length, os.SEEK_CUR)
+                payload = None
+            yield timestamp, channel, payload, offset
+            offset += RECORD.size + length
+
+    def seek_offset(self, timestamp):
+        """File offset of the last index point at or before `timestamp`."""
+        position = bisect.bisect_right(self._times, timestamp) - 1
+        return self.index[position][1] if position >= 0 else len(MAGIC)
+
+    def records(self, start=None, end=None, channels=None):
+        """
+        Args:
+            start (float, optional): Skip records before this time.
+            end (float, optional): Stop at the first record after this time.
+            channels (iterable, optional): Only these channels; others are skipped unread.
+
+        Yields:
+            tuple: (timestamp, channel, payload bytes).
+        """
+        channels = set(channels) if channels is not None else None
+        offset = self.seek_offset(start) if start is not None else len(MAGIC)
+        for timestamp, channel, payload, _ in self._scan(offset, channels):
+            if end is not None and timestamp > end:
+                return
+            if payload is None or (start is not None and timestamp < start):
+                continue
+            yield timestamp, channel, payload
+
+    def close(self):
+        self._file.close()
+
+
+class SimulatedClock:
+    """A clock the replay sets to each record's timestamp, for the trackers that take a `clock`."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SessionReplayer:
+    """
+    Pushes a recording through the real detector code.
+
+    Trackers are built from the recording's meta (thresholds, rules, policy) with their own event
+    logs and a SimulatedClock, and every record is handed to the same entry point the live
+    tracker's thread uses, with the recorded timestamp: mouse batches to `feed`, focus changes to
+    WindowTracker, clipboard changes and shortcut keys to CopyTracker, device scans to
+    PeripheralDetector, audio chunks to VoiceDetector.process_chunk and camera frames to
+    face_detector.process_frame. Channels whose detector cannot be imported here (e.g. the face
+    models) are counted as skipped.
+    """
+
+    def __init__(self, path, content_store=None, window_rules=None):
+        self.reader = SessionReader(path)
+        self.clock = SimulatedClock()
+        self.content_store = content_store
+        self.window_rules = window_rules
+        self.trackers = {}
+        self.skipped = Counter()
+        self._handlers = {}
+        self._unavailable = {}
+
+    def _tracker(self, channel):
+        if channel in self._handlers or channel in self._unavailable:
+            return self._handlers.get(channel)
+        try:
+            self._handlers[channel] = self._build(channel)
+        except ImportError as exc:
+            self._unavailable[channel] = str(exc)
+            logger.warning("Not replaying %s: %s", channel, exc)
+        return self._handlers.get(channel)
+
+    def _build(self, channel):
+        # Imported here: each detector pulls in its own (sometimes heavy) dependencies.
+        from event_store import EventLog
+        meta = self.reader.meta
+        quiet = logging.getLogger("SessionReplay")
+        if channel == "mouse":
+            from mouse_tracker import MouseBehaviorTracker
+            tracker = MouseBehaviorTracker(event_log=EventLog("mouse"), clock=self.clock,
+                                           **meta.get("mouse", {}))
+            tracker.logger = quiet
+            self.trackers["mouse"] = tracker
+            return lambda now, value: tracker.feed(*value, now=now)
+        if channel == "window":
+            from window_tracker import WindowTracker
+            from window_rules import WindowRules
+            rules = self.window_rules
+            if rules is None:
+                path = meta.get("window_rules")
+                rules = WindowRules.from_file(path) if path else WindowRules()
+            tracker = WindowTracker(event_log=EventLog("window"), rules=rules)
+            tracker.logger = quiet
+            self.trackers["window"] = tracker
+            return lambda now, value: tracker._on_window(value[0], value[1], now)
+        if channel in ("clipboard", "keys"):
+            tracker = self.trackers.get("copy")
+            if tracker is None:
+                from copy_tracker import CopyTracker
+                from shortcut_policy import PolicyFile, ShortcutPolicy
+                policy = PolicyFile(policy=ShortcutPolicy(meta.get("shortcuts")))
+                tracker = CopyTracker(event_log=EventLog("copy"), content_store=self.content_store,
+                                      policy=policy)
+                tracker.logger = quiet
+                # Keys are only recorded while shortcuts are disabled; no listener is started here.
+                tracker.shortcuts_disabled = True
+                self.trackers["copy"] = tracker
+            if channel == "clipboard":
+                return lambda now, value: tracker._on_clipboard(value, now)
+            return lambda now, value: (tracker.on_press if value[1] else tracker.on_release)(_Key(value[0]), now)
+        if channel == "devices":
+            from peripheral_detector import PeripheralDetector
+            from peripheral_inventory import Device
+            settings = meta.get("peripheral", {})
+            tracker = PeripheralDetector(event_log=EventLog("peripheral"), clock=self.clock,
+                                         debounce=settings.get("debounce", 2.0))
+            tracker.logger = quiet
+            self.trackers["peripheral"] = tracker
+            return lambda now, value: tracker.apply_scan({device[0]: Device(*device) for device in value}, now)
+        if channel == "audio":
+            from voice_detector import VoiceDetector
+            tracker = VoiceDetector(event_log=EventLog("voice"), recordings_dir=None, open_audio=False,
+                                    **meta.get("voice", {}))
+            self.trackers["voice"] = tracker
+            return lambda now, value: tracker.process_chunk(value, now)
+        if channel == "frame":
+            import face_detector
+            face_detector.reset()
+            face_detector.eye_risk_score = 0
+            face_detector.eye_risk_events = EventLog("face")
+            self.trackers["face"] = face_detector
+            return lambda now, value: face_detector.process_frame(value, now)
+        raise ImportError(f"no detector for channel {channel!r}")
+
+    def risk(self):
+        """Risk each replayed tracker accumulated, keyed like the recording's `risk`."""
+        return {name: (tracker.eye_risk_score if name == "face" else tracker.risk_score)
+                for name, tracker in self.trackers.items()}
+
+    def run(self, speed=None, start=None, end=None, channels=None):
+        """
+        Replays the recording.
+
+        Args:
+            speed (float, optional): 1.0 replays in real time, 2.0 twice as fast; None replays as
+                fast as the detectors go. Defaults to None.
+            start (float, optional): Session time to start from, using the index to seek.
+            end (float, optional): Session time to stop at.
+            channels (iterable, optional): Only replay these channels.
+
+        Returns:
+            dict: Records and session seconds replayed, wall seconds, throughput, records per
+                channel, skipped channels, and the replayed risk next to the recorded risk.
+        """
+        counts = Counter()
+        first = last = None
+        wall_start = time.perf_counter()
+        for timestamp, channel, payload in self.reader.records(start, end, channels):
+            if first is None:
+                first = timestamp
+            if speed:
+                delay = (timestamp - first) / speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            handler = self._tracker(channel)
+            if handler is None:
+                self.skipped[channel] += 1
+                continue
+            self.clock.now = timestamp
+            handler(timestamp, decode(channel, payload))
+            counts[channel] += 1
+            last = timestamp
+        # Episodes still open when the recording stopped are closed as the live tracker's stop would.
+        if "mouse" in self.trackers:
+            self.trackers["mouse"].flush()
+        wall = time.perf_counter() - wall_start
+        session = (last - first) if first is not None and last is not None else 0.0
+        replayed = self.risk()
+        recorded = self.reader.risk
+        report = {
+            "records": sum(counts.values()),
+            "session_seconds": session,
+            "wall_seconds": wall,
+            "records_per_second": sum(counts.values()) / wall if wall else 0.0,
+            "realtime_factor": session / wall if wall else 0.0,
+            "channels": dict(counts),
+            "skipped": {channel: {"records": count, "reason": self._unavailable.get(channel)}
+                        for channel, count in self.skipped.items()},
+            "risk": replayed,
+        }
+        if recorded is not None and start is None and end is None:
+            report["recorded_risk"] = recorded
+            report["risk_matches"] = all(replayed.get(name, 0) == value for name, value in recorded.items()
+                                         if name in replayed)
+        return report
+
+
+class _Key:
+    """Stands in for a pynput key: shortcut_policy.key_id reads only its name."""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Replays a session recording through the detectors.")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, help="1 for real time; as fast as possible if omitted.")
+    parser.add_argument("--start", type=float, help="Seconds into the session to start from.")
+    parser.add_argument("--end", type=float, help="Seconds into the session to stop at.")
+    parser.add_argument("--channels", help="Comma-separated channels to replay, e.g. mouse,window.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    replayer = SessionReplayer(args.path)
+    origin = replayer.reader.index[0][0] if replayer.reader.index else 0.0
+    print(json.dumps(replayer.run(speed=args.speed,
+                                  start=origin + args.start if args.start is not None else None,
+                                  end=origin + args.end if args.end is not None else None,
+                                  channels=args.channels.split(",") if args.channels else None), indent=2))
@@ -0,0 +1,275 @@
+import json
+import time
+import zlib
+import logging
+import threading
+
+from event_store import EventStore
+from risk_engine import RiskEngine
+
+
+class IngestError(Exception):
+    """Raised when a batch is refused; `status` is the HTTP status and `retry_after` is in seconds."""
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Session:
+    """Event store and risk state of one remote candidate machine."""
+
+    def __init__(self, session_id, sources, capacity, window, half_life, rate, burst, clock):
+        self.session_id = session_id
+        self.store = EventStore(capacity=capacity)
+        self.risk = RiskEngine(sources, window=window, half_life=half_life, clock=clock)
+        self.store.listeners.append(self.risk.on_event)
+        self.created = clock()
+        self.last_seen = self.created
+        self.received = 0
+        # Token bucket: `rate` events per second sustained, up to `burst` at once.
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled = self.created
+        self._lock = threading.Lock()
+
+    def admit(self, count, now):
+        """Takes `count` tokens. Returns 0 when admitted, else the seconds until they are available."""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if count <= self._tokens:
+                self._tokens -= count
+                return 0
+            return (count - self._tokens) / self.rate
+
+    def refund(self, count):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + count)
+
+    def summary(self, now):
+        snapshot = self.risk.snapshot(now)
+        return {
+            "session": self.session_id,
+            "events": self.received,
+            "last_seen": self.last_seen,
+            "cumulative": sum(s["cumulative"] for s in snapshot.values()),
+            "windowed": sum(s["windowed"] for s in snapshot.values()),
+            "decayed": round(sum(s["decayed"] for s in snapshot.values()), 2),
+            "sources": snapshot,
+        }
+
+
+class SessionRegistry:
+    """
+    Per-session event stores and risk engines for a central server receiving batches from many
+    candidate agents.
+
+    `ingest` applies backpressure instead of queueing without bound: a batch is refused with 503
+    when too many batches are already being processed or the session table is full, and with 429
+    when a single session exceeds its event rate. Both carry a Retry-After hint for the agent.
+
+    Sessions end with `close`, or expire once nothing has been received for `idle_timeout`
+    seconds; expired sessions are dropped before a new session would be refused for lack of room.
+    """
+
+    def __init__(self, sources, capacity=5000, max_sessions=1000, max_concurrent=8,
+                 max_batch_bytes=8 * 1024 * 1024, rate=2000.0, burst=20000,
+                 window=300.0, half_life=120.0, idle_timeout=3600.0, clock=time.time):
+        """
+        Args:
+            sources (iterable): Accepted event source names.
+            capacity (int, optional): Events retained per source and session. Defaults to 5000.
+            max_sessions (int, optional): Sessions held before new ones are refused. Defaults to 1000.
+            max_concurrent (int, optional): Batches processed at once before 503. Defaults to 8.
+            max_batch_bytes (int, optional): Largest decompressed batch accepted. Defaults to 8 MiB.
+            rate (float, optional): Sustained events per second per session before 429. Defaults to 2000.
+            burst (int, optional): Events a session may send at once. Defaults to 20000.
+            window (float, optional): Risk sliding window in seconds. Defaults to 300.
+            half_life (float, optional): Risk half-life in seconds. Defaults to 120.
+            idle_timeout (float, optional): Seconds without events after which a session expires;
+                None keeps sessions until they are closed. Defaults to 3600.
+            clock (callable, optional): Returns the current time. Defaults to time.time.
+        """
+        self.sources = tuple(sources)
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.max_batch_bytes = max_batch_bytes
+        self.rate = rate
+        self.burst = burst
+        self.window = window
+        self.half_life = half_life
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.accepted = 0
+        self.refused = 0
+        self.expired = 0
+        self.logger = logging.getLogger("SessionRegistry")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    def session(self, session_id, create=True):
+        session = self.sessions.get(session_id)
+        if session is not None or not create:
+            return session
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                self._make_room(1, self.clock())
+                session = self._new_session(session_id)
+                self._register(session)
+            return session
+
+    def _new_session(self, session_id):
+        return Session(session_id, self.sources, self.capacity, self.window, self.half_life,
+                       self.rate, self.burst, self.clock)
+
+    def _register(self, session):
+        self.sessions[session.session_id] = session
+        self.logger.info("New session %s (%d active).", session.session_id, len(self.sessions))
+
+    def _make_room(self, count, now):
+        """Expires idle sessions if `count` new ones do not fit, or refuses with 503. Holds _lock."""
+        if len(self.sessions) + count > self.max_sessions:
+            self._expire(now)
+        if len(self.sessions) + count > self.max_sessions:
+            self.refused += 1
+            raise IngestError("session limit reached", 503, retry_after=30)
+
+    def _reserve(self, batches, now):
+        """
+        Takes every session's tokens for its records and registers the sessions that are new, or
+        raises IngestError having taken and registered nothing. Returns {session_id: Session}.
+        """
+        for records in batches.values():
+            if len(records) > self.burst:
+                raise IngestError(f"more than {self.burst} events for one session in a batch", 413)
+        with self._lock:
+            self._make_room(sum(1 for session_id in batches if session_id not in self.sessions), now)
+            sessions = {}
+            for session_id, records in batches.items():
+                # New sessions are only registered once the whole batch is admitted.
+                session = self.sessions.get(session_id) or self._new_session(session_id)
+                wait = session.admit(len(records), now)
+                if wait:
+                    for other_id, other in sessions.items():
+                        other.refund(len(batches[other_id]))
+                    self.refused += 1
+                    raise IngestError(f"session {session_id} over its event rate", 429,
+                                      retry_after=max(1, int(wait + 0.999)))
+                sessions[session_id] = session
+            for session_id, session in sessions.items():
+                if session_id not in self.sessions:
+                    self._register(session)
+            return sessions
+
+    def close(self, session_id):
+        """Ends a session and drops its events. Returns its final summary, or None if unknown."""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return None
+        self.logger.info("Closed session %s (%d active).", session_id, len(self.sessions))
+        return session.summary(self.clock())
+
+    def expire(self, now=None):
+        """Drops the sessions idle for longer than `idle_timeout`. Returns how many were dropped."""
+        with self._lock:
+            return self._expire(self.clock() if now is None else now)
+
+    def _expire(self, now):
+        if self.idle_timeout is None:
+            return 0
+        idle = [session_id for session_id, session in self.sessions.items()
+                if now - session.last_seen > self.idle_timeout]
+        for session_id in idle:
+            del self.sessions[session_id]
+        if idle:
+            self.expired += len(idle)
+            self.logger.info("Expired %d idle sessions (%d active).", len(idle), len(self.sessions))
+        return len(idle)
+
+    def decode(self, body, encoding=None):
+        """Decompresses a gzip/deflate body, refusing anything that inflates past max_batch_bytes."""
+        if encoding in ("gzip", "deflate"):
+            inflater = zlib.decompressobj(zlib.MAX_WBITS | 32)  # Accepts both gzip and zlib headers.
+            try:
+                body = inflater.decompress(body, self.max_batch_bytes + 1)
+            except zlib.error as e:
+                raise IngestError(f"invalid {encoding} body: {e}", 400)
+        elif encoding not in (None, "", "identity"):
+            raise IngestError(f"unsupported encoding {encoding}", 415)
+        if len(body) > self.max_batch_bytes:
+            raise IngestError("batch too large", 413)
+        return body
+
+    def parse(self, body, default_session=None):
+        """
+        Groups NDJSON records into {session_id: [(source, event), ...]}.
+
+        Each line is {"session": id, "source": name, "event": {...}}; "session" may be left out
+        when `default_session` is given. Returns (batches, rejected line count).
+        """
+        batches = {}
+        rejected = 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                session_id = str(record.get("session", default_session or ""))
+                source = record["source"]
+                event = record["event"]
+            except (ValueError, KeyError, AttributeError):
+                rejected += 1
+                continue
+            if not session_id or source not in self.sources or not isinstance(event, dict):
+                rejected += 1
+                continue
+            batches.setdefault(session_id, []).append((source, event))
+        return batches, rejected
+
+    def ingest(self, body, encoding=None, default_session=None):
+        """
+        Decodes, validates and records one batch. Returns {"accepted", "rejected", "sessions"}.
+
+        Raises:
+            IngestError: The batch was refused as a whole; nothing from it was recorded.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.refused += 1
+            raise IngestError("server busy", 503, retry_after=1)
+        try:
+            batches, rejected = self.parse(self.decode(body, encoding), default_session)
+            now = self.clock()
+            sessions = self._reserve(batches, now)
+            accepted = 0
+            for session_id, records in batches.items():
+                session = sessions[session_id]
+                store = session.store
+                for source, event in records:
+                    event.pop("seq", None)  # Sequence numbers are assigned by this server's store.
+                    store.source(source).append(event)
+                session.received += len(records)
+                session.last_seen = now
+                accepted += len(records)
+            with self._lock:
+                self.accepted += accepted
+            return {"accepted": accepted, "rejected": rejected, "sessions": len(batches)}
+        finally:
+            self._slots.release()
+
+    def summaries(self):
+        now = self.clock()
+        self.expire(now)
+        return [session.summary(now) for session in list(self.sessions.values())]
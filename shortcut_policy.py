@@ -0,0 +1,146 @@
+import os
+import json
+import threading
+from collections import namedtuple
+
+# Modifier bits. Left, right and generic variants of a modifier share a bit.
+CTRL, ALT, SHIFT, CMD = 1, 2, 4, 8
+MODIFIERS = {"ctrl": CTRL, "alt": ALT, "shift": SHIFT, "cmd": CMD}
+MODIFIER_KEYS = {
+    "ctrl": CTRL, "ctrl_l": CTRL, "ctrl_r": CTRL,
+    "alt": ALT, "alt_l": ALT, "alt_r": ALT, "alt_gr": ALT,
+    "shift": SHIFT, "shift_l": SHIFT, "shift_r": SHIFT,
+    "cmd": CMD, "cmd_l": CMD, "cmd_r": CMD,
+}
+ALIASES = {"control": "ctrl", "option": "alt", "win": "cmd", "super": "cmd", "meta": "cmd", "escape": "esc",
+           "return": "enter", "del": "delete", "prtsc": "print_screen"}
+ACTIONS = ("block", "allow", "log")
+
+# The shortcuts CopyTracker used to block, now with risk for the attempt.
+DEFAULT_POLICY = [
+    {"keys": "ctrl+c", "action": "block", "risk": 5},
+    {"keys": "ctrl+v", "action": "block", "risk": 5},
+    {"keys": "ctrl+x", "action": "block", "risk": 5},
+    {"keys": "ctrl+a", "action": "block", "risk": 0},
+    {"keys": "alt+tab", "action": "block", "risk": 5},
+    {"keys": "alt+f4", "action": "block", "risk": 5},
+]
+
+Rule = namedtuple("Rule", ["keys", "action", "risk", "mask", "key"])
+
+
+def key_id(key):
+    """
+    Normalized name of a pynput key: "tab", "f4" for special keys and the lower-cased character
+    for the others. With Ctrl held, some platforms report a control character ("\\x03" for C) or
+    only a virtual-key code; both are mapped back to the letter.
+    """
+    name = getattr(key, "name", None)
+    if name is not None:
+        return name
+    char = getattr(key, "char", None)
+    if char:
+        code = ord(char[0])
+        if code < 32:
+            return chr(code + 96)
+        return char.lower()
+    vk = getattr(key, "vk", None)
+    if vk is not None and (0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5A):
+        return chr(vk).lower()
+    return None
+
+
+def parse_keys(text):
+    """'Ctrl+Shift+I' -> (CTRL | SHIFT, "i"). Exactly one non-modifier key is required."""
+    mask, key = 0, None
+    for part in text.lower().replace(" ", "").split("+"):
+        part = ALIASES.get(part, part)
+        if part in MODIFIERS:
+            mask |= MODIFIERS[part]
+        elif key is None and part:
+            key = part
+        else:
+            raise ValueError(f"Shortcut {text!r} must name exactly one non-modifier key")
+    if key is None:
+        raise ValueError(f"Shortcut {text!r} has no non-modifier key")
+    return mask, key
+
+
+class ShortcutPolicy:
+    """
+    Declarative keyboard shortcut policy, compiled for the keyboard hook.
+
+    Rules are {"keys": "ctrl+shift+i", "action": "block" | "allow" | "log", "risk": int}. A rule
+    also applies when more modifiers are held than it names (Ctrl+Shift+C still counts as
+    Ctrl+C), unless a rule naming more of them exists. Compilation expands each rule over every
+    superset of its modifier mask, keeping the most specific rule, into a dict keyed by
+    (key, modifier mask), so a keypress costs one dict lookup however many rules there are.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = []
+        for spec in DEFAULT_POLICY if rules is None else rules:
+            action = spec.get("action", "block")
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown shortcut action {action!r}; use one of {ACTIONS}")
+            mask, key = parse_keys(spec["keys"])
+            self.rules.append(Rule(spec["keys"], action, int(spec.get("risk", 0)), mask, key))
+        table = {}
+        for rule in self.rules:
+            for held in range(16):
+                if held & rule.mask != rule.mask:
+                    continue
+                current = table.get((rule.key, held))
+                # The rule naming more modifiers wins; among equals, the later one.
+                if current is None or bin(rule.mask).count("1") >= bin(current.mask).count("1"):
+                    table[(rule.key, held)] = rule
+        self._table = table
+        # Every non-modifier key some rule names; no other key can match `lookup`.
+        self.keys = frozenset(rule.key for rule in self.rules)
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads a JSON list of rules."""
+        with open(path, encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    def lookup(self, key, modifiers):
+        """The rule for non-modifier `key` (a key_id) pressed with `modifiers` held, or None."""
+        return self._table.get((key, modifiers))
+
+    def to_list(self):
+        return [{"keys": rule.keys, "action": rule.action, "risk": rule.risk} for rule in self.rules]
+
+
+class PolicyFile:
+    """
+    A ShortcutPolicy loaded from a JSON file and reloaded when the file changes. `current` is a
+    single attribute read, so the keyboard hook picks up a reload on its next keypress without
+    the listener being restarted.
+    """
+
+    def __init__(self, path=None, policy=None):
+        self.path = path
+        self.current = policy if policy is not None else ShortcutPolicy()
+        self._mtime = None
+        self._lock = threading.Lock()
+        if path:
+            self.reload()
+
+    def set(self, policy):
+        self.current = policy
+
+    def reload(self, force=False):
+        """Re-reads the file if it changed since the last load; returns whether it was reloaded."""
+        if not self.path:
+            return False
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if not force and mtime == self._mtime:
+                return False
+            self.current = ShortcutPolicy.from_file(self.path)
+            self._mtime = mtime
+            return True
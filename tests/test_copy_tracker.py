@@ -0,0 +1,87 @@
+import clipboard_sources
+from clipboard_sources import SourceUnavailable
+from copy_tracker import WM_KEYDOWN, CopyTracker
+from event_store import EventLog
+
+
+def test_stop_after_failed_start(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise SourceUnavailable("no clipboard")
+
+    monkeypatch.setattr("copy_tracker.make_source", unavailable)
+    tracker = CopyTracker(event_log=EventLog("copy"))
+    tracker.start()
+    assert tracker.thread is None
+    tracker.stop()
+
+
+def test_start_and_stop_with_a_source():
+    tracker = CopyTracker(event_log=EventLog("copy"), source=clipboard_sources.FakeClipboardSource())
+    tracker.start()
+    assert tracker.thread.is_alive()
+    tracker.stop()
+    assert tracker.thread is None
+
+
+class Key:
+    def __init__(self, name):
+        self.name = name
+
+
+class KeyRecorder:
+    def __init__(self):
+        self.keys = []
+
+    def key(self, name, pressed, timestamp=None):
+        self.keys.append((name, pressed))
+
+
+def test_only_shortcut_keys_are_recorded():
+    tracker = CopyTracker(event_log=EventLog("copy"))
+    tracker.recorder = KeyRecorder()
+    tracker.shortcuts_disabled = True
+    for name in ("h", "i", "ctrl_l", "c"):
+        tracker.on_press(Key(name))
+        tracker.on_release(Key(name))
+    assert tracker.recorder.keys == [("ctrl_l", True), ("ctrl_l", False), ("c", True), ("c", False)]
+
+
+def test_shortcut_event_takes_the_given_time():
+    tracker = CopyTracker(event_log=EventLog("copy"))
+    tracker.shortcuts_disabled = True
+    tracker.on_press(Key("ctrl_l"), now=100.0)
+    tracker.on_press(Key("c"), now=100.5)
+    assert [event["timestamp"] for event in tracker.event_log.snapshot()] == [100.5]
+
+
+class Listener:
+    def __init__(self):
+        self.suppressed = 0
+
+    def suppress_event(self):
+        self.suppressed += 1
+
+
+class HookData:
+    def __init__(self, vk):
+        self.vkCode = vk
+
+
+def test_blocked_shortcut_is_suppressed_without_stopping_the_listener(monkeypatch):
+    keys = {0xA2: Key("ctrl_l"), 0x43: Key("c"), 0x44: Key("d")}
+    monkeypatch.setattr("copy_tracker._win32_key", keys.get)
+    tracker = CopyTracker(event_log=EventLog("copy"))
+    tracker.shortcuts_disabled = True
+    tracker.keyboard_listener = listener = Listener()
+
+    def key_down(vk):
+        # As the Windows hook does: the filter first, then on_press unless the event was suppressed.
+        suppressed = listener.suppressed
+        tracker._win32_event_filter(WM_KEYDOWN, HookData(vk))
+        if listener.suppressed == suppressed:
+            assert tracker.on_press(keys[vk]) is True
+
+    for vk in (0xA2, 0x43, 0x44):
+        key_down(vk)
+    assert listener.suppressed == 1
+    assert [event["shortcut"] for event in tracker.event_log.snapshot()] == ["ctrl+c"]
@@ -0,0 +1,48 @@
+import os
+import time
+
+from content_store import ContentStore
+from event_journal import EventJournal, journal_sessions, new_session_id, prune_sessions
+from event_store import EventStore
+
+
+def write_session(root, name, events):
+    journal = EventJournal(os.path.join(root, name), fsync_interval=None)
+    journal.start()
+    for source, event in events:
+        journal.on_event(source, event)
+    journal.close()
+    return journal
+
+
+def test_replay_restores_only_its_own_session(tmp_path):
+    write_session(str(tmp_path), "previous", [("copy", {"timestamp": 1.0, "risk": 500})])
+    write_session(str(tmp_path), "current", [("mouse", {"timestamp": 2.0, "risk": 5})])
+
+    store = EventStore()
+    assert EventJournal(os.path.join(str(tmp_path), "current")).replay_into(store) == 1
+    assert len(store.source("mouse")) == 1
+    assert len(store.source("copy")) == 0
+
+    fresh = EventStore()
+    assert EventJournal(os.path.join(str(tmp_path), new_session_id())).replay_into(fresh) == 0
+
+
+def test_prune_keeps_the_most_recent_sessions(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "other"))  # Not a journal; left alone.
+    for index in range(5):
+        write_session(root, f"session-{index}", [("mouse", {"timestamp": index})])
+        ContentStore(directory=os.path.join(root, f"session-{index}", "content")).put(f"copied text {index}")
+        os.utime(os.path.join(root, f"session-{index}"), (time.time() + index, time.time() + index))
+
+    removed = prune_sessions(root, 3, current="session-0")
+    assert removed == ["session-1", "session-2"]
+    assert journal_sessions(root) == ["session-0", "session-3", "session-4"]
+    assert os.path.isdir(os.path.join(root, "other"))
+    assert os.listdir(os.path.join(root, "session-3", "content"))
+    assert not os.path.exists(os.path.join(root, "session-1"))
+
+
+def test_session_ids_are_unique():
+    assert len({new_session_id() for _ in range(100)}) == 100
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from event_store import EventLog, EventStore
+
+
+def test_getitem_reads_one_slot():
+    log = EventLog("mouse", capacity=3)
+    for timestamp in range(5):
+        log.append({"timestamp": timestamp})
+    assert log[0]["timestamp"] == 2
+    assert log[-1]["timestamp"] == 4
+    assert [event["timestamp"] for event in log[1:]] == [3, 4]
+    with pytest.raises(IndexError):
+        log[3]
+    with pytest.raises(IndexError):
+        log[-4]
+
+
+def test_evicted_events_are_written_after_the_writer_lock_is_released(tmp_path):
+    store = EventStore(capacity=2, spill_dir=str(tmp_path))
+    log = store.source("mouse")
+
+    class File:
+        def __init__(self):
+            self.lines = []
+
+        def write(self, line):
+            assert not store._lock.locked()
+            self.lines.append(json.loads(line)["timestamp"])
+
+        def close(self):
+            pass
+
+    log._spill_file = spill = File()
+    for timestamp in range(5):
+        log.append({"timestamp": timestamp})
+    store.restore("mouse", {"timestamp": 5, "seq": 99})
+    store.close()
+    assert spill.lines == [0, 1, 2, 3]
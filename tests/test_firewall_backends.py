@@ -0,0 +1,122 @@
+import pytest
+
+from firewall_backends import (DryRunBackend, FirewallError, IptablesBackend, NftablesBackend, ruleset)
+from network_lockdown import NetworkLockdown
+
+SAVED_V4 = ("*filter\n:INPUT ACCEPT [0:0]\n:FORWARD ACCEPT [0:0]\n:OUTPUT ACCEPT [0:0]\n"
+            "-A INPUT -p tcp --dport 22 -j ACCEPT\nCOMMIT\n")
+SAVED_V6 = ("*filter\n:INPUT ACCEPT [0:0]\n:FORWARD ACCEPT [0:0]\n:OUTPUT ACCEPT [0:0]\n"
+            "-A INPUT -p tcp --dport 80 -j ACCEPT\nCOMMIT\n")
+
+
+class FakeCommands:
+    """Stands in for `run`: answers the save commands and records every restore."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.restored = []
+
+    def __call__(self, args, input_text=None):
+        if args[0] == "iptables-save":
+            return SAVED_V4
+        if args[0] == "ip6tables-save":
+            return SAVED_V6
+        if args[0] in self.failing:
+            raise FirewallError(f"{args[0]} failed (1): rejected")
+        self.restored.append((args[0], input_text))
+        return ""
+
+
+def test_ruleset_validates_addresses_and_ports():
+    rules = ruleset(allowed_addresses=["10.0.0.1", "2001:db8::/32"], allowed_inbound_ports=[8080])
+    assert rules.allowed_addresses == ("10.0.0.1/32", "2001:db8::/32")
+    assert rules.allowed_inbound_ports == (8080,)
+    with pytest.raises(ValueError):
+        ruleset(allowed_addresses=["exam.example.com"])
+    with pytest.raises(ValueError):
+        ruleset(allowed_inbound_ports=[70000])
+
+
+def test_dry_run_records_batches():
+    backend = DryRunBackend()
+    rules = ruleset(allowed_addresses=["10.0.0.1"], allowed_inbound_ports=[5000])
+    backend.apply(rules)
+    assert backend.active == NftablesBackend().render(rules)
+    assert "ip daddr { 10.0.0.1/32 } accept" in backend.active
+    assert "tcp dport { 5000 } accept" in backend.active
+    backend.apply(ruleset())
+    assert len(backend.history) == 2
+    backend.remove()
+    assert backend.active is None
+    assert backend.last_seconds is not None
+
+
+def test_failing_dry_run_keeps_the_active_batch():
+    backend = DryRunBackend()
+    backend.apply(ruleset())
+    active = backend.active
+    backend.fail = True
+    with pytest.raises(FirewallError):
+        backend.apply(ruleset(allowed_addresses=["10.0.0.1"]))
+    assert backend.active == active
+    assert len(backend.history) == 1
+
+
+def test_iptables_render_keeps_existing_rules_and_splits_families():
+    backend = IptablesBackend()
+    rules = ruleset(allowed_addresses=["10.0.0.1", "2001:db8::1"])
+    v4 = backend.render(rules, SAVED_V4, 4)
+    assert "-A INPUT -p tcp --dport 22 -j ACCEPT" in v4
+    assert "-A DRAGON_OUT -d 10.0.0.1/32 -j RETURN" in v4
+    assert "2001:db8::1" not in v4
+    lines = v4.splitlines()
+    # The jump comes ahead of the rules that were already there.
+    assert lines.index("-A INPUT -j DRAGON_IN") < lines.index("-A INPUT -p tcp --dport 22 -j ACCEPT")
+    # Rendering over a table that already holds the lockdown replaces it rather than adding a copy.
+    assert backend.render(rules, v4, 4) == v4
+    v6 = backend.render(rules, SAVED_V6, 6)
+    assert "-A DRAGON_OUT -d 2001:db8::1/128 -j RETURN" in v6
+    assert "ipv6-icmp" not in v4
+
+
+def test_icmpv6_is_accepted_before_the_drop():
+    rules = ruleset(allowed_addresses=["2001:db8::1"])
+    lines = IptablesBackend().render(rules, SAVED_V6, 6).splitlines()
+    for chain in ("DRAGON_IN", "DRAGON_OUT"):
+        assert lines.index(f"-A {chain} -p ipv6-icmp -j RETURN") < lines.index(f"-A {chain} -j DROP")
+    nft = NftablesBackend().render(rules)
+    assert nft.count("meta l4proto ipv6-icmp accept") == 2
+
+
+def test_lockdown_leaves_the_dashboard_port_open():
+    backend = DryRunBackend()
+    lockdown = NetworkLockdown(None, backend=backend, allowed_inbound_ports=[5000])
+    lockdown.allow_inbound(8080, 5000)
+    assert lockdown.rules.allowed_inbound_ports == (5000, 8080)
+    assert lockdown.activate()
+    assert "tcp dport { 5000, 8080 } accept" in backend.active
+
+
+def test_iptables_applies_both_families():
+    run = FakeCommands()
+    backend = IptablesBackend(run=run)
+    backend.apply(ruleset(allowed_addresses=["10.0.0.1"]))
+    assert [restore for restore, _ in run.restored] == ["iptables-restore", "ip6tables-restore"]
+    assert all("DRAGON_IN" in table for _, table in run.restored)
+
+
+def test_iptables_rolls_back_ipv4_when_ipv6_fails():
+    run = FakeCommands(failing=["ip6tables-restore"])
+    backend = IptablesBackend(run=run)
+    with pytest.raises(FirewallError):
+        backend.apply(ruleset(allowed_addresses=["10.0.0.1"]))
+    assert [restore for restore, _ in run.restored] == ["iptables-restore", "iptables-restore"]
+    assert "DRAGON_IN" in run.restored[0][1]
+    assert run.restored[1][1] == SAVED_V4
+
+
+def test_iptables_failure_on_ipv4_changes_nothing():
+    run = FakeCommands(failing=["iptables-restore"])
+    with pytest.raises(FirewallError):
+        IptablesBackend(run=run).apply(ruleset())
+    assert run.restored == []
@@ -0,0 +1,32 @@
+import graph_renderer
+from graph_renderer import GraphRenderer
+
+
+def test_stats_track_the_cache():
+    renderer = GraphRenderer(cache_size=2)
+    events = [{"timestamp": t, "risk": t % 3} for t in range(10)]
+    assert renderer.stats() == {"entries": 0, "bytes": 0, "hits": 0, "misses": 0}
+
+    png = renderer.render("mouse", events, version=1)
+    renderer.render("mouse", events, version=1)
+    stats = renderer.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len(png)
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    renderer.render("mouse", events, version=2)
+    renderer.render("mouse", events, version=3)
+    assert renderer.stats()["entries"] == 2
+
+
+def test_out_of_order_events_are_drawn_in_time_order(monkeypatch):
+    seen = {}
+
+    def downsample(times, values, max_points):
+        seen["times"], seen["values"] = list(times), list(values)
+        return times, values
+
+    monkeypatch.setattr(graph_renderer, "minmax_downsample", downsample)
+    GraphRenderer().render("mouse", [{"timestamp": 12, "risk": 2}, {"timestamp": 10, "risk": 1},
+                                     {"timestamp": 15, "risk": 4}], version=1)
+    assert seen == {"times": [10.0, 12.0, 15.0], "values": [1.0, 2.0, 4.0]}
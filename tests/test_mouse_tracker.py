@@ -0,0 +1,67 @@
+from event_store import EventLog
+from mouse_tracker import ERRATIC_RISK_PER_SEC, MouseBehaviorTracker
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_tracker(clock):
+    return MouseBehaviorTracker(event_log=EventLog("mouse"), clock=clock)
+
+
+def test_scroll_without_movement_is_recorded():
+    clock = Clock(1.0)
+    tracker = make_tracker(clock)
+    tracker.on_scroll(100, 100, 0, -1)
+    tracker.on_scroll(100, 100, 0, -1)
+    assert tracker.process_pending() == 0
+    assert len(tracker.event_log) == 0  # Still open.
+
+    clock.now = 2.0
+    tracker.process_pending()
+    events = list(tracker.event_log)
+    assert [event["event"] for event in events] == ["Mouse scroll"]
+    assert events[0]["samples"] == 2
+    assert events[0]["dy"] == -2
+
+
+def test_movement_episode_closes_when_pointer_goes_quiet():
+    clock = Clock(0.0)
+    tracker = make_tracker(clock)
+    x = 0
+    for step in range(200):  # 2 s at 100 Hz, 4000 px/s.
+        clock.now = step * 0.01
+        x += 40
+        tracker.on_move(x, 500)
+        if step % 5 == 4:
+            tracker.process_pending()
+    assert len(tracker.event_log) == 0
+
+    # No more samples: the episode is recorded once it has been quiet for episode_gap.
+    clock.now = 5.0
+    tracker.process_pending()
+    events = list(tracker.event_log)
+    assert [event["event"] for event in events] == ["Movement episode"]
+    assert events[0]["risk"] == int(events[0]["duration"]) * ERRATIC_RISK_PER_SEC > 0
+    assert tracker.risk_score == events[0]["risk"]
+
+
+def test_recorder_receives_scroll_only_batches():
+    calls = []
+
+    class Recorder:
+        def mouse(self, samples, scrolls, reset, now):
+            calls.append((len(samples), list(scrolls), reset, now))
+
+    clock = Clock(3.0)
+    tracker = make_tracker(clock)
+    tracker.recorder = Recorder()
+    tracker.process_pending()
+    tracker.on_scroll(10, 20, 0, 1)
+    tracker.process_pending()
+    assert calls == [(0, [(3.0, 10, 20, 0, 1)], False, 3.0)]
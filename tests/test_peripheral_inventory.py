@@ -0,0 +1,118 @@
+import pytest
+
+from event_store import EventLog
+from peripheral_detector import NEW_DEVICE_RISK, PeripheralDetector
+from peripheral_inventory import Device, FakeSysfs, Inventory, SysfsBackend, edid_name, fake_edid
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    fs = FakeSysfs(str(tmp_path))
+    fs.plug_usb("usb1", "1d6b", "0002", "xHCI Host Controller", device_class="09")
+    fs.plug_usb("1-1", "046d", "c077", "USB Optical Mouse", manufacturer="Logitech")
+    fs.connect_display("card0-eDP-1", "Laptop Panel")
+    return fs
+
+
+def make_detector(fs, clock):
+    backend = SysfsBackend(fs.root, uevents=False)
+    detector = PeripheralDetector(event_log=EventLog("peripheral"), backend=backend, clock=clock, debounce=2.0)
+    return detector, backend
+
+
+def test_scan_lists_devices_but_not_hubs_or_interfaces(sysfs):
+    devices = SysfsBackend(sysfs.root, uevents=False).scan()
+    assert sorted(device.kind for device in devices.values()) == ["display", "usb"]
+    names = {device.name for device in devices.values()}
+    assert "Logitech USB Optical Mouse" in names
+    assert "Laptop Panel on eDP-1" in names
+
+
+def test_unchanged_devices_are_read_once(sysfs):
+    backend = SysfsBackend(sysfs.root, uevents=False)
+    backend.scan()
+    first = backend.files_read
+    backend.scan()
+    # Only the display's status and EDID are read again.
+    assert backend.files_read - first == 2
+
+
+def test_flap_within_debounce_is_not_reported(sysfs):
+    clock = Clock()
+    detector, _ = make_detector(sysfs, clock)
+    detector.scan()
+    sysfs.plug_usb("1-2", "0781", "5567", "Cruzer Blade", serial="SN1")
+    clock.now = 1.0
+    detector.scan()
+    sysfs.unplug_usb("1-2")
+    clock.now = 1.5
+    detector.scan()
+    clock.now = 10.0
+    detector.scan()
+    assert len(detector.event_log) == 0
+    assert detector.inventory.flaps == 1
+    assert detector.risk_score == 0
+
+
+def test_new_device_then_replug(sysfs):
+    clock = Clock()
+    detector, _ = make_detector(sysfs, clock)
+    detector.scan()
+    sysfs.plug_usb("1-2", "0781", "5567", "Cruzer Blade", serial="SN1")
+    for now in (1.0, 2.0, 3.5):
+        clock.now = now
+        detector.scan()
+    sysfs.unplug_usb("1-2")
+    for now in (5.0, 7.5):
+        clock.now = now
+        detector.scan()
+    # The same stick in another port is keyed by its serial, so it is a re-plug.
+    sysfs.plug_usb("2-4", "0781", "5567", "Cruzer Blade", serial="SN1")
+    for now in (9.0, 11.5):
+        clock.now = now
+        detector.scan()
+
+    events = list(detector.event_log)
+    assert [event["event"] for event in events] == ["Device added", "Device removed", "Device re-plugged"]
+    assert [event["risk"] for event in events] == [NEW_DEVICE_RISK, 0, 0]
+    # Changes are stamped with the scan that first saw them.
+    assert [event["timestamp"] for event in events] == [1.0, 5.0, 9.0]
+    assert detector.risk_score == NEW_DEVICE_RISK
+
+
+def test_second_display_carries_risk_and_is_keyed_by_edid(sysfs):
+    clock = Clock()
+    detector, backend = make_detector(sysfs, clock)
+    detector.scan()
+    sysfs.connect_display("card0-HDMI-A-1", "DELL U2415", serial=7)
+    for now in (1.0, 3.0):
+        clock.now = now
+        detector.scan()
+    assert [event["risk"] for event in detector.event_log] == [NEW_DEVICE_RISK]
+    assert detector.displays() == 2
+
+    # Another monitor on the same connector is a different device.
+    keys = set(backend.scan())
+    sysfs.connect_display("card0-HDMI-A-1", "DELL U2415", serial=8)
+    assert set(backend.scan()) != keys
+
+
+def test_inventory_next_due():
+    inventory = Inventory(debounce=2.0)
+    assert inventory.update({}, 0.0) == []
+    assert inventory.next_due() is None
+    inventory.update({"a": Device("a", "usb", "A")}, 1.0)
+    assert inventory.next_due() == 3.0
+
+
+def test_edid_name():
+    assert edid_name(fake_edid("DELL U2415")) == "DELL U2415"
+    assert edid_name(b"") is None
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from sessions import IngestError, SessionRegistry
+
+SOURCES = ("mouse", "copy")
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def batch(session_id, count=1):
+    return mixed((session_id, count))
+
+
+def mixed(*counts):
+    return "\n".join(json.dumps({"session": session_id, "source": "mouse", "event": {"risk": 1}})
+                     for session_id, count in counts for _ in range(count)).encode()
+
+
+def test_session_limit_refusal_is_counted():
+    registry = SessionRegistry(SOURCES, max_sessions=2, idle_timeout=None, clock=Clock())
+    registry.ingest(batch("a"))
+    registry.ingest(batch("b"))
+    with pytest.raises(IngestError) as refused:
+        registry.ingest(batch("c"))
+    assert refused.value.status == 503
+    assert registry.refused == 1
+    assert set(registry.sessions) == {"a", "b"}
+
+
+def test_idle_sessions_expire_to_make_room():
+    clock = Clock()
+    registry = SessionRegistry(SOURCES, max_sessions=2, idle_timeout=60, clock=clock)
+    registry.ingest(batch("a"))
+    clock.now += 30
+    registry.ingest(batch("b"))
+    clock.now += 45  # "a" has been idle for 75 s, "b" for 45 s.
+    registry.ingest(batch("c"))
+    assert set(registry.sessions) == {"b", "c"}
+    assert registry.expired == 1
+    assert registry.refused == 0
+
+
+def test_close_ends_a_session():
+    registry = SessionRegistry(SOURCES, max_sessions=1, clock=Clock())
+    registry.ingest(batch("a", count=3))
+    summary = registry.close("a")
+    assert summary["session"] == "a"
+    assert summary["events"] == 3
+    assert registry.close("a") is None
+    registry.ingest(batch("b"))
+    assert set(registry.sessions) == {"b"}
+
+
+@pytest.mark.parametrize("refused_batch, status", [
+    (mixed(("a", 5), ("c", 1), ("b", 5)), 429),   # "b" has 2 tokens left.
+    (mixed(("a", 5), ("c", 1), ("b", 11)), 413),  # More than a burst for "b".
+])
+def test_refused_batch_records_nothing(refused_batch, status):
+    registry = SessionRegistry(SOURCES, rate=1.0, burst=10, clock=Clock())
+    registry.ingest(batch("a", 4))
+    registry.ingest(batch("b", 8))
+    with pytest.raises(IngestError) as refused:
+        registry.ingest(refused_batch)
+    assert refused.value.status == status
+    assert set(registry.sessions) == {"a", "b"}
+    assert registry.accepted == 12
+    # The clock has not moved, so these only fit if the refused batch gave back every token it took.
+    assert registry.ingest(mixed(("a", 6), ("b", 2))) == {"accepted": 8, "rejected": 0, "sessions": 2}
+    with pytest.raises(IngestError):
+        registry.ingest(batch("a"))
+
+
+def test_new_sessions_of_a_refused_batch_do_not_take_room():
+    registry = SessionRegistry(SOURCES, max_sessions=2, idle_timeout=None, clock=Clock())
+    registry.ingest(batch("a"))
+    with pytest.raises(IngestError) as refused:
+        registry.ingest(mixed(("b", 1), ("c", 1)))
+    assert refused.value.status == 503
+    assert set(registry.sessions) == {"a"}
+    registry.ingest(batch("b"))
+    assert set(registry.sessions) == {"a", "b"}
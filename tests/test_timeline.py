@@ -0,0 +1,61 @@
+from event_store import EventLog
+from timeline import page, timeline
+
+
+def test_out_of_order_source_is_merged_in_timestamp_order():
+    mouse = EventLog("mouse")
+    # A long movement episode closes after a scroll episode that started later.
+    mouse.append({"timestamp": 12.0, "event": "Mouse scroll"})
+    mouse.append({"timestamp": 10.0, "event": "Movement episode"})
+    mouse.append({"timestamp": 15.0, "event": "Movement episode"})
+    window = EventLog("window")
+    for timestamp in (11.0, 13.0, 14.0):
+        window.append({"timestamp": timestamp, "event": "Window"})
+
+    merged = [(source, event["timestamp"]) for source, event in timeline({"mouse": mouse, "window": window})]
+    assert [timestamp for _, timestamp in merged] == [10.0, 11.0, 12.0, 13.0, 14.0, 15.0]
+    assert merged[0] == ("mouse", 10.0)
+
+
+def test_pages_follow_the_merged_order():
+    mouse = EventLog("mouse")
+    for timestamp in (5.0, 1.0, 4.0, 2.0, 3.0):
+        mouse.append({"timestamp": timestamp})
+    logs = {"mouse": mouse}
+    first, more = page(timeline(logs), 0, 2)
+    second, _ = page(timeline(logs), 2, 2)
+    assert more
+    assert [event["timestamp"] for _, event in first + second] == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_equal_timestamps_keep_source_order():
+    a, b = EventLog("a"), EventLog("b")
+    a.append({"timestamp": 1.0, "n": 1})
+    b.append({"timestamp": 1.0, "n": 2})
+    a.append({"timestamp": 1.0, "n": 3})
+    assert [event["n"] for _, event in timeline({"a": a, "b": b}, start=0.5, end=1.5)] == [1, 3, 2]
+
+
+def test_ordered_logs_are_merged_without_sorting():
+    log = EventLog("window", capacity=3)
+    for timestamp in (1.0, 2.0, 3.0):
+        log.append({"timestamp": timestamp})
+    assert log.ordered
+    log.append({"timestamp": 0.5})
+    assert not log.ordered
+    # Once the out-of-order event is the oldest retained one, the log is ordered again.
+    log.append({"timestamp": 4.0})
+    log.append({"timestamp": 5.0})
+    assert log.ordered
+
+    class Unsortable(list):
+        ordered = True
+
+        def __iter__(self):
+            yield from super().__iter__()
+            # Sorting reads to the end; a lazy merge stops after the page.
+            raise AssertionError("read past the page")
+
+    ordered = Unsortable([{"timestamp": 1.0}, {"timestamp": 2.0}])
+    first, _ = page(timeline({"window": ordered}), 0, 1)
+    assert [event["timestamp"] for _, event in first] == [1.0]
@@ -0,0 +1,22 @@
+import numpy as np
+
+from timeseries import event_arrays, risk_series
+
+
+def test_event_arrays_sort_an_out_of_order_log():
+    events = [{"timestamp": 12.0, "risk": 2}, {"timestamp": 10.0, "risk": 1}, {"timestamp": 15.0, "risk": 4},
+              {"event": "no timestamp", "risk": 8}]
+    times, risks = event_arrays(events)
+    assert times.tolist() == [10.0, 12.0, 15.0]
+    assert risks.tolist() == [1.0, 2.0, 4.0]
+
+
+def test_risk_series_over_an_out_of_order_log():
+    times, risks = event_arrays([{"timestamp": 12.0, "risk": 2}, {"timestamp": 10.0, "risk": 1},
+                                 {"timestamp": 15.0, "risk": 4}])
+    x, y = risk_series(times, risks, 11.0, 16.0, 10)
+    assert x.tolist() == [12.0, 15.0]
+    assert y.tolist() == [3.0, 7.0]
+    x, y = risk_series(times, risks, 10.0, 12.5, 10)
+    assert x.tolist() == [10.0, 12.0]
+    assert np.all(np.diff(y) >= 0)
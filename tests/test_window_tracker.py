@@ -0,0 +1,35 @@
+import time
+
+from event_store import EventLog
+from window_providers import FakeProvider, ProviderUnavailable
+from window_tracker import WindowTracker
+
+
+def test_stop_after_failed_start(monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise ProviderUnavailable("no display")
+
+    monkeypatch.setattr("window_tracker.make_provider", unavailable)
+    tracker = WindowTracker(event_log=EventLog("window"))
+    tracker.start()
+    assert tracker.thread is None
+    tracker.stop()
+
+
+def test_quick_switch_away_and_back_is_recorded():
+    provider = FakeProvider(initial="Exam - Browser", clock=lambda: 100.0)
+    tracker = WindowTracker(event_log=EventLog("window"), provider=provider)
+    tracker.start()
+    # Away for 50 ms, far shorter than any poll interval.
+    provider.push("ChatGPT - Chrome", "chrome.exe", timestamp=130.0)
+    provider.push("Exam - Browser", timestamp=130.05)
+    deadline = time.monotonic() + 5
+    while len(tracker.event_log) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    tracker.stop()
+
+    events = tracker.event_log.snapshot()
+    assert [(event["window"], event["timestamp"]) for event in events] == [
+        ("Exam - Browser", 100.0), ("ChatGPT - Chrome", 130.0)]
+    assert abs(events[1]["duration"] - 0.05) < 1e-9
+    assert tracker.current_window == "Exam - Browser"
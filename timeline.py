@@ -0,0 +1,55 @@
+import heapq
+from itertools import islice
+
+from exporters import in_time_range
+
+
+def _tagged(name, events):
+    for event in events:
+        yield name, event
+
+
+def _event_time(event):
+    timestamp = event.get("timestamp")
+    return timestamp if isinstance(timestamp, (int, float)) else 0.0
+
+
+def _timestamp(item):
+    return _event_time(item[1])
+
+
+def timeline(logs, start=None, end=None):
+    """
+    Merges several event logs into one (source, event) stream ordered by timestamp.
+
+    A log is not necessarily in timestamp order: events are appended when they are complete but
+    stamped with when they began (a mouse episode is recorded when it goes quiet, so a long
+    movement episode lands after a shorter scroll episode that started later). Logs that report
+    themselves `ordered` (EventLog tracks this as events are appended) are streamed straight into
+    a lazy k-way merge at O(log k) per event; only the others, and plain iterables, have their
+    events in the range sorted first.
+
+    The result is ordered by "timestamp" (events without one count as 0). Events with equal
+    timestamps keep the order of `logs`, and within a source the order they were recorded in,
+    so the ordering, and hence offset pagination, is stable while no events are added.
+
+    Args:
+        logs (dict): Source name -> iterable of event dicts (e.g. EventLog).
+        start (float, optional): Drop events stamped before this epoch time.
+        end (float, optional): Drop events stamped after this epoch time.
+    """
+    streams = []
+    for name, events in logs.items():
+        selected = in_time_range(events, start, end)
+        if not getattr(events, "ordered", False):
+            selected = sorted(selected, key=_event_time)
+        streams.append(_tagged(name, selected))
+    return heapq.merge(*streams, key=_timestamp)
+
+
+def page(items, offset=0, limit=None):
+    """Returns (items[offset:offset + limit], more) from an iterator without materializing it."""
+    if limit is None:
+        return list(islice(items, offset, None)), False
+    selected = list(islice(items, offset, offset + limit + 1))
+    return selected[:limit], len(selected) > limit
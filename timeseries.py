@@ -0,0 +1,64 @@
+import numpy as np
+
+from risk_engine import event_risk
+from downsample import lttb_downsample, minmax_downsample
+
+DOWNSAMPLERS = {"lttb": lttb_downsample, "minmax": minmax_downsample}
+
+
+def event_arrays(events):
+    """
+    Returns (timestamps, risks) as float64 arrays for the events that carry a numeric timestamp,
+    sorted by timestamp.
+
+    Not every log is appended in time order (mouse episodes are stamped with their start but
+    logged when they close), so the arrays are sorted; the sort is stable, so events with the same
+    timestamp keep their logged order.
+    """
+    times = []
+    risks = []
+    for event in events:
+        timestamp = event.get("timestamp")
+        if isinstance(timestamp, (int, float)):
+            times.append(timestamp)
+            risks.append(event_risk(event))
+    times = np.asarray(times, dtype=np.float64)
+    order = np.argsort(times, kind="stable")
+    return times[order], np.asarray(risks, dtype=np.float64)[order]
+
+
+def time_bounds(arrays, start=None, end=None):
+    """Fills in a missing start/end from the earliest/latest timestamp over several sources."""
+    if start is None:
+        firsts = [times[0] for times, _ in arrays if len(times)]
+        start = min(firsts) if firsts else None
+    if end is None:
+        lasts = [times[-1] for times, _ in arrays if len(times)]
+        end = max(lasts) if lasts else None
+    return start, end
+
+
+def risk_series(times, risks, start, end, points, method="lttb", offset=0.0):
+    """
+    Cumulative risk of one source sampled at its events inside [start, end].
+
+    The running total includes everything before `start`, plus `offset` for risk recorded before
+    the oldest retained event, so a partial range lines up with the session totals. At most
+    `points` samples are returned.
+    """
+    cumulative = np.cumsum(risks) + offset
+    lo, hi = np.searchsorted(times, start, side="left"), np.searchsorted(times, end, side="right")
+    return DOWNSAMPLERS[method](times[lo:hi], cumulative[lo:hi], points)
+
+
+def rate_series(times, start, end, points):
+    """
+    Event rate (events per second) of one source in `points` equal-width buckets over [start, end].
+
+    Returns (bucket centers, rates); the size depends only on `points`, never on the event count.
+    """
+    if end <= start:
+        end = start + 1.0
+    lo, hi = np.searchsorted(times, start, side="left"), np.searchsorted(times, end, side="right")
+    counts, edges = np.histogram(times[lo:hi], bins=points, range=(start, end))
+    return (edges[:-1] + edges[1:]) / 2, counts / np.diff(edges)
@@ -0,0 +1,213 @@
+import struct
+import threading
+import numpy as np
+
+# Chunk header: magic, sample count, first timestamp (epoch seconds), first x, first y.
+_HEADER = struct.Struct("<4sIdii")
+_MAGIC = b"TRJ1"
+_INT16 = np.iinfo(np.int16)
+_UINT32 = np.iinfo(np.uint32)
+
+
+def rdp_mask(t, x, y, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of a timed polyline.
+
+    Distances are synchronized: a point is compared with where the pointer would be at the same
+    time on the simplified segment, not with the nearest point of that segment. Every recorded
+    time then replays within `tolerance` pixels of where the pointer really was, so pauses and
+    speed changes along a straight line survive simplification.
+
+    Args:
+        t (np.ndarray): Timestamps in seconds, ascending.
+        x (np.ndarray): X coordinates.
+        y (np.ndarray): Y coordinates.
+        tolerance (float): Maximum distance in pixels between a dropped point and the simplified path.
+
+    Returns:
+        np.ndarray: Boolean mask of the points kept; the first and last are always kept.
+    """
+    n = len(t)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        span = t[last] - t[first]
+        inner = slice(first + 1, last)
+        fraction = (t[inner] - t[first]) / span if span > 0 else np.zeros(last - first - 1)
+        distance = np.hypot(x[inner] - (x[first] + (x[last] - x[first]) * fraction),
+                            y[inner] - (y[first] + (y[last] - y[first]) * fraction))
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return keep
+
+
+def simplify(samples, tolerance):
+    """Drops the (t, x, y) rows that RDP finds within `tolerance` pixels of the simplified path."""
+    if len(samples) < 3:
+        return samples
+    return samples[rdp_mask(samples[:, 0], samples[:, 1], samples[:, 2], tolerance)]
+
+
+def encode(samples):
+    """
+    Encodes (t, x, y) rows as delta chunks: a header holding the first sample, then uint32
+    microsecond time deltas, and int16 x and y deltas, one column after the other. A new chunk
+    starts wherever a delta does not fit, so any input is encodable.
+
+    Returns:
+        bytes: The encoded chunks.
+    """
+    out = []
+    if len(samples) == 0:
+        return b""
+    t0 = samples[0, 0]
+    # Deltas of rounded absolute offsets, not rounded deltas, so the error never accumulates.
+    offsets = np.round((samples[:, 0] - t0) * 1e6).astype(np.int64)
+    xs = np.round(samples[:, 1]).astype(np.int64)
+    ys = np.round(samples[:, 2]).astype(np.int64)
+    dt, dx, dy = np.diff(offsets), np.diff(xs), np.diff(ys)
+    overflow = ((dt < 0) | (dt > _UINT32.max) | (dx < _INT16.min) | (dx > _INT16.max) |
+                (dy < _INT16.min) | (dy > _INT16.max))
+    starts = np.concatenate(([0], np.flatnonzero(overflow) + 1, [len(samples)]))
+    for first, end in zip(starts[:-1], starts[1:]):
+        out.append(_HEADER.pack(_MAGIC, end - first, t0 + offsets[first] / 1e6, xs[first], ys[first]))
+        out.append(dt[first:end - 1].astype("<u4").tobytes())
+        out.append(dx[first:end - 1].astype("<i2").tobytes())
+        out.append(dy[first:end - 1].astype("<i2").tobytes())
+    return b"".join(out)
+
+
+def decode(data):
+    """Decodes the output of `encode` (or several concatenated) back into an (n, 3) float64 array."""
+    parts = []
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        magic, count, t0, x0, y0 = _HEADER.unpack_from(view, offset)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a trajectory chunk at byte {offset}")
+        offset += _HEADER.size
+        deltas = count - 1
+        dt = np.frombuffer(view, dtype="<u4", count=deltas, offset=offset)
+        dx = np.frombuffer(view, dtype="<i2", count=deltas, offset=offset + 4 * deltas)
+        dy = np.frombuffer(view, dtype="<i2", count=deltas, offset=offset + 6 * deltas)
+        offset += 8 * deltas
+        chunk = np.empty((count, 3))
+        chunk[0] = (t0, x0, y0)
+        chunk[1:, 0] = t0 + np.cumsum(dt, dtype=np.int64) / 1e6
+        chunk[1:, 1] = x0 + np.cumsum(dx, dtype=np.int64)
+        chunk[1:, 2] = y0 + np.cumsum(dy, dtype=np.int64)
+        parts.append(chunk)
+    return np.concatenate(parts) if parts else np.empty((0, 3))
+
+
+class Trajectory:
+    """
+    Compact in-memory recording of a pointer trajectory.
+
+    Samples arrive in batches (the mouse tracker's worker appends every batch it analyzes) and
+    are sealed every `chunk_samples` samples: optionally simplified with RDP at `tolerance`
+    pixels, then delta-encoded at 8 bytes per kept sample instead of a dict per sample. With
+    `tolerance=None` the recording is lossless to the microsecond and pixel.
+    """
+
+    def __init__(self, tolerance=1.0, chunk_samples=4096):
+        """
+        Args:
+            tolerance (float, optional): RDP tolerance in pixels; None keeps every sample. Defaults to 1.0.
+            chunk_samples (int, optional): Raw samples buffered before a chunk is sealed. Defaults to 4096.
+        """
+        self.tolerance = tolerance
+        self.chunk_samples = chunk_samples
+        self.samples_seen = 0
+        self.samples_kept = 0
+        self._chunks = []
+        self._pending = []
+        self._pending_count = 0
+        self._encoded_bytes = 0
+        self._lock = threading.Lock()
+
+    def append(self, samples):
+        """Adds an (n, 3) array of (t, x, y) rows."""
+        with self._lock:
+            self._pending.append(np.array(samples, dtype=np.float64, copy=True))
+            self._pending_count += len(samples)
+            self.samples_seen += len(samples)
+            if self._pending_count >= self.chunk_samples:
+                self._seal()
+
+    def _seal(self):
+        # Callers hold the lock.
+        if not self._pending:
+            return
+        samples = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_count = 0
+        if self.tolerance is not None:
+            samples = simplify(samples, self.tolerance)
+        chunk = encode(samples)
+        self._chunks.append(chunk)
+        self._encoded_bytes += len(chunk)
+        self.samples_kept += len(samples)
+
+    def seal(self):
+        """Encodes the buffered samples now, e.g. before saving."""
+        with self._lock:
+            self._seal()
+
+    @property
+    def nbytes(self):
+        return self._encoded_bytes
+
+    def to_bytes(self):
+        """The whole recording, sealed, as concatenated chunks readable by `decode`."""
+        with self._lock:
+            self._seal()
+            return b"".join(self._chunks)
+
+    def samples(self, start=None, end=None):
+        """Decoded (t, x, y) rows, optionally limited to timestamps in [start, end]."""
+        samples = decode(self.to_bytes())
+        if start is not None:
+            samples = samples[samples[:, 0] >= start]
+        if end is not None:
+            samples = samples[samples[:, 0] <= end]
+        return samples
+
+    @classmethod
+    def from_bytes(cls, data, **kwargs):
+        trajectory = cls(**kwargs)
+        samples = decode(data)
+        trajectory._chunks.append(bytes(data))
+        trajectory._encoded_bytes = len(data)
+        trajectory.samples_seen = trajectory.samples_kept = len(samples)
+        return trajectory
+
+
+def replay(samples, tracker, batch=4096):
+    """
+    Feeds recorded (t, x, y) rows through a MouseBehaviorTracker's detection logic, in batches
+    as its worker would, then records its open episodes.
+
+    Args:
+        samples (np.ndarray): Rows from `Trajectory.samples` or `decode`.
+        tracker (MouseBehaviorTracker): A tracker with its own event log; it need not be started.
+        batch (int, optional): Samples analyzed per batch. Defaults to 4096.
+
+    Returns:
+        list: The events the tracker recorded.
+    """
+    for first in range(0, len(samples), batch):
+        tracker.feed(samples[first:first + batch])
+    tracker.flush()
+    return tracker.event_log.snapshot()
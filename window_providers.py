@@ -0,0 +1,429 @@
+import os
+import sys
+import time
+import queue
+import select
+import logging
+import threading
+
+try:
+    import win32gui
+    import win32process
+except ImportError:
+    win32gui = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from Xlib import X
+    from Xlib import display as xdisplay
+    from Xlib import error as xerror
+except ImportError:
+    X = None
+
+logger = logging.getLogger("WindowProviders")
+
+
+class ProviderUnavailable(RuntimeError):
+    """No foreground-window backend can run on this machine."""
+
+
+def process_name(pid):
+    """Executable name of `pid`, or None without psutil or once the process is gone."""
+    if psutil is None or not pid:
+        return None
+    try:
+        return psutil.Process(pid).name()
+    except (psutil.Error, ValueError):
+        return None
+
+
+class FocusProvider:
+    """
+    Source of foreground-window titles for WindowTracker.
+
+    `changes` blocks until the foreground window (or its title) changes, or the provider is
+    closed, and returns every change seen since the previous call as (timestamp, title, process)
+    triples, where process is the owning executable's name, or None when it cannot be read. The
+    first call reports the current window. Event-driven providers hand over each change as
+    the OS reports it, so a switch away and back between two calls still shows up as two changes.
+    """
+
+    name = "base"
+    event_driven = False
+
+    def active_window(self):
+        """The current foreground window's title, read now."""
+        raise NotImplementedError
+
+    def changes(self, timeout=None):
+        """
+        Args:
+            timeout (float, optional): Seconds to wait for a change; None waits until one arrives
+                or the provider is closed.
+
+        Returns:
+            list: (timestamp, title, process) triples in the order they happened; empty on timeout
+                or close.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Releases the backend and wakes up a blocked `changes` call."""
+
+
+class QueuedProvider(FocusProvider):
+    """Base for providers whose backend pushes changes from its own thread or callback."""
+
+    event_driven = True
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.closed = False
+        self._queue = queue.Queue()
+        self._last = None
+        self._lock = threading.Lock()
+
+    def _report(self, title, process=None, timestamp=None):
+        # Backends can fire for the same window twice (e.g. focus and name events together).
+        with self._lock:
+            if (title, process) == self._last:
+                return
+            self._last = (title, process)
+        self._queue.put((self.clock() if timestamp is None else timestamp, title, process))
+
+    def active_window(self):
+        return self._last[0] if self._last else ""
+
+    def changes(self, timeout=None):
+        if self.closed:
+            return []
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        out = [first]
+        while True:
+            try:
+                out.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [change for change in out if change is not None]
+
+    def close(self):
+        self.closed = True
+        self._queue.put(None)
+
+
+class FakeProvider(QueuedProvider):
+    """
+    Scripted provider for tests and benchmarks.
+
+    Titles are pushed with `push`, or played from `script`, a list of (delay_seconds, title) or
+    (delay_seconds, title, process) steps, on a background thread once `play` is called.
+    """
+
+    name = "fake"
+
+    def __init__(self, initial="", script=None, clock=time.time):
+        super().__init__(clock=clock)
+        self.script = list(script or [])
+        self._report(initial)
+
+    def push(self, title, process=None, timestamp=None):
+        self._report(title, process, timestamp)
+
+    def play(self):
+        def run():
+            for delay, *window in self.script:
+                time.sleep(delay)
+                if self.closed:
+                    return
+                self.push(*window)
+
+        thread = threading.Thread(target=run, name="fake-focus", daemon=True)
+        thread.start()
+        return thread
+
+
+class PollingProvider(FocusProvider):
+    """
+    Calls `get_window` every `interval` seconds and reports its (title, process) when it differs
+    from the last one. Works wherever a title can be read at all, but misses switches shorter than the interval
+    and wakes up every interval even when nothing changes.
+    """
+
+    name = "poll"
+
+    def __init__(self, get_window, interval=0.5, clock=time.time):
+        self.get_window = get_window
+        self.interval = interval
+        self.clock = clock
+        self.closed = False
+        self._wake = threading.Event()
+        self._last = None
+
+    def active_window(self):
+        return self.get_window()[0]
+
+    def changes(self, timeout=None):
+        if self._last is not None:
+            wait = self.interval if timeout is None else min(self.interval, timeout)
+            self._wake.wait(wait)
+        if self.closed:
+            return []
+        window = self.get_window()
+        if window == self._last:
+            return []
+        self._last = window
+        return [(self.clock(), *window)]
+
+    def close(self):
+        self.closed = True
+        self._wake.set()
+
+
+def win32_window():
+    """(title, process) of the foreground window through pywin32."""
+    hwnd = win32gui.GetForegroundWindow()
+    if not hwnd:
+        return "", None
+    _, pid = win32process.GetWindowThreadProcessId(hwnd)
+    return win32gui.GetWindowText(hwnd), process_name(pid)
+
+
+class Win32EventProvider(QueuedProvider):
+    """
+    Windows backend on SetWinEventHook: EVENT_SYSTEM_FOREGROUND for switches and
+    EVENT_OBJECT_NAMECHANGE on the foreground window for title changes (e.g. browser tabs). The
+    hooks are out-of-context, so they need a message loop, which runs on its own thread.
+    """
+
+    name = "win32"
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    EVENT_OBJECT_NAMECHANGE = 0x800C
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+    OBJID_WINDOW = 0
+    WM_QUIT = 0x0012
+
+    def __init__(self, clock=time.time):
+        if sys.platform != "win32":
+            raise ProviderUnavailable("Win32 focus events need Windows")
+        import ctypes
+        from ctypes import wintypes
+        super().__init__(clock=clock)
+        self._ctypes = ctypes
+        self._user32 = ctypes.windll.user32
+        self._proc_type = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                             wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        # Kept on the instance: the hook calls it until unhooked.
+        self._proc = self._proc_type(self._on_event)
+        self._thread_id = None
+        self._started = threading.Event()
+        self._error = None
+        self._report(*self._window(self._user32.GetForegroundWindow()))
+        self._thread = threading.Thread(target=self._run, name="win32-focus", daemon=True)
+        self._thread.start()
+        self._started.wait(5)
+        if self._error:
+            raise ProviderUnavailable(self._error)
+
+    def _window(self, hwnd):
+        if not hwnd:
+            return "", None
+        user32, ctypes = self._user32, self._ctypes
+        length = user32.GetWindowTextLengthW(hwnd)
+        buffer = ctypes.create_unicode_buffer(length + 1)
+        user32.GetWindowTextW(hwnd, buffer, length + 1)
+        pid = ctypes.c_ulong()
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        return buffer.value, process_name(pid.value)
+
+    def _on_event(self, hook, event, hwnd, id_object, id_child, thread, time_ms):
+        if event == self.EVENT_SYSTEM_FOREGROUND:
+            self._report(*self._window(hwnd))
+        elif id_object == self.OBJID_WINDOW and hwnd == self._user32.GetForegroundWindow():
+            self._report(*self._window(hwnd))
+
+    def _run(self):
+        ctypes, user32 = self._ctypes, self._user32
+        from ctypes import wintypes
+        self._thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        flags = self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS
+        hooks = [user32.SetWinEventHook(event, event, 0, self._proc, 0, 0, flags)
+                 for event in (self.EVENT_SYSTEM_FOREGROUND, self.EVENT_OBJECT_NAMECHANGE)]
+        if not all(hooks):
+            self._error = "SetWinEventHook failed"
+            self._started.set()
+            return
+        self._started.set()
+        message = wintypes.MSG()
+        try:
+            while user32.GetMessageW(ctypes.byref(message), 0, 0, 0) > 0:
+                user32.TranslateMessage(ctypes.byref(message))
+                user32.DispatchMessageW(ctypes.byref(message))
+        finally:
+            for hook in hooks:
+                user32.UnhookWinEvent(hook)
+
+    def close(self):
+        super().close()
+        if self._thread_id:
+            self._user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+
+
+class X11Provider(FocusProvider):
+    """
+    X11 backend: listens for PropertyNotify on the root window's _NET_ACTIVE_WINDOW, which
+    EWMH window managers update on every focus change, and on the active window's _NET_WM_NAME and
+    WM_NAME for title changes. `changes` waits in select() on the X connection, so it only wakes up
+    when the server has something to say. Works under Xvfb.
+    """
+
+    name = "x11"
+    event_driven = True
+
+    def __init__(self, display=None, clock=time.time):
+        if X is None:
+            raise ProviderUnavailable("python-xlib is not installed")
+        try:
+            self._display = xdisplay.Display(display)
+        except Exception as exc:
+            raise ProviderUnavailable(f"Cannot open X display: {exc}")
+        self.clock = clock
+        self.closed = False
+        self._root = self._display.screen().root
+        self._net_active_window = self._display.intern_atom("_NET_ACTIVE_WINDOW")
+        self._net_wm_name = self._display.intern_atom("_NET_WM_NAME")
+        self._wm_name = self._display.intern_atom("WM_NAME")
+        self._net_wm_pid = self._display.intern_atom("_NET_WM_PID")
+        self._utf8_string = self._display.intern_atom("UTF8_STRING")
+        self._watched = None
+        self._last = None
+        self._pending = []
+        self._wake_read, self._wake_write = os.pipe()
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._display.flush()
+        self._update()
+
+    def active_window(self):
+        return self._read_window()[1]
+
+    def _read_window(self):
+        try:
+            prop = self._root.get_full_property(self._net_active_window, X.AnyPropertyType)
+            wid = prop.value[0] if prop is not None and len(prop.value) else 0
+            if not wid:
+                return 0, "", None
+            window = self._display.create_resource_object("window", wid)
+            name = (window.get_full_property(self._net_wm_name, self._utf8_string) or
+                    window.get_full_property(self._wm_name, X.AnyPropertyType))
+            pid = window.get_full_property(self._net_wm_pid, X.AnyPropertyType)
+        except xerror.XError:
+            # The window went away between the event and the read.
+            return 0, "", None
+        process = process_name(pid.value[0]) if pid is not None and len(pid.value) else None
+        if name is None:
+            return wid, "", process
+        value = name.value
+        return wid, value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value), process
+
+    def _watch(self, wid):
+        # Title changes are only interesting on the active window; stop listening to the old one.
+        if wid == self._watched:
+            return
+        try:
+            if self._watched:
+                self._display.create_resource_object("window", self._watched).change_attributes(event_mask=0)
+            if wid:
+                self._display.create_resource_object("window", wid).change_attributes(
+                    event_mask=X.PropertyChangeMask)
+        except xerror.XError:
+            pass
+        self._watched = wid
+
+    def _update(self):
+        wid, title, process = self._read_window()
+        self._watch(wid)
+        if (title, process) != self._last:
+            self._last = (title, process)
+            self._pending.append((self.clock(), title, process))
+
+    def _drain(self):
+        display = self._display
+        while display.pending_events():
+            event = display.next_event()
+            if event.type == X.PropertyNotify and event.atom in (
+                    self._net_active_window, self._net_wm_name, self._wm_name):
+                # Read right away, one event at a time, so a quick switch away and back shows
+                # up as two changes rather than none.
+                self._update()
+
+    def changes(self, timeout=None):
+        if self.closed:
+            self._release()
+            return []
+        self._drain()
+        if not self._pending:
+            ready, _, _ = select.select([self._display.fileno(), self._wake_read], [], [], timeout)
+            if self.closed:
+                self._release()
+                return []
+            if ready:
+                self._drain()
+        out, self._pending = self._pending, []
+        return out
+
+    def _release(self):
+        # Runs on the thread that calls `changes`, which is the only one using the connection.
+        if self._display is not None:
+            self._display.close()
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+            self._display = None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        os.write(self._wake_write, b"\0")
+
+
+def make_provider(name="auto", poll_interval=0.5, clock=time.time):
+    """
+    Picks a focus backend.
+
+    Args:
+        name (str, optional): "win32" (event hooks), "x11", "poll" (win32gui polling) or "auto",
+            which tries the event-driven backend for this platform first and falls back to polling.
+            Defaults to "auto".
+        poll_interval (float, optional): Interval for the polling fallback. Defaults to 0.5.
+
+    Returns:
+        FocusProvider: The provider.
+
+    Raises:
+        ProviderUnavailable: If no requested backend can run here.
+    """
+    if name in ("win32", "auto") and sys.platform == "win32":
+        try:
+            return Win32EventProvider(clock=clock)
+        except (ProviderUnavailable, OSError, AttributeError) as exc:
+            if name == "win32":
+                raise ProviderUnavailable(str(exc))
+            logger.warning("Win32 focus events unavailable (%s); polling instead.", exc)
+    if name in ("x11", "auto") and sys.platform != "win32":
+        try:
+            return X11Provider(clock=clock)
+        except ProviderUnavailable:
+            if name == "x11":
+                raise
+    if name in ("poll", "auto"):
+        if win32gui is None:
+            raise ProviderUnavailable("No focus backend: win32gui is not installed and X11 is unavailable")
+        return PollingProvider(win32_window, interval=poll_interval, clock=clock)
+    raise ProviderUnavailable(f"Unknown focus provider {name!r}")
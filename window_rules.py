@@ -0,0 +1,166 @@
+import re
+import json
+import logging
+from functools import lru_cache
+from collections import namedtuple
+
+logger = logging.getLogger("WindowRules")
+
+# Most to least severe: a title matching rules of several categories takes the first.
+CATEGORIES = ("deny", "suspicious", "allow")
+UNKNOWN = "unknown"
+
+# Risk for leaving a window of each category: a flat amount per switch, plus an amount for every
+# 20 seconds spent in it. "unknown" keeps the tracker's original +20 and +10 per 20 s.
+DEFAULT_WEIGHTS = {
+    "deny": {"switch": 80, "per_20s": 40},
+    "suspicious": {"switch": 40, "per_20s": 20},
+    "unknown": {"switch": 20, "per_20s": 10},
+    "allow": {"switch": 0, "per_20s": 0},
+}
+
+DEFAULT_RULES = {
+    "allow": {
+        "titles": ["Dragon Proctor"],
+        "processes": ["exam_browser"],
+    },
+    "deny": {
+        "titles": ["ChatGPT", "TeamViewer", "AnyDesk", "Remote Desktop Connection"],
+        "processes": ["teamviewer", "anydesk", "mstsc"],
+    },
+    "suspicious": {
+        "titles": ["Discord", "WhatsApp", "Telegram", "Slack", "Messenger"],
+        "regexes": [r"\b(google|bing|duckduckgo) search\b", r"\bstack ?overflow\b", r"\bchegg\b",
+                    r"\bwikipedia\b"],
+        "processes": ["discord", "whatsapp", "telegram", "slack"],
+    },
+}
+
+Classification = namedtuple("Classification", ["category", "rule"])
+UNMATCHED = Classification(UNKNOWN, None)
+
+
+def normalize_process(name):
+    """Lower-cased executable name without a .exe suffix, so rules match on every platform."""
+    name = name.lower()
+    return name[:-4] if name.endswith(".exe") else name
+
+
+def trie_pattern(words):
+    """
+    A regex matching any of `words`, factored into a character trie: "chat", "chatgpt" and
+    "chegg" become "c(?:h(?:at(?:gpt)?|egg))". Python's re tries the branches of a flat
+    alternation one by one at every position; the trie rejects a position on its first character.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if "" not in node:
+            return body
+        return f"(?:{body})?" if len(branches) == 1 else f"{body}?"
+
+    return build(trie)
+
+
+class WindowRules:
+    """
+    Classifies window titles (and, when known, the owning process) as allow, deny, suspicious or
+    unknown.
+
+    All title substrings are compiled into one trie-shaped regex, scanned with a zero-width
+    lookahead so a match never hides an overlapping one, and mapped back to their rule through a
+    dict. All regexes are compiled into a second alternation, and only when that matches are they
+    tried one by one to find which rule fired. Process names are a dict lookup. Results are
+    memoized per (title, process) in an LRU cache, since a candidate keeps returning to the same
+    handful of windows.
+    """
+
+    def __init__(self, rules=None, weights=None, cache_size=4096):
+        """
+        Args:
+            rules (dict, optional): {category: {"titles": [...], "regexes": [...], "processes": [...]}}.
+                Defaults to DEFAULT_RULES.
+            weights (dict, optional): {category: {"switch": int, "per_20s": int}}, merged over
+                DEFAULT_WEIGHTS.
+            cache_size (int, optional): Classifications kept in the LRU cache. Defaults to 4096.
+        """
+        rules = DEFAULT_RULES if rules is None else rules
+        unknown = set(rules) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown window rule categories: {sorted(unknown)}")
+        self.weights = {category: dict(weight) for category, weight in DEFAULT_WEIGHTS.items()}
+        for category, weight in (weights or {}).items():
+            self.weights.setdefault(category, {}).update(weight)
+        self._rank = {category: rank for rank, category in enumerate(CATEGORIES)}
+        self.rule_count = 0
+        self._literals = {}
+        self._regexes = []
+        self._processes = {}
+        # Categories are walked most severe first, so setdefault keeps the most severe duplicate.
+        for category in CATEGORIES:
+            spec = rules.get(category, {})
+            for text in spec.get("titles", ()):
+                self._literals.setdefault(text.lower(), Classification(category, text))
+            for pattern in spec.get("regexes", ()):
+                self._regexes.append((re.compile(pattern, re.IGNORECASE), Classification(category, pattern)))
+            for process in spec.get("processes", ()):
+                self._processes.setdefault(normalize_process(process), Classification(category, f"process:{process}"))
+            self.rule_count += sum(len(spec.get(key, ())) for key in ("titles", "regexes", "processes"))
+        # The trie match at a position is the longest literal there; fold in any shorter literal
+        # it starts with, so "chat" still counts inside "chatgpt" if it is the more severe rule.
+        for literal, found in list(self._literals.items()):
+            for end in range(1, len(literal)):
+                self._literals[literal] = found = self._severer(found, self._literals.get(literal[:end], found))
+        self._literal_matcher = re.compile(f"(?=({trie_pattern(self._literals)}))") if self._literals else None
+        self._regex_matcher = (re.compile("|".join(f"(?:{regex.pattern})" for regex, _ in self._regexes),
+                                          re.IGNORECASE) if self._regexes else None)
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Loads {"rules": {...}, "weights": {...}} from a JSON file."""
+        with open(path, encoding="utf-8") as fh:
+            config = json.load(fh)
+        return cls(rules=config.get("rules"), weights=config.get("weights"), **kwargs)
+
+    def _classify(self, title, process=None):
+        best = UNMATCHED
+        if process:
+            best = self._processes.get(normalize_process(process), UNMATCHED)
+        if not title:
+            return best
+        severest = CATEGORIES[0]
+        if self._literal_matcher is not None and best.category != severest:
+            for match in self._literal_matcher.finditer(title.lower()):
+                best = self._severer(best, self._literals[match.group(1)])
+                if best.category == severest:
+                    return best
+        if self._regex_matcher is not None and best.category != severest and self._regex_matcher.search(title):
+            for regex, found in self._regexes:
+                if self._severer(best, found) is best:
+                    break  # The rest are no more severe than what was already found.
+                if regex.search(title):
+                    return found
+        return best
+
+    def _severer(self, current, found):
+        if current is UNMATCHED or self._rank[found.category] < self._rank[current.category]:
+            return found
+        return current
+
+    def risk(self, category, duration):
+        """(switch risk, duration risk) for leaving a window of `category` after `duration` seconds."""
+        weight = self.weights.get(category, self.weights[UNKNOWN])
+        return weight["switch"], int(duration // 20) * weight["per_20s"]
+
+    def cache_info(self):
+        return self.classify.cache_info()
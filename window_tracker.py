@@ -1,88 +1,138 @@
-import time
-import threading
-import logging
-import win32gui
-
-
-class WindowTracker:
-    def __init__(self, poll_interval=0.5, callback=None):
-        self.poll_interval = poll_interval
-        self.callback = callback
-        self.current_window = None
-        self.current_start_time = None
-        self.event_log = []
-        self.running = False
-        self.risk_score = 0
-        self.logger = logging.getLogger("WindowTracker")
-        self.logger.setLevel(logging.DEBUG)
-        if not self.logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-
-    def get_active_window(self):
-        hwnd = win32gui.GetForegroundWindow()
-        return win32gui.GetWindowText(hwnd)
-
-    def _poll(self):
-        while self.running:
-            active_window = self.get_active_window()
-            now = time.time()
-
-            # Initialization: first run.
-            if self.current_window is None:
-                self.current_window = active_window
-                self.current_start_time = now
-
-            # When a window change is detected.
-            if active_window.lower() != self.current_window.lower():
-                duration = now - self.current_start_time
-                # Calculate duration risk: +10 points for every 20 seconds.
-                duration_risk = int(duration // 20) * 10
-                # Tab switch risk: +20 points.
-                switch_risk = 20
-                total_risk = switch_risk + duration_risk
-
-                # Update risk score.
-                self.risk_score += total_risk
-
-                event = {
-                    "timestamp": self.current_start_time,
-                    "window": self.current_window,
-                    "duration": duration,
-                    "risk": total_risk,
-                    "details": f"Tab switch risk +{switch_risk}, Duration risk +{duration_risk}"
-                }
-                self.event_log.append(event)
-                self.logger.info("Window changed: '%s' was active for %.2f seconds; risk +%d",
-                                 self.current_window, duration, total_risk)
-                if self.callback:
-                    self.callback(event)
-
-                # Update for new window.
-                self.current_window = active_window
-                self.current_start_time = now
-
-            time.sleep(self.poll_interval)
-
-    def start(self):
-        self.running = True
-        self.thread = threading.Thread(target=self._poll, daemon=True)
-        self.thread.start()
-        self.logger.info("WindowTracker started.")
-
-    def stop(self):
-        self.running = False
-        self.thread.join()
-        self.logger.info("WindowTracker stopped.")
-
-
-if __name__ == '__main__':
-    tracker = WindowTracker(callback=lambda event: print("Window Event:", event))
-    tracker.start()
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        tracker.stop()
+import os
+import time
+import threading
+import logging
+from event_store import EventLog
+from window_providers import ProviderUnavailable, make_provider
+from window_rules import WindowRules
+import metrics
+
+POLLS = metrics.counter("dragon_window_polls_total",
+                        "WindowTracker wake-ups: polls, or batches of focus events for event-driven providers.")
+POLL_SECONDS = metrics.histogram("dragon_window_poll_seconds",
+                                 "Time spent per WindowTracker wake-up, excluding the wait.")
+
+
+class WindowTracker:
+    def __init__(self, poll_interval=0.5, callback=None, event_log=None, provider=None, rules=None):
+        """
+        Args:
+            poll_interval (float, optional): Poll interval when falling back to polling. Defaults to 0.5.
+            callback (callable, optional): Called with each window event.
+            event_log (EventLog, optional): Where events are recorded.
+            provider (FocusProvider, optional): Focus backend; by default `make_provider` picks one
+                on start, from DRAGON_WINDOW_PROVIDER ("auto", "win32", "x11" or "poll").
+            rules (WindowRules, optional): Classifies windows and weights their risk by category.
+                Defaults to the built-in rules.
+        """
+        self.poll_interval = poll_interval
+        self.callback = callback
+        self.provider = provider
+        self.rules = rules if rules is not None else WindowRules()
+        self.recorder = None  # session_recorder.SessionRecorder receiving each focus change.
+        self.current_window = None
+        self.current_process = None
+        self.current_class = None
+        self.current_start_time = None
+        self.event_log = event_log if event_log is not None else EventLog("window")
+        self.running = False
+        self.thread = None
+        self.risk_score = 0
+        self.logger = logging.getLogger("WindowTracker")
+        self.logger.setLevel(logging.DEBUG)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            formatter = logging.Formatter("[%(levelname)s] %(asctime)s - %(name)s: %(message)s")
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
+    def get_active_window(self):
+        return self.provider.active_window()
+
+    def _poll(self):
+        provider = self.provider
+        while self.running:
+            # Blocks until the provider sees a change: for event-driven providers there are no
+            # wake-ups at all while the candidate stays in one window.
+            changes = provider.changes()
+            POLLS.inc()
+            poll_start = time.perf_counter()
+            for now, active_window, process in changes:
+                if self.recorder is not None:
+                    self.recorder.window(active_window, process, now)
+                self._on_window(active_window, process, now)
+            POLL_SECONDS.observe(time.perf_counter() - poll_start)
+
+    def _on_window(self, active_window, process, now):
+        # Initialization: first run.
+        if self.current_window is None:
+            self._enter(active_window, process, now)
+
+        # When a window change is detected.
+        if active_window.lower() != self.current_window.lower():
+            duration = now - self.current_start_time
+            # Switch and duration risk (per 20 seconds) are weighted by the category of the
+            # window being left: nothing for the exam itself, most for denied applications.
+            category, rule = self.current_class
+            switch_risk, duration_risk = self.rules.risk(category, duration)
+            total_risk = switch_risk + duration_risk
+
+            # Update risk score.
+            self.risk_score += total_risk
+
+            event = {
+                "timestamp": self.current_start_time,
+                "window": self.current_window,
+                "process": self.current_process,
+                "category": category,
+                "rule": rule,
+                "duration": duration,
+                "risk": total_risk,
+                "details": f"Tab switch risk +{switch_risk}, Duration risk +{duration_risk}"
+            }
+            self.event_log.append(event)
+            self.logger.info("Window changed: '%s' (%s) was active for %.2f seconds; risk +%d",
+                             self.current_window, category, duration, total_risk)
+            if self.callback:
+                self.callback(event)
+
+            # Update for new window.
+            self._enter(active_window, process, now)
+
+    def _enter(self, window, process, now):
+        self.current_window = window
+        self.current_process = process
+        self.current_class = self.rules.classify(window, process)
+        self.current_start_time = now
+
+    def start(self):
+        if self.provider is None:
+            try:
+                self.provider = make_provider(os.environ.get("DRAGON_WINDOW_PROVIDER", "auto"),
+                                              poll_interval=self.poll_interval)
+            except ProviderUnavailable as exc:
+                self.logger.error("WindowTracker not started: %s", exc)
+                return
+        self.running = True
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+        self.logger.info("WindowTracker started (%s provider).", self.provider.name)
+
+    def stop(self):
+        self.running = False
+        if self.provider is not None:
+            self.provider.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.logger.info("WindowTracker stopped.")
+
+
+if __name__ == '__main__':
+    tracker = WindowTracker(callback=lambda event: print("Window Event:", event))
+    tracker.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        tracker.stop()